@@ -1,12 +1,16 @@
 import cv2
 
-def apply_effect_frame(frame):
+# Pure function of the input frame (read by effect_registry without importing)
+EFFECT_META = {"stateful": False, "frame_invariant": True}
+
+def apply_effect_frame(frame, render_scale=1.0):
     """
     Zoom/crop the frame to hide a logo or watermark.
 
     This example crops 70 pixels from the bottom (where a watermark 
     might be located) and then resizes back to the original size 
-    so the video maintains its dimensions.
+    so the video maintains its dimensions. The crop follows render_scale
+    for reduced-resolution previews.
     """
     h, w, _ = frame.shape
 
@@ -14,7 +18,7 @@ def apply_effect_frame(frame):
     crop_x_start = 0
     crop_y_start = 0
     crop_x_end   = w
-    crop_y_end   = h - 70   # hide bottom 70 pixels
+    crop_y_end   = h - int(round(70 * render_scale))   # hide bottom 70 pixels
 
     # --- Crop the region of interest ---
     cropped = frame[crop_y_start:crop_y_end, crop_x_start:crop_x_end]
@@ -0,0 +1,261 @@
+import cv2
+import numpy as np
+import os
+import json
+import uuid
+import random
+import hashlib
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import usage_lock
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+# "full", "fast" or "light": cheaper parameter tiers of the same engine.
+# Each tier keeps its own usage file (glitch_usage.json, glitch_usage_fast.json, ...)
+GLITCH_TIER = "full"
+GLITCH_USAGE_DIR = BASE_DIR
+
+EFFECT_META = {"stateful": False, "frame_invariant": False, "quality_levels": 3}  # quality 1/2 = fast/light tier
+
+TIERS = {
+    #          rows per shift band, noise at 1/n size (0 = off), strength
+    "full":  {"band": 1, "noise_div": 1, "amount": 1.0},
+    "fast":  {"band": 4, "noise_div": 2, "amount": 0.8},
+    "light": {"band": 8, "noise_div": 0, "amount": 0.6},
+}
+TIER_ORDER = ["full", "fast", "light"]
+
+TABLE_FRAMES = 240   # per-video random tables, indexed by frame_idx % TABLE_FRAMES
+NOISE_FRAMES = 8     # noise fields drawn once per video and cycled
+
+# Full-resolution pixel amplitudes; every key is optional (missing = off)
+GLITCH_PRESETS = {
+    "fast_shift":    {"glitch_prob": 0.35, "shift": 40, "bands": 12, "chroma": 4},
+    "rgb_flicker":   {"flicker_prob": 0.5, "chroma": 9, "noise": 6},
+    "scanline":      {"scanline": 0.30, "noise": 5, "wave_amp": 1.5, "wave_freq": 0.05},
+    "pixel_break":   {"glitch_prob": 0.25, "shift": 28, "bands": 10, "block": 48, "noise": 14},
+    "vhs_wave":      {"wave_amp": 6, "wave_freq": 0.02, "wave_speed": 0.15, "chroma": 3, "scanline": 0.15, "noise": 8},
+    "red_shift":     {"red_offset": 10, "wave_amp": 2, "wave_freq": 0.01, "wave_speed": 0.1},
+    "subtle_glitch": {"glitch_prob": 0.08, "shift": 12, "bands": 4, "chroma": 2, "scanline": 0.08, "noise": 3},
+}
+PRESET_ALIASES = {"shift_red": "red_shift"}
+
+# -----------------------------
+# JSON USAGE FUNCTIONS
+# -----------------------------
+def usage_file(tier=None):
+    tier = tier or GLITCH_TIER
+    suffix = "" if tier == "full" else f"_{tier}"
+    return os.path.join(GLITCH_USAGE_DIR, f"glitch_usage{suffix}.json")
+
+def load_glitch_usage():
+    default_data = {"video_map": {}, "video_counter": 0}
+    if os.path.exists(usage_file()):
+        try:
+            with open(usage_file(), "r") as f:
+                data = json.load(f)
+                data.setdefault("video_map", {})
+                data.setdefault("video_counter", 0)
+                return data
+        except Exception:
+            return default_data
+    return default_data
+
+def save_glitch_usage(data):
+    try:
+        # Write-then-rename so a reader on another machine never sees a half-written file
+        tmp_path = f"{usage_file()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, usage_file())
+    except Exception as e:
+        print(f"❌ Error saving glitch usage JSON: {e}")
+
+USAGE_DATA = load_glitch_usage()
+
+def get_video_glitch_preset(video_id):
+    """Preset name for a video; each preset is used once per cycle of len(GLITCH_PRESETS) videos."""
+    global USAGE_DATA
+    name = USAGE_DATA["video_map"].get(video_id)
+    name = PRESET_ALIASES.get(name, name)
+    if name in GLITCH_PRESETS:
+        return name
+
+    # Other render processes pick from the same file: re-read it under the lock
+    with usage_lock.locked(usage_file()):
+        USAGE_DATA = load_glitch_usage()
+        name = USAGE_DATA["video_map"].get(video_id)
+        name = PRESET_ALIASES.get(name, name)
+        if name in GLITCH_PRESETS:
+            return name
+
+        if USAGE_DATA["video_counter"] >= len(GLITCH_PRESETS):
+            USAGE_DATA["video_map"] = {}
+            USAGE_DATA["video_counter"] = 0
+
+        used = {PRESET_ALIASES.get(p, p) for p in USAGE_DATA["video_map"].values()}
+        available = [p for p in GLITCH_PRESETS if p not in used] or list(GLITCH_PRESETS)
+        chosen = random.choice(available)
+
+        USAGE_DATA["video_map"][video_id] = chosen
+        USAGE_DATA["video_counter"] += 1
+        save_glitch_usage(USAGE_DATA)
+    return chosen
+
+# -----------------------------
+# Per-video tables
+# -----------------------------
+# Everything random is drawn here, once per (video, preset, tier, size), from a
+# seed derived from the video id. apply_effect_frame only indexes these tables
+# and runs whole-array NumPy/OpenCV operations.
+_tables = {}
+
+def video_seed(video_id):
+    return int(hashlib.md5(str(video_id).encode("utf-8")).hexdigest()[:8], 16)
+
+def build_tables(video_id, preset, tier, h, w, render_scale):
+    rng = np.random.default_rng(video_seed(video_id))
+    p = GLITCH_PRESETS[preset]
+    t = TIERS[tier]
+    px = render_scale * t["amount"]
+    tables = {}
+
+    # Horizontal displacement: per frame, a (bands_y, bands_x) grid of offsets
+    # that is stretched to full size and added to the identity remap grid
+    band = t["band"]
+    rows = max(1, -(-h // band))
+    if p.get("shift"):
+        active = rng.random(TABLE_FRAMES) < p["glitch_prob"]
+        bands_y = max(1, int(p.get("bands", 8)))
+        bands_x = max(1, w // int(p["block"] * render_scale)) if p.get("block") else 1
+        jolts = rng.uniform(-1, 1, (TABLE_FRAMES, bands_y, bands_x)) * p["shift"] * px
+        # Only some bands tear on an active frame
+        jolts *= rng.random((TABLE_FRAMES, bands_y, bands_x)) < 0.4
+        jolts[~active] = 0
+        tables["jolts"] = jolts.astype(np.float32)
+        tables["jolt_active"] = active
+    if p.get("wave_amp"):
+        row_idx = np.arange(0, h, band, dtype=np.float32)[:rows]
+        tables["wave_rows"] = row_idx * p["wave_freq"] / render_scale
+        tables["wave_phase"] = rng.uniform(0, 2 * np.pi)
+    if "jolts" in tables or "wave_rows" in tables:
+        tables["grid_x"], tables["grid_y"] = np.meshgrid(
+            np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+
+    # Channel offsets (pixels) for red and blue, applied with slicing views
+    chroma = p.get("chroma", 0) * px
+    if chroma:
+        offsets = np.round(rng.uniform(0.5, 1.0, (TABLE_FRAMES, 2)) * chroma).astype(np.int32)
+        offsets[:, 1] *= -1
+        if p.get("flicker_prob"):
+            offsets *= (rng.random(TABLE_FRAMES) < p["flicker_prob"])[:, None]
+        tables["chroma"] = offsets
+    if p.get("red_offset"):
+        base = int(round(p["red_offset"] * px))
+        wobble = np.round(rng.uniform(-0.3, 0.3, TABLE_FRAMES) * base).astype(np.int32)
+        tables["red"] = base + wobble
+
+    # Scanline mask: every other row darkened, multiplied in with one cv2 call
+    if p.get("scanline"):
+        step = max(2, int(round(2 * render_scale)))
+        row_gain = np.full(h, 255, dtype=np.uint8)
+        row_gain[::step] = int(round(255 * (1.0 - p["scanline"] * t["amount"])))
+        tables["scanline"] = np.ascontiguousarray(np.broadcast_to(row_gain[:, None, None], (h, w, 3)))
+
+    # Noise bank: a few signed fields at reduced size, upscaled once here
+    if p.get("noise") and t["noise_div"]:
+        nh, nw = max(1, h // t["noise_div"]), max(1, w // t["noise_div"])
+        bank = rng.normal(0, p["noise"] * t["amount"], (NOISE_FRAMES, nh, nw)).astype(np.float32)
+        if t["noise_div"] > 1:
+            bank = np.stack([cv2.resize(n, (w, h), interpolation=cv2.INTER_NEAREST) for n in bank])
+        tables["noise"] = bank.astype(np.int16)
+        tables["noise_order"] = rng.integers(0, NOISE_FRAMES, TABLE_FRAMES)
+
+    return tables
+
+def get_tables(video_id, preset, tier, h, w, render_scale):
+    key = (video_id, preset, tier, h, w, render_scale)
+    tables = _tables.get(key)
+    if tables is None:
+        if len(_tables) > 8:
+            _tables.clear()
+        tables = _tables[key] = build_tables(video_id, preset, tier, h, w, render_scale)
+    return tables
+
+# -----------------------------
+# Stages (whole-array operations only)
+# -----------------------------
+def displace(frame, tables, preset, t_idx, frame_idx, fps, strength):
+    p = GLITCH_PRESETS[preset]
+    h, w = frame.shape[:2]
+    offset_x = None
+
+    if "jolts" in tables and tables["jolt_active"][t_idx]:
+        offset_x = cv2.resize(tables["jolts"][t_idx] * strength, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    if "wave_rows" in tables:
+        phase = tables["wave_phase"] + frame_idx * p.get("wave_speed", 0.1) * 30.0 / fps
+        wave = (np.sin(tables["wave_rows"] + phase) * (p["wave_amp"] * strength)).astype(np.float32)
+        # One value per band of rows, stretched over the frame height
+        wave = cv2.resize(wave[:, None], (1, h), interpolation=cv2.INTER_NEAREST)
+        offset_x = wave if offset_x is None else offset_x + wave
+
+    if offset_x is None:
+        return frame
+    map_x = tables["grid_x"] + offset_x
+    return cv2.remap(frame, map_x, tables["grid_y"], cv2.INTER_NEAREST, borderMode=cv2.BORDER_REFLECT)
+
+def _shift_channel(dst, src, channel, dx):
+    """dst[..., channel] = src[..., channel] moved dx pixels right (views, no copies of the frame)."""
+    if dx > 0:
+        dst[:, dx:, channel] = src[:, :-dx, channel]
+    elif dx < 0:
+        dst[:, :dx, channel] = src[:, -dx:, channel]
+
+def split_channels(frame, tables, t_idx):
+    red_dx = blue_dx = 0
+    if "chroma" in tables:
+        red_dx, blue_dx = (int(v) for v in tables["chroma"][t_idx])
+    if "red" in tables:
+        red_dx += int(tables["red"][t_idx])
+    if not red_dx and not blue_dx:
+        return frame
+    out = frame.copy()
+    _shift_channel(out, frame, 2, red_dx)   # BGR: channel 2 is red
+    _shift_channel(out, frame, 0, blue_dx)
+    return out
+
+def add_noise(frame, tables, t_idx, strength):
+    noise = tables["noise"][tables["noise_order"][t_idx]]
+    if strength != 1.0:
+        noise = (noise * strength).astype(np.int16)
+    return cv2.add(frame, cv2.merge([noise, noise, noise]), dtype=cv2.CV_8U)
+
+# -----------------------------
+# Frame Effect
+# -----------------------------
+def apply_effect_frame(frame, frame_idx=0, fps=30, video_id="default", render_scale=1.0, audio_features=None, quality=0):
+    h, w = frame.shape[:2]
+    preset = get_video_glitch_preset(video_id)
+    tier = TIER_ORDER[max(TIER_ORDER.index(GLITCH_TIER), quality)]
+    tables = get_tables(video_id, preset, tier, h, w, render_scale)
+    t_idx = frame_idx % TABLE_FRAMES
+
+    # Glitches hit harder on onsets when the soundtrack has been analysed
+    strength = 1.0
+    if audio_features is not None:
+        strength = 0.5 + 1.0 * float(audio_features["onset"][frame_idx])
+
+    out = displace(frame, tables, preset, t_idx, frame_idx, fps, strength)
+    out = split_channels(out, tables, t_idx)
+    if "noise" in tables:
+        out = add_noise(out, tables, t_idx, strength)
+    if "scanline" in tables:
+        out = cv2.multiply(out, tables["scanline"], scale=1 / 255)
+    return out
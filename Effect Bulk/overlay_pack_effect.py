@@ -0,0 +1,61 @@
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from overlay_pack import load_overlay_pack
+
+# -----------------------------
+# CONFIG
+# -----------------------------
+# Build the pack once with:  python overlay_pack.py overlay_frames_temp
+OVERLAY_PACK_FILE = os.path.join(BASE_DIR, "overlay_frames_temp.ovp")
+START_TIME = 0.0       # seconds into the video when the overlay starts
+LOOP = False           # repeat the overlay instead of showing it once
+ANCHOR = "center"      # "center", "top_left" or "bottom_right"
+PADDING = 12           # used by the corner anchors
+EFFECT_META = {"stateful": False, "frame_invariant": False, "layout": True, "region_local": True}
+
+# -----------------------------
+# Placement
+# -----------------------------
+def overlay_position(pack, frame_w, frame_h, render_scale=1.0):
+    pack_w = int(pack.width * render_scale)
+    pack_h = int(pack.height * render_scale)
+    padding = int(round(PADDING * render_scale))
+    if ANCHOR == "top_left":
+        return padding, padding
+    if ANCHOR == "bottom_right":
+        return frame_w - pack_w - padding, frame_h - pack_h - padding
+    return (frame_w - pack_w) // 2, (frame_h - pack_h) // 2
+
+# -----------------------------
+# Main effect
+# -----------------------------
+def effect_region(shape, frame_idx=0, fps=30, render_scale=1.0):
+    """Box the overlay frame covers, None before/after the overlay (see dirty_rects)."""
+    if not os.path.exists(OVERLAY_PACK_FILE):
+        return None
+
+    pack = load_overlay_pack(OVERLAY_PACK_FILE)
+    idx = pack.frame_index_at(frame_idx / fps - START_TIME, loop=LOOP)
+    if idx is None:
+        return None
+
+    x, y = overlay_position(pack, shape[1], shape[0], render_scale)
+    return pack.bounds(idx, x, y, scale=render_scale)
+
+
+def apply_effect_frame(frame, frame_idx, fps=30, render_scale=1.0):
+    if not os.path.exists(OVERLAY_PACK_FILE):
+        return frame
+
+    pack = load_overlay_pack(OVERLAY_PACK_FILE)
+    idx = pack.frame_index_at(frame_idx / fps - START_TIME, loop=LOOP)
+    if idx is None:
+        return frame
+
+    x, y = overlay_position(pack, frame.shape[1], frame.shape[0], render_scale)
+    return pack.composite(frame, idx, x, y, scale=render_scale)
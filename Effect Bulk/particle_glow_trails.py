@@ -2,7 +2,16 @@ import cv2
 import numpy as np
 import os
 import json
+import uuid
 import random
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import multires
+import usage_lock
 
 # -----------------------------
 # CONFIGURATION
@@ -10,6 +19,10 @@ import random
 PARTICLE_USAGE_FILE = r"C:\Users\Mr_robot\Desktop\videoeditautomation\particle_usage.json"
 
 ALPHA = 0.6  # blending opacity
+# Particles persist between frames; the glow layer is drawn at half size (see multires)
+EFFECT_META = {"stateful": True, "frame_invariant": False, "quality_levels": 3,
+               "working_scale": 0.5, "blend": "add"}
+DRAW_STRIDE = [1, 2, 4]  # per quality level: draw every particle, every 2nd, every 4th
 
 # 10 unique particle presets
 PARTICLE_PRESETS = {
@@ -43,8 +56,11 @@ def load_particle_usage():
 
 def save_particle_usage(data):
     try:
-        with open(PARTICLE_USAGE_FILE, "w") as f:
+        # Write-then-rename so a reader on another machine never sees a half-written file
+        tmp_path = f"{PARTICLE_USAGE_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w") as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_path, PARTICLE_USAGE_FILE)
     except Exception as e:
         print(f"❌ Error saving particle usage JSON: {e}")
 
@@ -53,10 +69,10 @@ USAGE_DATA = load_particle_usage()
 # -----------------------------
 # Global State
 # -----------------------------
-particles = None
-WIDTH = None
-HEIGHT = None
-current_config = None
+# One simulation per video_id and layer size, so variants (variant_fanout) and
+# renditions (renditions) rendered side by side each keep their own particles.
+MAX_STATES = 16
+particle_states = {}  # (video_id, width, height, scale) -> {"particles", "size", "config", "scale"}
 
 # -----------------------------
 # Preset assignment per video
@@ -69,34 +85,37 @@ def get_video_particle_config(video_id):
         preset_name = USAGE_DATA["video_map"][video_id]
         return PARTICLE_PRESETS[preset_name]
 
-    # Reset after 10 videos
-    if USAGE_DATA["video_counter"] >= 10:
-        USAGE_DATA["video_map"] = {}
-        USAGE_DATA["video_counter"] = 0
+    # Other render processes pick from the same file: re-read it under the lock
+    with usage_lock.locked(PARTICLE_USAGE_FILE):
+        USAGE_DATA = load_particle_usage()
+        if video_id in USAGE_DATA["video_map"]:
+            return PARTICLE_PRESETS[USAGE_DATA["video_map"][video_id]]
 
-    all_presets = list(PARTICLE_PRESETS.keys())
-    usage_counts = {p: 0 for p in all_presets}
-    for p in USAGE_DATA["video_map"].values():
-        if p in usage_counts:
-            usage_counts[p] += 1
+        # Reset after 10 videos
+        if USAGE_DATA["video_counter"] >= 10:
+            USAGE_DATA["video_map"] = {}
+            USAGE_DATA["video_counter"] = 0
 
-    available = [p for p, count in usage_counts.items() if count < 1]  # unique per cycle
-    chosen_name = random.choice(available)
+        all_presets = list(PARTICLE_PRESETS.keys())
+        usage_counts = {p: 0 for p in all_presets}
+        for p in USAGE_DATA["video_map"].values():
+            if p in usage_counts:
+                usage_counts[p] += 1
 
-    USAGE_DATA["video_map"][video_id] = chosen_name
-    USAGE_DATA["video_counter"] += 1
-    save_particle_usage(USAGE_DATA)
+        available = [p for p, count in usage_counts.items() if count < 1]  # unique per cycle
+        chosen_name = random.choice(available)
+
+        USAGE_DATA["video_map"][video_id] = chosen_name
+        USAGE_DATA["video_counter"] += 1
+        save_particle_usage(USAGE_DATA)
 
     return PARTICLE_PRESETS[chosen_name]
 
 # -----------------------------
 # Particle Initialization
 # -----------------------------
-def init_particles(width, height, config, seed=42):
-    global particles, WIDTH, HEIGHT, current_config
-    WIDTH, HEIGHT = width, height
-    current_config = config
-
+def init_particles(width, height, config, seed=42, render_scale=1.0):
+    """Fresh simulation state for one video."""
     num_particles = config["num_particles"]
     max_speed = config["speed"]
 
@@ -107,52 +126,86 @@ def init_particles(width, height, config, seed=42):
                                                ('speed', float),
                                                ('vx', float),
                                                ('vy', float)])
-    particles['x'] = np.random.uniform(0, WIDTH, num_particles)
-    particles['y'] = np.random.uniform(0, HEIGHT, num_particles)
-    particles['size'] = np.random.uniform(1, config['size'], num_particles)
-    particles['speed'] = np.random.uniform(0.5, max_speed, num_particles)
+    particles['x'] = np.random.uniform(0, width, num_particles)
+    particles['y'] = np.random.uniform(0, height, num_particles)
+    # Size and speed are in full-resolution pixels
+    particles['size'] = np.random.uniform(1, config['size'], num_particles) * render_scale
+    particles['speed'] = np.random.uniform(0.5, max_speed, num_particles) * render_scale
     angle = np.random.uniform(0, 2*np.pi, num_particles)
     particles['vx'] = np.cos(angle) * particles['speed']
     particles['vy'] = np.sin(angle) * particles['speed']
+    return {"particles": particles, "size": (width, height), "config": config, "scale": render_scale}
+
+
+def get_particle_state(video_id, width, height, config, render_scale):
+    key = (video_id, width, height, render_scale)
+    state = particle_states.get(key)
+    if state is None or state["config"] != config:
+        seed_value = int(video_id.replace('-', ''), 16) if video_id.replace('-', '').isalnum() else 42
+        state = particle_states[key] = init_particles(width, height, config, seed=seed_value,
+                                                           render_scale=render_scale)
+        # A long-running worker renders many videos: keep only the most recent ones
+        while len(particle_states) > MAX_STATES:
+            del particle_states[next(iter(particle_states))]
+    return state
 
 # -----------------------------
-# Frame Effect
+# Checkpoint state (used by checkpoint_render to resume a video mid-way)
 # -----------------------------
-def apply_effect_frame(frame, frame_idx=0, fps=30, video_id="default"):
-    global particles, WIDTH, HEIGHT, current_config
+def get_effect_state():
+    return {key: dict(state, particles=state["particles"].copy())
+            for key, state in particle_states.items()}
 
-    h, w = frame.shape[:2]
+
+def set_effect_state(state):
+    particle_states.clear()
+    particle_states.update(state)
+
+# -----------------------------
+# Frame Effect
+# -----------------------------
+def apply_effect_layer(small, frame_idx=0, fps=30, video_id="default", render_scale=1.0, audio_features=None, quality=0):
+    """Particle layer at working scale and its opacity; the simulation runs in the layer's pixels."""
+    h, w = small.shape[:2]
+    layer_scale = render_scale * EFFECT_META["working_scale"]
 
     config = get_video_particle_config(video_id)
-    if particles is None or config != current_config:
-        seed_value = int(video_id.replace('-', ''), 16) if video_id.replace('-', '').isalnum() else 42
-        init_particles(w, h, config, seed=seed_value)
+    state = get_particle_state(video_id, w, h, config, layer_scale)
+    particles = state["particles"]
+    width, height = state["size"]
 
-    layer = np.zeros_like(frame, dtype=np.float32)
+    layer = np.zeros_like(small)
 
     # Convert color to integer tuple for OpenCV
     color_tuple = tuple(int(c) for c in config['color'])
 
-    # Draw particles
-    xs = particles['x'].astype(np.int32)
-    ys = particles['y'].astype(np.int32)
-    sizes = np.maximum(1, np.round(particles['size']).astype(np.int32))
+    # Draw particles (lower quality levels draw a subset; all of them keep moving)
+    drawn = particles[::DRAW_STRIDE[quality]]
+    xs = drawn['x'].astype(np.int32)
+    ys = drawn['y'].astype(np.int32)
+    sizes = np.maximum(1, np.round(drawn['size']).astype(np.int32))
 
     for x, y, s in zip(xs, ys, sizes):
-        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+        if 0 <= x < width and 0 <= y < height:
             cv2.circle(layer, (x, y), s, color_tuple, -1)
 
-    # Update particle positions
-    particles['x'] += particles['vx']
-    particles['y'] += particles['vy']
+    # Update particle positions (faster on onsets, brighter with the highs)
+    step, alpha = 1.0, ALPHA
+    if audio_features is not None:
+        step = 0.4 + 1.6 * float(audio_features["onset"][frame_idx])
+        alpha = ALPHA * (0.6 + 0.6 * float(audio_features["high"][frame_idx]))
+    particles['x'] += particles['vx'] * step
+    particles['y'] += particles['vy'] * step
 
     # Bounce off edges
-    mask_x = (particles['x'] < 0) | (particles['x'] >= WIDTH)
-    mask_y = (particles['y'] < 0) | (particles['y'] >= HEIGHT)
+    mask_x = (particles['x'] < 0) | (particles['x'] >= width)
+    mask_y = (particles['y'] < 0) | (particles['y'] >= height)
     particles['vx'][mask_x] *= -1
     particles['vy'][mask_y] *= -1
 
-    # Blend
-    layer_uint8 = np.clip(layer, 0, 255).astype(np.uint8)
-    final = cv2.addWeighted(frame, 1.0, layer_uint8, ALPHA, 0)
-    return final
+    return layer, alpha
+
+def apply_effect_frame(frame, frame_idx=0, fps=30, video_id="default", render_scale=1.0, audio_features=None, quality=0):
+    return multires.apply_layer(frame, apply_effect_layer, EFFECT_META["working_scale"], EFFECT_META["blend"],
+                                frame_idx=frame_idx, fps=fps, video_id=video_id, render_scale=render_scale,
+                                audio_features=audio_features, quality=quality)
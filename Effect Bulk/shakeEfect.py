@@ -3,8 +3,21 @@ import numpy as np
 import math
 import os
 import json
+import uuid
 import random
 import itertools
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import usage_lock
+
+EFFECT_META = {"stateful": False, "frame_invariant": False, "quality_levels": 2}
+
+# quality 0: bilinear warp, 1: nearest-neighbour warp (about 2x cheaper)
+WARP_INTERPOLATION = [cv2.INTER_LINEAR, cv2.INTER_NEAREST]
 
 USAGE_FILE = os.path.join(os.path.dirname(__file__), "effect_usage.json")
 
@@ -33,44 +46,52 @@ def load_usage():
     return {"used": [], "video_map": {}}
 
 def save_usage(data):
-    with open(USAGE_FILE, "w") as f:
+    # Write-then-rename so a reader on another machine never sees a half-written file
+    tmp_path = f"{USAGE_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, USAGE_FILE)
 
 USAGE_DATA = load_usage()
 
 def pick_effect_for_video(video_id):
+    global USAGE_DATA
     if video_id in USAGE_DATA["video_map"]:
         return USAGE_DATA["video_map"][video_id]
 
-    used = [tuple(e) for e in USAGE_DATA["used"]]
+    # Other render processes pick from the same file: re-read it under the lock
+    with usage_lock.locked(USAGE_FILE):
+        USAGE_DATA = load_usage()
+        if video_id in USAGE_DATA["video_map"]:
+            return USAGE_DATA["video_map"][video_id]
+
+        used = [tuple(e) for e in USAGE_DATA["used"]]
 
-    if len(used) >= len(EFFECT_COMBOS):
-        USAGE_DATA["used"] = []
-        used = []
+        if len(used) >= len(EFFECT_COMBOS):
+            USAGE_DATA["used"] = []
+            used = []
 
-    available = [combo for combo in EFFECT_COMBOS if tuple(combo) not in used]
-    chosen = random.choice(available)
+        available = [combo for combo in EFFECT_COMBOS if tuple(combo) not in used]
+        chosen = random.choice(available)
 
-    USAGE_DATA["used"].append(chosen)
-    USAGE_DATA["video_map"][video_id] = chosen
-    save_usage(USAGE_DATA)
+        USAGE_DATA["used"].append(chosen)
+        USAGE_DATA["video_map"][video_id] = chosen
+        save_usage(USAGE_DATA)
     return chosen
 
 # -----------------------------
 # Normal-speed, professional motion
 # -----------------------------
-def apply_effect_frame(frame, frame_idx, fps=30, video_id="default"):
-    h, w = frame.shape[:2]
-    t = frame_idx / fps
-
-    chosen_effects = pick_effect_for_video(video_id)
-
+def shake_matrix(chosen_effects, t, w, h, px, bass=None, beat=None):
+    """2x3 affine transform of the chosen motions at time t."""
     # Identity transform
     M_total = np.eye(3)
 
     # ----- ZOOM -----
     if "zoom" in chosen_effects:
         zoom_factor = 1 + 0.01 * math.sin(2 * math.pi * 0.1 * t)  # ±1%
+        if bass is not None:
+            zoom_factor = 1 + 0.015 * bass  # breathes with the bass
         M_zoom = cv2.getRotationMatrix2D((w//2, h//2), 0, zoom_factor)
         M_zoom = np.vstack([M_zoom, [0,0,1]])
         M_total = M_zoom @ M_total
@@ -78,31 +99,33 @@ def apply_effect_frame(frame, frame_idx, fps=30, video_id="default"):
     # ----- PULSE ZOOM -----
     if "pulse_zoom" in chosen_effects:
         zoom_factor = 1 + 0.02 * abs(math.sin(2 * math.pi * 0.25 * t))  # ±2%
+        if beat is not None:
+            zoom_factor = 1 + 0.02 * beat  # kicks on every beat
         M_pulse = cv2.getRotationMatrix2D((w//2, h//2), 0, zoom_factor)
         M_pulse = np.vstack([M_pulse, [0,0,1]])
         M_total = M_pulse @ M_total
 
     # ----- PAN (x shift) -----
     if "pan" in chosen_effects:
-        dx = int(12 * math.sin(2 * math.pi * 0.06 * t))  # ~12px
+        dx = int(12 * px * math.sin(2 * math.pi * 0.06 * t))  # ~12px
         M_pan = np.array([[1,0,dx],[0,1,0],[0,0,1]], dtype=float)
         M_total = M_pan @ M_total
 
     # ----- FLOAT (y shift) -----
     if "float" in chosen_effects:
-        dy = int(10 * math.sin(2 * math.pi * 0.06 * t))  # ~10px
+        dy = int(10 * px * math.sin(2 * math.pi * 0.06 * t))  # ~10px
         M_float = np.array([[1,0,0],[0,1,dy],[0,0,1]], dtype=float)
         M_total = M_float @ M_total
 
     # ----- DIAGONAL PAN -----
     if "diag_pan" in chosen_effects:
-        shift = int(12 * math.sin(2 * math.pi * 0.05 * t))  # ~12px
+        shift = int(12 * px * math.sin(2 * math.pi * 0.05 * t))  # ~12px
         M_diag_pan = np.array([[1,0,shift],[0,1,shift],[0,0,1]], dtype=float)
         M_total = M_diag_pan @ M_total
 
     # ----- DIAGONAL FLOAT -----
     if "diag_float" in chosen_effects:
-        shift = int(10 * math.sin(2 * math.pi * 0.07 * t))  # ~10px
+        shift = int(10 * px * math.sin(2 * math.pi * 0.07 * t))  # ~10px
         M_diag_float = np.array([[1,0,-shift],[0,1,shift],[0,0,1]], dtype=float)
         M_total = M_diag_float @ M_total
 
@@ -121,8 +144,40 @@ def apply_effect_frame(frame, frame_idx, fps=30, video_id="default"):
         M_spiral = np.vstack([M_spiral, [0,0,1]])
         M_total = M_spiral @ M_total
 
+    return M_total[:2]
+
+
+def frame_drive(frame_indices, render_scale, audio_features):
+    """Per-frame pixel scale, bass and beat as vectors (bass/beat None without audio features)."""
+    px = np.full(len(frame_indices), float(render_scale))  # pixel amplitudes are for full resolution
+    if audio_features is None:
+        return px, None, None
+    # Audio-reactive drive (0..1 per frame); fixed sine curves when unavailable
+    px *= 0.6 + 0.8 * audio_features["rms"][frame_indices].astype(np.float64)
+    return px, audio_features["low"][frame_indices], audio_features["beat"][frame_indices]
+
+
+def apply_effect_frame(frame, frame_idx, fps=30, video_id="default", render_scale=1.0, audio_features=None, quality=0):
+    h, w = frame.shape[:2]
+    px, bass, beat = frame_drive([frame_idx], render_scale, audio_features)
+    chosen_effects = pick_effect_for_video(video_id)
+    M_affine = shake_matrix(chosen_effects, frame_idx / fps, w, h, px[0],
+                            None if bass is None else float(bass[0]), None if beat is None else float(beat[0]))
+
     # Apply once
-    M_affine = M_total[:2]
-    frame = cv2.warpAffine(frame, M_affine, (w, h), borderMode=cv2.BORDER_REFLECT)
+    return cv2.warpAffine(frame, M_affine, (w, h), flags=WARP_INTERPOLATION[quality],
+                          borderMode=cv2.BORDER_REFLECT)
 
-    return frame
+
+def apply_effect_batch(frames, frame_indices, fps=30, video_id="default", render_scale=1.0, audio_features=None, quality=0):
+    """apply_effect_frame over a (K, H, W, 3) stack: one preset lookup, every warp written into one output stack."""
+    h, w = frames.shape[1:3]
+    px, bass, beat = frame_drive(frame_indices, render_scale, audio_features)
+    chosen_effects = pick_effect_for_video(video_id)
+    out = np.empty_like(frames)
+    for j, frame_idx in enumerate(frame_indices):
+        M_affine = shake_matrix(chosen_effects, frame_idx / fps, w, h, px[j],
+                                None if bass is None else float(bass[j]), None if beat is None else float(beat[j]))
+        cv2.warpAffine(frames[j], M_affine, (w, h), dst=out[j], flags=WARP_INTERPOLATION[quality],
+                       borderMode=cv2.BORDER_REFLECT)
+    return out
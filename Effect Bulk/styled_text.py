@@ -2,6 +2,17 @@ import cv2
 import random
 import os
 import json
+import uuid
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import usage_lock
+
+EFFECT_META = {"stateful": False, "frame_invariant": True, "layout": True, "region_local": True}
+MAX_TEXT_WIDTH = 0.9  # share of the frame width; longer titles are drawn smaller (e.g. vertical video)
 
 # -----------------------------
 # JSON persistence
@@ -18,8 +29,11 @@ def load_usage():
     return {"video_map": {}}
 
 def save_usage(data):
-    with open(USAGE_FILE, "w") as f:
+    # Write-then-rename so a reader on another machine never sees a half-written file
+    tmp_path = f"{USAGE_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, USAGE_FILE)
 
 USAGE_DATA = load_usage()
 
@@ -44,6 +58,15 @@ def get_random_color():
 # -----------------------------
 # Core drawing function
 # -----------------------------
+def fit_text(text, font, scale, thickness, max_width=None):
+    """(scale, (width, height), baseline) with the scale reduced to fit max_width."""
+    text_size, baseline = cv2.getTextSize(text, font, scale, thickness)
+    if max_width and text_size[0] > max_width:
+        scale *= max_width / text_size[0]
+        text_size, baseline = cv2.getTextSize(text, font, scale, thickness)
+    return scale, text_size, baseline
+
+
 def draw_styled_text(
     frame,
     text,
@@ -54,8 +77,11 @@ def draw_styled_text(
     outline_color=(0, 0, 0),
     x_offset=0,
     y_from_bottom=100,
+    shadow_offset=3,
+    outline_width=4,
+    max_width=None,
 ):
-    text_size, _ = cv2.getTextSize(text, font, scale, thickness)
+    scale, text_size, _ = fit_text(text, font, scale, thickness, max_width)
     text_w, text_h = text_size
     H, W = frame.shape[:2]
 
@@ -67,11 +93,11 @@ def draw_styled_text(
     cv2.putText(
         frame,
         text,
-        (pos[0] + 3, pos[1] + 3),
+        (pos[0] + shadow_offset, pos[1] + shadow_offset),
         font,
         scale,
         outline_color,
-        thickness + 4,
+        thickness + outline_width,
         cv2.LINE_AA,
     )
     # Main text
@@ -92,34 +118,71 @@ def draw_styled_text(
 # Style picker with JSON memory
 # -----------------------------
 def pick_style_for_video(video_id):
+    global USAGE_DATA
     if video_id in USAGE_DATA["video_map"]:
         return USAGE_DATA["video_map"][video_id]
 
-    chosen = {
-        "font": random.choice(FONT_CHOICES),
-        "color": get_random_color(),
-        "scale": round(random.uniform(1.2, 1.8), 2),
-        "thickness": random.randint(2, 3),
-        "outline": (0, 0, 0),
-    }
+    # Other render processes save to the same file: re-read it under the lock
+    with usage_lock.locked(USAGE_FILE):
+        USAGE_DATA = load_usage()
+        if video_id in USAGE_DATA["video_map"]:
+            return USAGE_DATA["video_map"][video_id]
 
-    USAGE_DATA["video_map"][video_id] = chosen
-    save_usage(USAGE_DATA)
+        chosen = {
+            "font": random.choice(FONT_CHOICES),
+            "color": get_random_color(),
+            "scale": round(random.uniform(1.2, 1.8), 2),
+            "thickness": random.randint(2, 3),
+            "outline": (0, 0, 0),
+        }
+
+        USAGE_DATA["video_map"][video_id] = chosen
+        save_usage(USAGE_DATA)
     return chosen
 
 # -----------------------------
 # Main effect function
 # -----------------------------
-def apply_effect_frame(frame, audio_name="Unknown", video_id="default", **kwargs):
-    style = pick_style_for_video(video_id)
-    frame = draw_styled_text(
-        frame,
-        audio_name.upper(),
+def caption_params(style, render_scale, frame_width):
+    # Style sizes are for full resolution; previews shrink them with the frame
+    return dict(
         font=style["font"],
-        scale=style["scale"],
-        thickness=style["thickness"],
+        scale=style["scale"] * render_scale,
+        thickness=max(1, round(style["thickness"] * render_scale)),
         color=tuple(style["color"]),
         outline_color=tuple(style["outline"]),
-        y_from_bottom=80,
+        y_from_bottom=int(80 * render_scale),
+        shadow_offset=max(1, round(3 * render_scale)),
+        outline_width=max(1, round(4 * render_scale)),
+        max_width=int(frame_width * MAX_TEXT_WIDTH),
     )
+
+
+def draw_caption(frame, text, style, render_scale):
+    return draw_styled_text(frame, text, **caption_params(style, render_scale, frame.shape[1]))
+
+
+def effect_region(shape, audio_name="Unknown", video_id="default", render_scale=1.0):
+    """Box around the caption with its outline and shadow (see dirty_rects)."""
+    p = caption_params(pick_style_for_video(video_id), render_scale, shape[1])
+    _, (text_w, text_h), baseline = fit_text(audio_name.upper(), p["font"], p["scale"], p["thickness"], p["max_width"])
+    pos_x = shape[1] // 2 - text_w // 2
+    pos_y = shape[0] - p["y_from_bottom"]
+    pad = p["thickness"] + p["outline_width"] + text_h // 4 + 2   # strokes and script-font swashes
+    return (pos_x - pad, pos_y - text_h - pad,
+            pos_x + text_w + p["shadow_offset"] + pad, pos_y + baseline + p["shadow_offset"] + pad)
+
+
+def apply_effect_frame(frame, audio_name="Unknown", video_id="default", render_scale=1.0, **kwargs):
+    style = pick_style_for_video(video_id)
+    frame = draw_caption(frame, audio_name.upper(), style, render_scale)
     return frame
+
+
+def apply_effect_batch(frames, frame_indices, audio_name="Unknown", video_id="default", render_scale=1.0, **kwargs):
+    """The caption drawn in place on every frame of the stack; the style is looked up once."""
+    style = pick_style_for_video(video_id)
+    text = audio_name.upper()
+    for frame in frames:
+        draw_caption(frame, text, style, render_scale)
+    return frames
@@ -3,6 +3,14 @@ import os
 import imageio
 import random
 import json
+import uuid
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import usage_lock
 
 # -----------------------------
 # CONFIG
@@ -11,6 +19,7 @@ GIF_FOLDER = r"C:\Users\Mr_robot\Desktop\videoeditautomation\SubscribeEmoji"
 USAGE_FILE = os.path.join(GIF_FOLDER, "gif_usage.json")
 VIDEO_WIDTH = 1280
 TARGET_RATIO = 0.25
+EFFECT_META = {"stateful": False, "frame_invariant": False, "layout": True, "region_local": True}
 
 # -----------------------------
 # Load & preprocess GIFs
@@ -33,7 +42,9 @@ def load_gifs(folder, video_width, ratio=0.25):
             target_width = int(video_width * ratio)
             frames = []
             for frame in frames_raw:
-                frame_rgba = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGRA)
+                # imageio may decode the first GIF frame without an alpha channel
+                code = cv2.COLOR_RGBA2BGRA if frame.shape[2] == 4 else cv2.COLOR_RGB2BGRA
+                frame_rgba = cv2.cvtColor(frame, code)
                 scale = target_width / frame_rgba.shape[1]
                 target_height = int(frame_rgba.shape[0] * scale)
                 resized = cv2.resize(frame_rgba, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4)
@@ -60,8 +71,11 @@ def load_usage():
     return {"used": [], "video_map": {}}
 
 def save_usage(data):
-    with open(USAGE_FILE, "w") as f:
+    # Write-then-rename so a reader on another machine never sees a half-written file
+    tmp_path = f"{USAGE_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, USAGE_FILE)
 
 USAGE_DATA = load_usage()
 
@@ -69,28 +83,36 @@ USAGE_DATA = load_usage()
 # Pick GIF fairly
 # -----------------------------
 def pick_gif_for_video(video_id):
+    global USAGE_DATA
     # If video already has an assigned GIF, return it
     if video_id in USAGE_DATA["video_map"]:
         gif_name = USAGE_DATA["video_map"][video_id]
         return ALL_GIFS.get(gif_name, random.choice(list(ALL_GIFS.values())))
 
-    all_names = list(ALL_GIFS.keys())
-    used_names = set(USAGE_DATA["used"])
+    # Other render processes pick from the same file: re-read it under the lock
+    with usage_lock.locked(USAGE_FILE):
+        USAGE_DATA = load_usage()
+        if video_id in USAGE_DATA["video_map"]:
+            gif_name = USAGE_DATA["video_map"][video_id]
+            return ALL_GIFS.get(gif_name, random.choice(list(ALL_GIFS.values())))
 
-    # Reset if all used
-    if len(used_names) >= len(all_names):
-        USAGE_DATA["used"] = []
-        used_names = set()
+        all_names = list(ALL_GIFS.keys())
+        used_names = set(USAGE_DATA["used"])
 
-    # Available choices
-    available = [g for g in all_names if g not in used_names]
-    if not available:
-        available = all_names  # fallback
+        # Reset if all used
+        if len(used_names) >= len(all_names):
+            USAGE_DATA["used"] = []
+            used_names = set()
 
-    chosen_name = random.choice(available)
-    USAGE_DATA["used"].append(chosen_name)
-    USAGE_DATA["video_map"][video_id] = chosen_name
-    save_usage(USAGE_DATA)
+        # Available choices
+        available = [g for g in all_names if g not in used_names]
+        if not available:
+            available = all_names  # fallback
+
+        chosen_name = random.choice(available)
+        USAGE_DATA["used"].append(chosen_name)
+        USAGE_DATA["video_map"][video_id] = chosen_name
+        save_usage(USAGE_DATA)
 
     return ALL_GIFS[chosen_name]
 
@@ -109,12 +131,29 @@ def overlay_frame(background, overlay, x, y):
             alpha_l * background[y:y+h, x:x+w, c]
         )
 
+# -----------------------------
+# Reduced-resolution previews
+# -----------------------------
+SCALED_FRAMES = {}
+
+def scaled_gif_frame(gif_frames, gif_idx, render_scale):
+    """GIF frame resized for a preview render, cached per (gif, scale, frame)."""
+    if render_scale == 1.0:
+        return gif_frames[gif_idx]
+    key = (id(gif_frames), render_scale, gif_idx)
+    if key not in SCALED_FRAMES:
+        src = gif_frames[gif_idx]
+        size = (max(1, int(src.shape[1] * render_scale)), max(1, int(src.shape[0] * render_scale)))
+        SCALED_FRAMES[key] = cv2.resize(src, size, interpolation=cv2.INTER_AREA)
+    return SCALED_FRAMES[key]
+
 # -----------------------------
 # Main effect
 # -----------------------------
-def apply_effect_frame(frame, frame_idx, fps=30, video_id="default"):
+def gif_frame_at(shape, frame_idx, fps, video_id, render_scale):
+    """(GIF frame, x, y) shown at this frame, or None outside the GIF's time window."""
     if not ALL_GIFS:
-        return frame
+        return None
 
     gif_frames = pick_gif_for_video(video_id)
     total_frames = len(gif_frames)
@@ -125,18 +164,36 @@ def apply_effect_frame(frame, frame_idx, fps=30, video_id="default"):
     elapsed = frame_idx / fps
 
     if elapsed < start_time:
-        return frame
+        return None
 
     gif_elapsed = elapsed - start_time
     gif_idx = int((gif_elapsed / duration) * total_frames)
     if gif_idx >= total_frames:
-        return frame
+        return None
 
-    gif_frame = gif_frames[gif_idx]
+    gif_frame = scaled_gif_frame(gif_frames, gif_idx, render_scale)
 
     # Bottom-right with padding
-    x = frame.shape[1] - gif_frame.shape[1] - 12
-    y = frame.shape[0] - gif_frame.shape[0] - 12
+    padding = int(round(12 * render_scale))
+    x = shape[1] - gif_frame.shape[1] - padding
+    y = shape[0] - gif_frame.shape[0] - padding
+    return gif_frame, x, y
+
+
+def effect_region(shape, frame_idx=0, fps=30, video_id="default", render_scale=1.0):
+    """Box of the GIF frame on screen, None while no GIF is shown (see dirty_rects)."""
+    shown = gif_frame_at(shape, frame_idx, fps, video_id, render_scale)
+    if shown is None:
+        return None
+    gif_frame, x, y = shown
+    return x, y, x + gif_frame.shape[1], y + gif_frame.shape[0]
+
+
+def apply_effect_frame(frame, frame_idx, fps=30, video_id="default", render_scale=1.0):
+    shown = gif_frame_at(frame.shape, frame_idx, fps, video_id, render_scale)
+    if shown is None:
+        return frame
+    gif_frame, x, y = shown
     overlay_frame(frame, gif_frame, x, y)
 
     return frame
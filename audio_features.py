@@ -0,0 +1,202 @@
+import os
+import hashlib
+import subprocess
+import numpy as np
+
+# -----------------------
+# Per-frame audio features
+# -----------------------
+# The track is decoded once through an ffmpeg pipe and analysed with whole-array
+# NumPy operations. Every feature has one value per video frame at the render
+# fps and is normalised to 0..1 over the track, so effects can use them as
+# gains directly:
+#
+#   rms      loudness
+#   onset    spectral flux (how much new energy appears)
+#   low      band energy below 250 Hz (kick / bass)
+#   mid      band energy 250 Hz - 4 kHz
+#   high     band energy above 4 kHz (hats / air)
+#   beat     1.0 on a detected beat, decaying exponentially until the next one
+#   beats    frame indices of the detected beats
+#
+# Results are cached on disk keyed by the audio content hash and analysis
+# settings, so re-rendering the same track skips the analysis entirely.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "audio_features_cache")
+
+SAMPLE_RATE = 22050
+N_FFT = 2048
+LOW_HZ = 250
+HIGH_HZ = 4000
+BEAT_DECAY_SECONDS = 0.25
+FEATURE_VERSION = 1
+CHUNK_FRAMES = 1024
+
+FEATURE_NAMES = ("rms", "onset", "low", "mid", "high", "beat")
+
+# -----------------------
+# Decode & hash
+# -----------------------
+def decode_audio(audio_path, sample_rate=SAMPLE_RATE):
+    """Decode any ffmpeg-readable file (mp3, wav, mp4...) to mono float32 samples."""
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", audio_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1",
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype="<f4")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# -----------------------
+# Analysis
+# -----------------------
+def _normalise(values):
+    top = np.percentile(values, 99) if values.size else 0.0
+    if top <= 0:
+        return np.zeros_like(values, dtype=np.float32)
+    return np.clip(values / top, 0, 1).astype(np.float32)
+
+
+def _frame_spectra(samples, starts, n_fft):
+    """Magnitude spectra of windows starting at `starts`, computed in chunks."""
+    padded = np.concatenate([samples, np.zeros(n_fft, dtype=np.float32)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n_fft)
+    hann = np.hanning(n_fft).astype(np.float32)
+    spectra = np.empty((starts.size, n_fft // 2 + 1), dtype=np.float32)
+    rms = np.empty(starts.size, dtype=np.float32)
+    for i in range(0, starts.size, CHUNK_FRAMES):
+        block = windows[starts[i:i + CHUNK_FRAMES]]
+        rms[i:i + CHUNK_FRAMES] = np.sqrt(np.mean(block ** 2, axis=1))
+        spectra[i:i + CHUNK_FRAMES] = np.abs(np.fft.rfft(block * hann, axis=1))
+    return spectra, rms
+
+
+def detect_beats(onset, fps, min_bpm=60, max_bpm=180):
+    """Tempo from onset autocorrelation, then one beat per period at onset peaks."""
+    n = onset.size
+    if n < 4:
+        return np.zeros(0, dtype=np.int64)
+    env = onset - onset.mean()
+    ac = np.correlate(env, env, mode="full")[n - 1:]
+    min_lag = max(1, int(round(fps * 60 / max_bpm)))
+    max_lag = min(n - 1, int(round(fps * 60 / min_bpm)))
+    if max_lag <= min_lag:
+        return np.zeros(0, dtype=np.int64)
+    period = min_lag + int(np.argmax(ac[min_lag:max_lag + 1]))
+
+    # Local maxima above the average onset, at least ~0.7 periods apart
+    peaks = np.flatnonzero(
+        (onset[1:-1] >= onset[:-2]) & (onset[1:-1] > onset[2:]) & (onset[1:-1] > onset.mean())
+    ) + 1
+    beats = []
+    min_gap = max(1, int(period * 0.7))
+    for p in peaks:
+        if not beats or p - beats[-1] >= min_gap:
+            beats.append(p)
+    return np.asarray(beats, dtype=np.int64)
+
+
+def beat_envelope(beats, total_frames, fps):
+    """1.0 on each beat, decaying exponentially until the next one."""
+    since = np.full(total_frames, np.inf, dtype=np.float32)
+    if beats.size:
+        idx = np.arange(total_frames)
+        last = np.searchsorted(beats, idx, side="right") - 1
+        valid = last >= 0
+        since[valid] = (idx[valid] - beats[last[valid]]) / fps
+    return np.exp(-since / BEAT_DECAY_SECONDS).astype(np.float32)
+
+
+def analyse(samples, fps, total_frames=None, sample_rate=SAMPLE_RATE):
+    """Compute the per-frame feature dict for decoded samples."""
+    hop = sample_rate / fps
+    if total_frames is None:
+        total_frames = int(samples.size / hop)
+    centers = (np.arange(total_frames) * hop).astype(np.int64)
+    starts = np.clip(centers - N_FFT // 2, 0, max(0, samples.size - 1))
+
+    spectra, rms = _frame_spectra(samples, starts, N_FFT)
+    power = spectra ** 2
+    freqs = np.fft.rfftfreq(N_FFT, 1 / sample_rate)
+    low = power[:, freqs < LOW_HZ].mean(axis=1)
+    mid = power[:, (freqs >= LOW_HZ) & (freqs < HIGH_HZ)].mean(axis=1)
+    high = power[:, freqs >= HIGH_HZ].mean(axis=1)
+
+    log_mag = np.log1p(spectra)
+    flux = np.zeros(total_frames, dtype=np.float32)
+    if total_frames > 1:
+        flux[1:] = np.maximum(0, np.diff(log_mag, axis=0)).sum(axis=1)
+    onset = _normalise(flux)
+
+    beats = detect_beats(onset, fps)
+    return {
+        "fps": np.float32(fps),
+        "rms": _normalise(rms),
+        "onset": onset,
+        "low": _normalise(np.log1p(low)),
+        "mid": _normalise(np.log1p(mid)),
+        "high": _normalise(np.log1p(high)),
+        "beat": beat_envelope(beats, total_frames, fps),
+        "beats": beats,
+    }
+
+# -----------------------
+# Cached entry point
+# -----------------------
+def cache_path(audio_path, fps, cache_dir=CACHE_DIR):
+    key = f"{file_hash(audio_path)}_{fps:g}fps_v{FEATURE_VERSION}"
+    return os.path.join(cache_dir, key + ".npz")
+
+
+def load_audio_features(audio_path, fps, total_frames=None, cache_dir=CACHE_DIR):
+    """
+    Return the feature dict for audio_path at fps, from cache when possible.
+    Returns None (and effects fall back to their fixed curves) if decoding fails.
+    """
+    if not fps or fps <= 0:
+        # Some containers report no frame rate (CAP_PROP_FPS == 0)
+        print(f"⚠️ No frame rate for {audio_path}; rendering without audio features")
+        return None
+    try:
+        path = cache_path(audio_path, fps, cache_dir)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                features = {k: data[k] for k in data.files}
+        else:
+            samples = decode_audio(audio_path)
+            features = analyse(samples, fps)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path[:-len(".npz")] + ".tmp.npz"
+            np.savez(tmp_path, **features)
+            os.replace(tmp_path, path)
+            print(f"🎵 Audio features cached: {os.path.basename(path)} ({features['beats'].size} beats)")
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        print(f"⚠️ Audio analysis failed for {audio_path}: {e}")
+        return None
+
+    if total_frames is not None:
+        # Pad or trim so every frame of the render has a value
+        for name in FEATURE_NAMES:
+            values = features[name]
+            if values.size < total_frames:
+                values = np.pad(values, (0, total_frames - values.size), mode="edge" if values.size else "constant")
+            features[name] = values[:total_frames]
+    return features
+
+
+def feature_at(audio_features, name, frame_idx, default=0.0):
+    """Safe lookup for effects: default when features are missing or out of range."""
+    if audio_features is None:
+        return default
+    values = audio_features.get(name)
+    if values is None or not 0 <= frame_idx < values.size:
+        return default
+    return float(values[frame_idx])
@@ -1,11 +1,23 @@
 import os
 import cv2
-import glob
+import numpy as np
 import subprocess
-import importlib.util
 import inspect
 import random
 import uuid
+from functools import partial
+
+import render_trace as trace
+import render_metrics as metrics
+import effect_registry
+from mp4_fragments import FragmentWatcher
+from mkv_pipe import MatroskaFrameWriter
+from quality_control import QualityController
+import multires
+import frame_batch
+import dirty_rects
+from audio_features import load_audio_features
+from thumbnail_sink import ThumbnailSink, text_for
 
 # Directories
 base_dir = r"C:\Users\Mr_robot\Desktop\videoeditautomation"
@@ -16,23 +28,87 @@ effects_dir = os.path.join(base_dir, 'Effect Bulk')
 
 os.makedirs(output_dir, exist_ok=True)
 
+# Analyse the track once per video so effects can follow the music
+AUDIO_REACTIVE = True
+
+# MP4 layout: "standard" (moov at the end), "faststart" (moov moved to the
+# front after encoding) or "fragmented" (moof/mdat pieces that are final as
+# soon as they are written; see mp4_fragments)
+OUTPUT_MODE = "standard"
+# Fragmented mode: a keyframe, and so a fragment, every FRAGMENT_SECONDS of video
+# time. Keyframes are forced by timestamp and the frame on each boundary is
+# always written, so fragments keep coming while DEDUP_FRAMES skips frames.
+FRAGMENT_SECONDS = 2
+
+# Skip frames identical to the previous one: frames go to FFmpeg with
+# timestamps (see mkv_pipe) and the output is variable frame rate, so a
+# repeated frame costs neither a pipe write nor an encode.
+DEDUP_FRAMES = True
+
+# Render fps to hold by stepping effects with "quality_levels" down (None = off)
+TARGET_RENDER_FPS = None
+
+# Run effects that declare a "working_scale" on a downscaled input (see multires)
+MULTIRES_LAYERS = True
+
+# Pick the best rendered frame and save <video>_thumbnail.jpg next to the video
+THUMBNAILS = True
+
+# Render several frames at a time when an effect has apply_effect_batch (see
+# frame_batch): True = batch size fitted to the CPU cache, an int pins it, False = off
+BATCH_FRAMES = True
+
+# Reuse frame-invariant effect output while its input is unchanged, skip
+# region-local effects that draw nothing and hand the changed box to the
+# encoder's duplicate check (see dirty_rects)
+DIRTY_RECTS = True
+
 # -----------------------
-# Load effect modules dynamically
+# Load effect modules lazily
 # -----------------------
-def load_effect_modules():
-    modules = []
-    for effect_file in glob.glob(os.path.join(effects_dir, "*.py")):
-        name = os.path.splitext(os.path.basename(effect_file))[0]
-        spec = importlib.util.spec_from_file_location(name, effect_file)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        if hasattr(module, "apply_effect_frame"):
-            modules.append(module.apply_effect_frame)
-        else:
-            print(f"⚠️ Skipping {effect_file} (no apply_effect_frame function)")
-    return modules
+# Plugins are discovered from their source (see effect_registry) and only
+# imported when selected; imported modules stay cached until their file changes.
+effects_list = None  # set to pin the default chain (e.g. benchmarks)
+
+def load_effect_modules(names=None):
+    """Effect functions for the named plugins (None = all), in chain order."""
+    return effect_registry.load_effects(effects_dir, names)
+
+
+def default_effects():
+    return effects_list if effects_list is not None else load_effect_modules()
+
+# -----------------------
+# Effect call arguments
+# -----------------------
+_effect_params = {}
+
+def make_effect_context(fps, video_id, audio_name, render_scale=1.0, audio_features=None):
+    """Per-video values an effect may ask for by naming them in its signature."""
+    return {
+        "fps": fps,
+        "video_id": video_id,
+        "audio_name": audio_name,
+        "render_scale": render_scale,
+        "audio_features": audio_features,
+    }
 
-effects_list = load_effect_modules()
+
+def get_effect_kwargs(effect, frame_idx, context):
+    """Build the keyword arguments an effect declares (signature is inspected once)."""
+    params = _effect_params.get(effect)
+    if params is None:
+        declared = inspect.signature(effect).parameters
+        params = _effect_params[effect] = (
+            "frame_idx" in declared,
+            [name for name in declared if name in context],
+        )
+
+    wants_frame_idx, names = params
+    kwargs = {name: context[name] for name in names}
+    if wants_frame_idx:
+        kwargs["frame_idx"] = frame_idx
+    return kwargs
 
 # -----------------------
 # Unique random video name
@@ -42,121 +118,523 @@ def get_random_video_name(output_dir, prefix="video_", ext=".mp4"):
     return os.path.join(output_dir, f"{prefix}{unique_id}{ext}")
 
 # -----------------------
-# Main video creation function (direct streaming to FFmpeg)
+# Background image and audio probe
 # -----------------------
-def create_video(image_path, audio_path, output_path, fps=10):
-    print(f"\n🎬 Starting video creation for: {os.path.basename(audio_path)}")
-
-    # 1. Image and Dimensions
+def load_background(image_path, scale=1.0):
+    """Load the still image at FFmpeg-compatible even dimensions, optionally downscaled."""
     img = cv2.imread(image_path)
     if img is None:
         print(f"❌ Error: Image not found or could not be loaded: {image_path}")
-        return
+        return None
 
     h, w, _ = img.shape
+    if scale != 1.0:
+        w = max(2, int(round(w * scale)))
+        h = max(2, int(round(h * scale)))
 
     # ✅ Ensure FFmpeg-compatible even dimensions
     if w % 2 != 0:
         w -= 1
     if h % 2 != 0:
         h -= 1
-    img = cv2.resize(img, (w, h))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(img, (w, h), interpolation=interpolation)
 
-    # 2. Get Audio Duration and Frame Count
+
+def probe_duration(audio_path):
+    """Audio duration in seconds via ffprobe, or None on failure."""
     try:
         cmd_duration = [
             'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
             '-of', 'default=noprint_wrappers=1:nokey=1', audio_path
         ]
-        result = subprocess.run(cmd_duration, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        duration = float(result.stdout.strip())
-        total_frames = int(duration * fps)
-        print(f"✅ Audio duration: {duration:.2f}s, Total frames to process: {total_frames}")
-        if total_frames <= 0:
-            print("⚠️ Warning: Audio duration is too short. Skipping video creation.")
-            return
+        with trace.span("probe:ffprobe"):
+            result = subprocess.run(cmd_duration, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        return float(result.stdout.strip())
     except (subprocess.CalledProcessError, ValueError) as e:
         print(f"❌ Error getting audio duration with ffprobe: {e}")
-        return
+        return None
 
-    # 3. Start FFmpeg Subprocess
-    ffmpeg_cmd = [
-        'ffmpeg', '-y',
-        '-f', 'rawvideo',
-        '-vcodec', 'rawvideo',
-        '-pix_fmt', 'bgr24',
-        '-s', f'{w}x{h}',
-        '-r', str(fps),
-        '-i', 'pipe:0',
-        '-i', audio_path,
-        '-c:v', 'libx264',
-        '-preset', 'ultrafast',
-        '-pix_fmt', 'yuv420p',
-        '-c:a', 'aac',
-        '-shortest',
-        output_path
-    ]
-    process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+# -----------------------
+# Effect chain
+# -----------------------
+def effect_meta(effect):
+    plugin = effect_registry.plugin_for(effect)
+    return plugin.meta if plugin is not None else effect.__globals__.get("EFFECT_META", {})
 
-    # 4. Process and Write Frames
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    audio_name_text = os.path.splitext(os.path.basename(audio_path))[0]
+
+def quality_levels(effect):
+    """Number of quality levels an effect declares in EFFECT_META (1 = fixed quality)."""
+    return int(effect_meta(effect).get("quality_levels", 1))
+
+
+def layer_specs(effects, static=True):
+    """
+    Per effect: (apply_effect_layer, working_scale, blend, static_input) for
+    multi-resolution layers, else None. static_input is True when only
+    frame-invariant effects run before it, so its downscaled input can be reused
+    (static: whether the chain's own input is the same every frame).
+    """
+    specs = []
+    for effect in effects:
+        meta = effect_meta(effect)
+        layer_fn = effect.__globals__.get("apply_effect_layer")
+        scale = meta.get("working_scale", 1.0)
+        if MULTIRES_LAYERS and layer_fn is not None and scale < 1.0:
+            specs.append((layer_fn, scale, meta.get("blend", "add"), static))
+        else:
+            specs.append(None)
+        static = static and bool(meta.get("frame_invariant"))
+    return specs
+
+
+def apply_chain(frame, frame_idx, context, effects, layers, static_inputs, span_ids,
+                controller=None, timing=False):
+    """
+    Apply effects to one frame in sequence. layers come from layer_specs();
+    static_inputs (effect index -> downscaled input) persists across frames.
+    """
+    for i, (effect, span_id, layer) in enumerate(zip(effects, span_ids, layers)):
+        try:
+            if layer is not None:
+                layer_fn, scale, mode, static = layer
+                kwargs = get_effect_kwargs(layer_fn, frame_idx, context)
+                small = static_inputs.get(i)
+                if small is None:
+                    small = multires.downscale(frame, scale)
+                    if static:
+                        static_inputs[i] = small
+                run = partial(multires.apply_layer, layer_fn=layer_fn, scale=scale, mode=mode, small=small)
+            else:
+                kwargs = get_effect_kwargs(effect, frame_idx, context)
+                run = effect
+            if not timing:
+                frame = run(frame, **kwargs)
+                continue
+            name = effect.__module__
+            if controller is not None and name in controller.levels:
+                kwargs["quality"] = controller.level(name)
+            t0 = trace.now()
+            frame = run(frame, **kwargs)
+            if trace.ENABLED:
+                trace.record(span_id, t0, arg=frame_idx)
+            seconds = (trace.now() - t0) / 1e9
+            if controller is not None:
+                controller.record(name, seconds)
+            if metrics.ENABLED:
+                metrics.inc("render_effect_seconds_total", seconds, effect=name)
+
+        except Exception as e:
+            print(f"❌ Error applying effect {effect.__name__}: {e}")
+            metrics.inc("render_effect_errors_total", effect=effect.__module__)
+    return frame
 
 
-    print(f"✨ Applying {len(effects_list)} effects sequentially for {os.path.basename(output_path)}")
+def effect_region(effect, frame, frame_idx, context):
+    """Dirty box a region-local effect draws on this frame (FULL if it can't tell)."""
+    region_fn = effect.__globals__["effect_region"]
+    try:
+        return dirty_rects.clip(region_fn(frame.shape, **get_effect_kwargs(region_fn, frame_idx, context)),
+                                frame.shape)
+    except Exception as e:
+        print(f"❌ Error getting the region of {effect.__name__}: {e}")
+        return dirty_rects.FULL
+
+
+def render_frames(img, frame_indices, context, effects=None, controller=None, dirty=False):
+    """
+    Yield (frame_idx, frame) with every effect applied, in order; with dirty=True
+    (frame_idx, frame, region), region being where the frame can differ from the
+    previous one (see dirty_rects). Frames may be yielded more than once and
+    must not be modified.
+    With a QualityController, effects are timed and get its quality level.
+    """
+    effects = default_effects() if effects is None else effects
+    effect_span_ids = [trace.name_id(f"effect:{effect.__module__}") for effect in effects]
+    layers = layer_specs(effects)
+    frame_span_id = trace.name_id("frame")
+    timing = trace.ENABLED or controller is not None or metrics.ENABLED
+
+    metas = [effect_meta(effect) for effect in effects]
+    kinds = [dirty_rects.effect_kind(meta, effect.__globals__) if DIRTY_RECTS else "full"
+             for meta, effect in zip(metas, effects)]
+    reusable = [DIRTY_RECTS and bool(meta.get("frame_invariant")) for meta in metas]
+
+    # Batches help chains of full-frame effects; a chain that starts with
+    # reusable or region-local effects gains more from skipping them per frame
+    tracked = bool(kinds) and kinds[0] != "full"
+    batch_fns = [frame_batch.batch_entry(effect) for effect in effects] if BATCH_FRAMES and not tracked else []
+    if any(batch_fns):
+        for frame_idx, frame in render_batches(img, frame_indices, context, effects, batch_fns, layers,
+                                               effect_span_ids, controller, timing):
+            yield (frame_idx, frame, dirty_rects.FULL) if dirty else (frame_idx, frame)
+        return
+
+    static_inputs = [{} for _ in effects]   # per effect: downscaled input reused for every frame
+    outputs = [None] * len(effects)         # last output of reusable effects
+    boxes = [dirty_rects.CLEAN] * len(effects)
+    region = dirty_rects.FULL               # nothing to compare the first frame with
 
-    for frame_idx in range(total_frames):
-        frame = img.copy()
+    for frame_idx in frame_indices:
+        frame_start = trace.now() if timing else 0
+        frame, shared = img, True   # shared: owned by a cache, copy before drawing on it
 
         # ✅ Apply ALL effects in sequence
-        for effect in effects_list:
-            try:
-                sig = inspect.signature(effect)
-                params = sig.parameters
+        for i, effect in enumerate(effects):
+            if kinds[i] == "region":
+                box = effect_region(effect, frame, frame_idx, context)
+                changed = dirty_rects.union(box, boxes[i])
+                boxes[i] = box
+                if box == dirty_rects.CLEAN:
+                    # Draws nothing: only what it drew last frame goes away
+                    region = dirty_rects.union(region, changed)
+                    continue
+            if reusable[i] and region == dirty_rects.CLEAN and outputs[i] is not None:
+                frame, shared = outputs[i], True
+                if metrics.ENABLED:
+                    metrics.inc("render_effect_reused_total", effect=effect.__module__)
+                continue
+
+            if shared:
+                frame = frame.copy()
+            frame = apply_chain(frame, frame_idx, context, [effect], [layers[i]], static_inputs[i],
+                                [effect_span_ids[i]], controller, timing)
+            shared = False
+            region = dirty_rects.union(region, changed) if kinds[i] == "region" else dirty_rects.FULL
+            if reusable[i]:
+                outputs[i], shared = frame, True
+
+        if trace.ENABLED:
+            trace.record(frame_span_id, frame_start, arg=frame_idx)
+        if controller is not None:
+            controller.end_frame(frame_idx, (trace.now() - frame_start) / 1e9)
+        if metrics.ENABLED:
+            metrics.inc("render_frames_total")
+            metrics.observe("render_frame_seconds", (trace.now() - frame_start) / 1e9)
+        yield (frame_idx, frame, region) if dirty else (frame_idx, frame)
+        region = dirty_rects.CLEAN
 
-                kwargs = {}
-                if "frame_idx" in params:
-                    kwargs["frame_idx"] = frame_idx
-                if "fps" in params:
-                    kwargs["fps"] = fps
-                if "video_id" in params:
-                    kwargs["video_id"] = os.path.basename(output_path)
-                if "audio_name" in params:
-                    kwargs["audio_name"] = os.path.splitext(os.path.basename(audio_path))[0]
 
-                frame = effect(frame, **kwargs)
+def render_batches(img, frame_indices, context, effects, batch_fns, layers, span_ids,
+                   controller=None, timing=False):
+    """
+    render_frames for chains with batch-capable effects: a stack of frames goes
+    through each effect together; effects without apply_effect_batch run per frame.
+    """
+    size = frame_batch.batch_size(img.shape) if BATCH_FRAMES is True else int(BATCH_FRAMES)
+    static_inputs = [{} for _ in effects]
+    frame_span_id = trace.name_id("frame")
+
+    for batch in frame_batch.batches(frame_indices, size):
+        batch_start = trace.now() if timing else 0
+        frames = np.repeat(img[None], len(batch), axis=0)
+
+        for i, (effect, batch_fn) in enumerate(zip(effects, batch_fns)):
+            if batch_fn is None or layers[i] is not None:
+                frames = [apply_chain(frame, frame_idx, context, [effect], [layers[i]], static_inputs[i],
+                                      [span_ids[i]], controller, timing)
+                          for frame, frame_idx in zip(frames, batch)]
+                continue
+            try:
+                if not isinstance(frames, np.ndarray):
+                    frames = np.stack(frames)
+                kwargs = get_effect_kwargs(batch_fn, batch[0], context)
+                name = effect.__module__
+                if controller is not None and name in controller.levels:
+                    kwargs["quality"] = controller.level(name)
+                t0 = trace.now() if timing else 0
+                frames = batch_fn(frames, batch, **kwargs)
+                if not timing:
+                    continue
+                if trace.ENABLED:
+                    trace.record(span_ids[i], t0, arg=batch[0])
+                seconds = (trace.now() - t0) / 1e9
+                if controller is not None:
+                    controller.record(name, seconds / len(batch))
+                if metrics.ENABLED:
+                    metrics.inc("render_effect_seconds_total", seconds, effect=name)
 
             except Exception as e:
-                print(f"❌ Error applying effect {effect.__name__}: {e}")
+                print(f"❌ Error applying effect {effect.__name__} to a batch: {e}")
+                metrics.inc("render_effect_errors_total", effect=effect.__module__)
 
-        # Write frame to FFmpeg stdin
-        process.stdin.write(frame.tobytes())
+        per_frame = (trace.now() - batch_start) / 1e9 / len(batch) if timing else 0
+        for frame_idx, frame in zip(batch, frames):
+            if trace.ENABLED:
+                trace.record(frame_span_id, batch_start, arg=frame_idx)
+            if controller is not None:
+                controller.end_frame(frame_idx, per_frame)
+            if metrics.ENABLED:
+                metrics.inc("render_frames_total")
+                metrics.observe("render_frame_seconds", per_frame)
+            yield frame_idx, frame
 
+
+def frame_window(duration, fps, start_time=0.0, end_time=None):
+    """Frame index range covering [start_time, end_time) of the audio."""
+    end = duration if end_time is None else min(end_time, duration)
+    first = max(0, int(start_time * fps))
+    last = int(end * fps)
+    return range(first, max(first, last))
+
+# -----------------------
+# Main video creation function (direct streaming to FFmpeg)
+# -----------------------
+def output_flags(output_mode, fps):
+    """Extra ffmpeg output options for an OUTPUT_MODE."""
+    if output_mode == "faststart":
+        return ['-movflags', '+faststart']
+    if output_mode == "fragmented":
+        return ['-force_key_frames', f'expr:gte(t,n_forced*{FRAGMENT_SECONDS})',
+                '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+    return []
+
+
+def audio_input_args(audio_path, frames, fps, end_time=None):
+    """ffmpeg input options for the audio, trimmed to the rendered frame window."""
+    audio_input = ['-i', audio_path]
+    if frames.start > 0 or end_time is not None:
+        audio_input = ['-ss', f'{frames.start / fps:.3f}', '-t', f'{len(frames) / fps:.3f}'] + audio_input
+    return audio_input
+
+
+class FrameEncoder:
+    """
+    One FFmpeg process fed rendered frames on stdin. With DEDUP_FRAMES a frame
+    identical to the previous one is skipped (the last frame, and in fragmented
+    mode the first frame of each fragment, are always written); a dirty region
+    from render_frames narrows the comparison to that box.
+    """
+
+    def __init__(self, output_path, size, fps, audio_input, output_mode, total_frames, stdout=None,
+                 audio_codec='aac'):
+        w, h = size
+        if DEDUP_FRAMES:
+            video_input = ['-f', 'matroska', '-i', 'pipe:0']
+            vfr = ['-fps_mode', 'vfr']
+        else:
+            video_input = ['-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'bgr24',
+                           '-s', f'{w}x{h}', '-r', str(fps), '-i', 'pipe:0']
+            vfr = []
+        ffmpeg_cmd = [
+            'ffmpeg', '-y',
+            *video_input,
+            *audio_input,
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-pix_fmt', 'yuv420p',
+            *vfr,
+            '-c:a', audio_codec,
+            '-shortest',
+            *output_flags(output_mode, fps),
+            output_path
+        ]
+        self.output_path = output_path
+        self.process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=stdout)
+        self.writer = MatroskaFrameWriter(self.process.stdin, w, h, fps) if DEDUP_FRAMES else None
+        self.total_frames = total_frames
+        self.fragment_frames = max(1, int(round(fps * FRAGMENT_SECONDS))) if output_mode == "fragmented" else None
+        self.previous = None
+        self.previous_frame = None
+        self.duplicates = 0
+        self.wait_ns = 0
+        self.span_id = trace.name_id("pipe:write")
+
+    def is_duplicate(self, frame, region):
+        """Same as the last written frame? (compares only the dirty region when one is known)"""
+        if region == dirty_rects.CLEAN:
+            return True
+        x0, y0, x1, y1 = region
+        return np.array_equal(frame[y0:y1, x0:x1], self.previous_frame[y0:y1, x0:x1])
+
+    def write(self, n, frame_idx, frame, region=dirty_rects.FULL):
+        """Send the n-th frame of the window (blocks while the encoder is behind)."""
+        # The last frame is always written so the video lasts the full length, and a
+        # fragment boundary so its keyframe exists and the previous fragment is finished
+        boundary = self.fragment_frames is not None and n % self.fragment_frames == 0
+        check = self.writer is not None and n < self.total_frames - 1 and not boundary
+        if check and region is not dirty_rects.FULL and self.previous_frame is not None:
+            if self.is_duplicate(frame, region):
+                self.duplicates += 1
+                return
+            check = False
+        data = frame.tobytes()
+        if self.writer is not None:
+            if check and data == self.previous:
+                self.duplicates += 1
+                return
+            self.previous = data
+            self.previous_frame = frame
+
+        t0 = trace.now()
+        if self.writer is not None:
+            self.writer.write_frame(data, n)
+        else:
+            self.process.stdin.write(data)
+        self.wait_ns += trace.now() - t0
+        if trace.ENABLED:
+            trace.record(self.span_id, t0, arg=frame_idx)
+
+    def close(self, timeout=10):
+        """Close the pipe and wait for FFmpeg; returns its exit code."""
+        self.process.stdin.close()
+        t0 = trace.now()
+        with trace.span("ffmpeg:wait"):
+            returncode = self.process.wait(timeout=timeout)
+        self.wait_ns += trace.now() - t0
+        return returncode
+
+
+def create_video(image_path, audio_path, output_path, fps=10,
+                 scale=1.0, start_time=0.0, end_time=None, video_id=None, effects=None,
+                 output_mode=None, on_fragment=None, target_fps=None, thumbnail_path=None):
+    """
+    Render image + audio to output_path. Returns output_path, or None on failure.
+
+    scale, start_time and end_time give a draft preview: effects receive
+    render_scale so their pixel-space parameters follow the resolution, and
+    frame indices keep their real time so a window looks like the full render.
+    effects overrides the chain (default: every loaded effect).
+
+    output_mode overrides OUTPUT_MODE. In "fragmented" mode on_fragment(kind,
+    index, data) is called for each finished piece while rendering continues;
+    output_path may then be "pipe:1" to skip the file and only use the hook.
+
+    target_fps (default TARGET_RENDER_FPS) lowers effect quality levels as
+    needed to keep rendering at that speed.
+
+    With THUMBNAILS on, the best sampled frame becomes the video's thumbnail
+    (thumbnail_path, default <output>_thumbnail.jpg; see thumbnail_sink).
+    """
+    effects = default_effects() if effects is None else effects
+    output_mode = output_mode or OUTPUT_MODE
+    to_pipe = output_path == "pipe:1"
+    if to_pipe and (output_mode != "fragmented" or on_fragment is None):
+        print("❌ pipe:1 output needs output_mode='fragmented' and an on_fragment hook")
+        return None
+    print(f"\n🎬 Starting video creation for: {os.path.basename(audio_path)}")
+
+    # 1. Image and Dimensions
+    img = load_background(image_path, scale)
+    if img is None:
+        return
+    h, w, _ = img.shape
+
+    # 2. Get Audio Duration and Frame Count
+    duration = probe_duration(audio_path)
+    if duration is None:
+        return
+    frames = frame_window(duration, fps, start_time, end_time)
+    total_frames = len(frames)
+    print(f"✅ Audio duration: {duration:.2f}s, Total frames to process: {total_frames}")
+    if total_frames <= 0:
+        print("⚠️ Warning: Audio duration is too short. Skipping video creation.")
+        return
+
+    audio_features = None
+    if AUDIO_REACTIVE:
+        with trace.span("probe:audio_features"):
+            audio_features = load_audio_features(audio_path, fps, total_frames=int(duration * fps))
+
+    # 3. Start FFmpeg Subprocess
+    watch = output_mode == "fragmented" and on_fragment is not None
+    if watch and not to_pipe and os.path.exists(output_path):
+        os.remove(output_path)  # don't let the watcher read a previous run's file
+    encoder = FrameEncoder(output_path, (w, h), fps, audio_input_args(audio_path, frames, fps, end_time),
+                           output_mode, total_frames, stdout=subprocess.PIPE if to_pipe else None)
+    process = encoder.process
+
+    watcher = None
+    if watch:
+        watcher = FragmentWatcher(process.stdout if to_pipe else output_path, on_fragment)
+        watcher.start()
+
+    # 4. Process and Write Frames
+    audio_name_text = os.path.splitext(os.path.basename(audio_path))[0]
+    video_id = video_id or os.path.basename(output_path)
+
+    print(f"✨ Applying {len(effects)} effects sequentially for {os.path.basename(output_path)}")
+
+    controller = None
+    target_fps = target_fps or TARGET_RENDER_FPS
+    if target_fps:
+        controller = QualityController({e.__module__: quality_levels(e) for e in effects}, target_fps, fps)
+
+    sink = None
+    if THUMBNAILS and not to_pipe:
+        title, artist = text_for(audio_name_text)
+        sink = ThumbnailSink(thumbnail_path or f"{os.path.splitext(output_path)[0]}_thumbnail.jpg",
+                             title, artist, fps, seed=video_id)
+
+    context = make_effect_context(fps, video_id, audio_name_text, scale, audio_features)
+    render_start = trace.now()
+    for n, (frame_idx, frame, region) in enumerate(render_frames(img, frames, context, effects, controller, dirty=True)):
         if frame_idx % fps == 0:
-            print(f"Processing frame {frame_idx+1}/{total_frames}", end="\r")
+            print(f"Processing frame {n+1}/{total_frames}", end="\r")
+
+        if sink is not None:
+            sink.offer(frame_idx, frame, last=n == total_frames - 1)
+
+        encoder.write(n, frame_idx, frame, region)
 
     # 5. Cleanup FFmpeg Process
     try:
-        process.stdin.close()
-        process.wait(timeout=10)
-        print(f"\n🎉 Video created with {len(effects_list)} effects: {output_path}")
+        returncode = encoder.close()
+        if metrics.ENABLED:
+            metrics.inc("render_encoder_wait_seconds_total", encoder.wait_ns / 1e9)
+            metrics.inc("render_frames_skipped_total", encoder.duplicates)
+            metrics.set_gauge("render_job_fps", total_frames / max((trace.now() - render_start) / 1e9, 1e-9), kind="render")
+        if watcher is not None:
+            watcher.finish()
+            print(f"\n📦 {watcher.fragments} fragments handed off ({watcher.bytes / 1e6:.1f} MB)")
+        if encoder.duplicates:
+            print(f"\n🧊 Skipped {encoder.duplicates}/{total_frames} duplicate frames")
+        if controller is not None and controller.report():
+            print(f"\n{controller.report()}")
+        if returncode != 0:
+            print(f"\n❌ FFmpeg exited with code {returncode} for {output_path}")
+            return None
+        if sink is not None:
+            sink.finish()
+        print(f"\n🎉 Video created with {len(effects)} effects: {output_path}")
+        return output_path
     except (IOError, subprocess.TimeoutExpired) as e:
         print(f"❌ Error during FFmpeg cleanup: {e}")
         process.kill()
+        if watcher is not None:
+            watcher.finish()
+        return None
 
 # -----------------------
 # Process all images + audio
 # -----------------------
-if __name__ == "__main__":
+def pair_inputs():
+    """(image, audio) pairs for the batch: sorted images matched to sorted audios."""
     images = sorted([os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.lower().endswith(('.png','.jpg','.jpeg'))])
     audios = sorted([os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.lower().endswith(('.mp3','.wav','.aac'))])
+    return list(zip(images, audios))
+
 
-    total_videos = min(len(images), len(audios))
-    for i in range(total_videos):
-        img = images[i]
-        aud = audios[i]
+def batch_jobs(fps=10):
+    """Scheduler jobs for every image/audio pair, costed by duration x resolution."""
+    import job_scheduler
 
+    effect_names = list(effect_registry.discover(effects_dir))
+    jobs = []
+    for img, aud in pair_inputs():
+        duration = probe_duration(aud)
+        if duration is None:
+            continue
+        w, h = job_scheduler.image_size(img)
         # ✅ Generate a random filename for each output
         out_file = get_random_video_name(output_dir, prefix="video_", ext=".mp4")
+        units = duration * fps * w * h / 1e6
+        jobs.append(job_scheduler.Job(f"{os.path.basename(img)} + {os.path.basename(aud)}", "render", units, create_video,
+                                      (img, aud, out_file, fps), effect_names))
+    return jobs
+
+
+if __name__ == "__main__":
+    import job_scheduler
 
-        create_video(img, aud, out_file)
+    job_scheduler.run_jobs(batch_jobs())
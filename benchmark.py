@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import wave
+import random
+import platform
+import argparse
+import subprocess
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+import autoedit
+
+# -----------------------
+# Paths
+# -----------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EFFECTS_DIR = os.path.join(BASE_DIR, "Effect Bulk")
+FIXTURE_DIR = os.path.join(BASE_DIR, "bench_fixtures")
+BASELINE_FILE = os.path.join(BASE_DIR, "bench_baseline.json")
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+FIXTURE_SEED = 1234
+
+# -----------------------
+# Deterministic fixtures
+# -----------------------
+def make_image(path, width, height, seed=FIXTURE_SEED):
+    """Smooth gradient background with seeded noise, like a photo but reproducible."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[:, :, 0] = 255 * x
+    img[:, :, 1] = 255 * y
+    img[:, :, 2] = 255 * (0.5 + 0.5 * np.sin(6 * x + 4 * y))
+    img += rng.normal(0, 12, img.shape).astype(np.float32)
+    cv2.imwrite(path, np.clip(img, 0, 255).astype(np.uint8))
+    return path
+
+
+def make_audio(path, seconds, sample_rate=44100, seed=FIXTURE_SEED):
+    """Mono 16-bit WAV: a 220 Hz tone with a beat envelope plus seeded noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    envelope = 0.5 + 0.5 * (np.sin(2 * np.pi * 2 * t) > 0)
+    signal = 0.4 * envelope * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.size)
+    pcm = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return path
+
+
+def make_gif(path, size=64, frames=12):
+    """Tiny transparent GIF with a moving dot."""
+    images = []
+    for i in range(frames):
+        # Palette image: index 0 is the transparent background, index 1 the dot
+        im = Image.new("P", (size, size), 0)
+        im.putpalette([0, 0, 0, 255, 40, 40])
+        draw = ImageDraw.Draw(im)
+        cx = int(size * (0.2 + 0.6 * i / max(1, frames - 1)))
+        draw.ellipse((cx - 8, size // 2 - 8, cx + 8, size // 2 + 8), fill=1)
+        images.append(im)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=80,
+                   loop=0, disposal=2, transparency=0)
+    return path
+
+
+def make_fixtures(fixture_dir=FIXTURE_DIR, audio_seconds=10):
+    os.makedirs(fixture_dir, exist_ok=True)
+    gif_dir = os.path.join(fixture_dir, "gifs")
+    os.makedirs(gif_dir, exist_ok=True)
+
+    fixtures = {"images": {}, "gif_dir": gif_dir}
+    for name, (w, h) in RESOLUTIONS.items():
+        fixtures["images"][name] = make_image(os.path.join(fixture_dir, f"image_{name}.png"), w, h)
+    fixtures["audio"] = make_audio(os.path.join(fixture_dir, "audio.wav"), audio_seconds)
+    fixtures["audio_seconds"] = audio_seconds
+    make_gif(os.path.join(gif_dir, "bench.gif"))
+    return fixtures
+
+# -----------------------
+# Effect loading (isolated from production usage files)
+# -----------------------
+def isolate_effect_state(effects, fixture_dir, gif_dir):
+    """
+    Point every effect's usage JSON at the fixture dir and swap in the fixture GIF,
+    so benchmark runs never touch the real usage files and always start fresh.
+    """
+    for effect in effects:
+        g = effect.__globals__
+        for key in list(g):
+            if key.endswith("USAGE_FILE"):
+                g[key] = os.path.join(fixture_dir, f"{effect.__module__}_{key.lower()}.json")
+                if os.path.exists(g[key]):
+                    os.remove(g[key])
+        for key, value in list(g.items()):
+            if key.startswith("load_") and "usage" in key and callable(value):
+                g["USAGE_DATA"] = value()
+        if "load_gifs" in g and "ALL_GIFS" in g:
+            g["ALL_GIFS"] = g["load_gifs"](gif_dir, g.get("VIDEO_WIDTH", 1280), g.get("TARGET_RATIO", 0.25))
+        if "particle_states" in g:
+            g["particle_states"].clear()
+
+
+def load_benchmark_effects(fixtures, fixture_dir=FIXTURE_DIR):
+    autoedit.effects_dir = EFFECTS_DIR
+    effects = autoedit.load_effect_modules()
+    isolate_effect_state(effects, fixture_dir, fixtures["gif_dir"])
+    autoedit.effects_list = effects
+    return effects
+
+
+def _seed():
+    random.seed(FIXTURE_SEED)
+    np.random.seed(FIXTURE_SEED)
+
+# -----------------------
+# Measurements
+# -----------------------
+def _percentile(values, q):
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+
+def bench_effects(effects, image, frames, fps=30, video_id="bench.mp4"):
+    """Milliseconds per frame for each effect on its own."""
+    results = {}
+    context = autoedit.make_effect_context(fps, video_id, "Benchmark Track")
+    for effect in effects:
+        _seed()
+        timings = []
+        for frame_idx in range(frames):
+            frame = image.copy()
+            kwargs = autoedit.get_effect_kwargs(effect, frame_idx, context)
+            start = time.perf_counter()
+            effect(frame, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[effect.__module__] = {
+            "mean_ms": float(np.mean(timings)),
+            "p50_ms": _percentile(timings, 50),
+            "p95_ms": _percentile(timings, 95),
+        }
+    return results
+
+
+def bench_chain(effects, image, frames, fps=30, video_id="bench_chain.mp4"):
+    """Whole effect chain throughput, without the encoder."""
+    _seed()
+    context = autoedit.make_effect_context(fps, video_id, "Benchmark Track")
+    start = time.perf_counter()
+    for frame_idx in range(frames):
+        frame = image.copy()
+        for effect in effects:
+            frame = effect(frame, **autoedit.get_effect_kwargs(effect, frame_idx, context))
+    elapsed = time.perf_counter() - start
+    return {"fps": frames / elapsed}
+
+
+def bench_pipe(image, frames, fps=30):
+    """Raw frame throughput into an ffmpeg process that discards its input."""
+    h, w = image.shape[:2]
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", str(fps),
+        "-i", "pipe:0", "-f", "null", "-",
+    ]
+    data = image.tobytes()
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    for _ in range(frames):
+        process.stdin.write(data)
+    process.stdin.close()
+    process.wait()
+    elapsed = time.perf_counter() - start
+    return {"fps": frames / elapsed, "mb_per_s": frames * len(data) / elapsed / 1e6}
+
+
+def bench_end_to_end(fixtures, fixture_dir=FIXTURE_DIR):
+    """Full create_video run on the 720p fixture, normalised to one minute of audio."""
+    _seed()
+    output_path = os.path.join(fixture_dir, "bench_e2e.mp4")
+    start = time.perf_counter()
+    autoedit.create_video(fixtures["images"]["720p"], fixtures["audio"], output_path)
+    elapsed = time.perf_counter() - start
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return {
+        "wall_seconds": elapsed,
+        "audio_seconds": fixtures["audio_seconds"],
+        "seconds_per_audio_minute": elapsed / fixtures["audio_seconds"] * 60,
+    }
+
+
+def run_benchmarks(frames=60, audio_seconds=10, skip_e2e=False):
+    fixtures = make_fixtures(audio_seconds=audio_seconds)
+    effects = load_benchmark_effects(fixtures)
+
+    results = {"effects": {}, "chain": {}, "pipe": {}}
+    for name in RESOLUTIONS:
+        image = cv2.imread(fixtures["images"][name])
+        print(f"⏱️ Benchmarking {name} ({len(effects)} effects, {frames} frames)")
+        results["effects"][name] = bench_effects(effects, image, frames, video_id=f"bench_{name}.mp4")
+        results["chain"][name] = bench_chain(effects, image, frames, video_id=f"bench_chain_{name}.mp4")
+        results["pipe"][name] = bench_pipe(image, frames)
+    if not skip_e2e:
+        print("⏱️ Benchmarking end-to-end render")
+        results["end_to_end"] = bench_end_to_end(fixtures)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "frames": frames,
+        },
+        "results": results,
+    }
+
+# -----------------------
+# Baseline comparison
+# -----------------------
+LOWER_IS_BETTER = ("_ms", "wall_seconds", "seconds_per_audio_minute")
+HIGHER_IS_BETTER = ("fps", "mb_per_s")
+
+
+def flatten_metrics(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare_to_baseline(current, baseline, threshold_pct=10.0, min_ms=0.1):
+    """
+    Return (regressions, improvements) as lists of (metric, old, new, change %).
+    Timings below min_ms on both sides are timer noise and are ignored.
+    """
+    cur = flatten_metrics(current["results"])
+    base = flatten_metrics(baseline["results"])
+    regressions, improvements = [], []
+    for metric, old in base.items():
+        new = cur.get(metric)
+        if new is None or old == 0:
+            continue
+        if metric.endswith("_ms") and max(old, new) < min_ms:
+            continue
+        if metric.endswith(LOWER_IS_BETTER):
+            change = (new - old) / old * 100
+        elif metric.endswith(HIGHER_IS_BETTER):
+            change = (old - new) / old * 100
+        else:
+            continue
+        # change > 0 means worse
+        if change > threshold_pct:
+            regressions.append((metric, old, new, change))
+        elif change < -threshold_pct:
+            improvements.append((metric, old, new, -change))
+    return regressions, improvements
+
+
+def print_summary(report):
+    results = report["results"]
+    for res, effects in results["effects"].items():
+        print(f"\n--- {res} ---")
+        for name, stats in sorted(effects.items(), key=lambda kv: -kv[1]["mean_ms"]):
+            print(f"  {name:<24} {stats['mean_ms']:8.2f} ms/frame (p95 {stats['p95_ms']:.2f})")
+        print(f"  {'chain':<24} {results['chain'][res]['fps']:8.1f} fps")
+        print(f"  {'pipe':<24} {results['pipe'][res]['fps']:8.1f} fps "
+              f"({results['pipe'][res]['mb_per_s']:.0f} MB/s)")
+    if "end_to_end" in results:
+        e2e = results["end_to_end"]
+        print(f"\nEnd-to-end: {e2e['seconds_per_audio_minute']:.1f}s per minute of audio")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render pipeline benchmarks")
+    parser.add_argument("--out", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    parser.add_argument("--min-ms", type=float, default=0.1, help="Ignore per-effect timings below this")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per measurement")
+    parser.add_argument("--audio-seconds", type=float, default=10, help="Length of the end-to-end fixture")
+    parser.add_argument("--skip-e2e", action="store_true", help="Skip the full create_video run")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.frames, args.audio_seconds, args.skip_e2e)
+    print_summary(report)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Results written to {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions, improvements = compare_to_baseline(report, baseline, args.threshold, args.min_ms)
+        for metric, old, new, change in improvements:
+            print(f"✅ {metric}: {old:.2f} → {new:.2f} ({change:.1f}% better)")
+        for metric, old, new, change in regressions:
+            print(f"❌ {metric}: {old:.2f} → {new:.2f} ({change:.1f}% worse)")
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s) beyond {args.threshold:.0f}%")
+            sys.exit(1)
+        print(f"\n🎉 No regressions beyond {args.threshold:.0f}%")
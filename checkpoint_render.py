@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import random
+import pickle
+import hashlib
+import argparse
+import subprocess
+import numpy as np
+
+import autoedit
+import effect_registry
+import render_trace as trace
+
+# -----------------------
+# Checkpointed renders
+# -----------------------
+# The video is encoded as fixed-length segments in a work directory. After each
+# segment the manifest records it together with the state needed to continue:
+# Python/NumPy RNG states and the state of every effect that exposes
+#
+#   get_effect_state() -> picklable object
+#   set_effect_state(state)
+#
+# (particle_glow_trails keeps its particles this way). A restarted job restores
+# the state saved after the last finished segment and continues from there.
+# Segments are video-only; the concat demuxer joins them without re-encoding
+# and the audio is added in the same pass.
+#
+# render_checkpoints/<job key>/
+#   manifest.json        job settings + finished segments
+#   seg_00000.mp4        one file per finished segment
+#   state_00000.pkl      state after that segment
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "render_checkpoints")
+SEGMENT_SECONDS = 30
+SEGMENT_WAIT_TIMEOUT = 60
+MANIFEST_VERSION = 1
+
+
+def job_key(image_path, audio_path, fps, scale, effect_names):
+    """Stable id of a render job, so a restart finds its work directory."""
+    h = hashlib.sha1()
+    for part in (os.path.abspath(image_path), os.path.abspath(audio_path), f"{fps:g}", f"{scale:g}", *effect_names):
+        h.update(part.encode("utf-8") + b"\0")
+    return h.hexdigest()[:16]
+
+
+def effect_names(effects):
+    return [effect.__module__ for effect in effects]
+
+# -----------------------
+# Manifest
+# -----------------------
+def load_manifest(work_dir):
+    path = os.path.join(work_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Ignoring unreadable manifest {path}: {e}")
+        return None
+
+
+def save_manifest(work_dir, manifest):
+    path = os.path.join(work_dir, "manifest.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+# -----------------------
+# Effect / RNG state
+# -----------------------
+def capture_state(effects):
+    state = {"random": random.getstate(), "numpy": np.random.get_state(), "effects": {}}
+    for effect in effects:
+        getter = effect.__globals__.get("get_effect_state")
+        if getter is not None:
+            state["effects"][effect.__module__] = getter()
+    return state
+
+
+def restore_state(effects, state):
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    for effect in effects:
+        setter = effect.__globals__.get("set_effect_state")
+        saved = state["effects"].get(effect.__module__)
+        if setter is not None and saved is not None:
+            setter(saved)
+            continue
+        plugin = effect_registry.plugin_for(effect)
+        if plugin is not None and plugin.stateful:
+            print(f"⚠️ {effect.__module__} is stateful but has no saved state; it restarts fresh")
+
+
+def save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_state(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+# -----------------------
+# Segments
+# -----------------------
+def encode_segment(img, frames, context, effects, segment_path, fps):
+    """Render frames into a video-only segment. Returns True on success."""
+    h, w, _ = img.shape
+    part_path = segment_path[:-len(".mp4")] + ".part.mp4"
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-s', f'{w}x{h}',
+        '-r', str(fps),
+        '-i', 'pipe:0',
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-pix_fmt', 'yuv420p',
+        '-an',
+        part_path
+    ]
+    process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+    try:
+        for frame_idx, frame in autoedit.render_frames(img, frames, context, effects):
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+        with trace.span("ffmpeg:wait"):
+            returncode = process.wait(timeout=SEGMENT_WAIT_TIMEOUT)
+    except (IOError, subprocess.TimeoutExpired) as e:
+        print(f"\n❌ Segment {os.path.basename(segment_path)} failed: {e}")
+        process.kill()
+        return False
+    if returncode != 0:
+        print(f"\n❌ FFmpeg exited with code {returncode} for {segment_path}")
+        return False
+    os.replace(part_path, segment_path)
+    return True
+
+
+def concat_segments(work_dir, segments, audio_path, frames, fps, output_path):
+    """Join segments with the concat demuxer (no re-encode) and mux the audio."""
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w") as f:
+        for seg in segments:
+            f.write(f"file '{seg['file']}'\n")
+
+    audio_input = ['-i', audio_path]
+    if frames.start > 0:
+        audio_input = ['-ss', f'{frames.start / fps:.3f}', '-t', f'{len(frames) / fps:.3f}'] + audio_input
+    cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        *audio_input,
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy',
+        '-c:a', 'aac',
+        '-shortest',
+        output_path
+    ]
+    with trace.span("ffmpeg:concat"):
+        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"❌ Concat failed for {output_path}: {result.stderr.strip()}")
+        return False
+    return True
+
+# -----------------------
+# Main entry point
+# -----------------------
+def create_video_checkpointed(image_path, audio_path, output_path=None, fps=10, scale=1.0,
+                              start_time=0.0, end_time=None, video_id=None, effects=None,
+                              segment_seconds=SEGMENT_SECONDS, checkpoint_dir=CHECKPOINT_DIR, keep_segments=False):
+    """
+    Like autoedit.create_video, but resumable. output_path may be None: a new
+    random name is used, or the one recorded by an unfinished earlier run.
+    Returns output_path, or None on failure (finished segments are kept).
+    """
+    effects = autoedit.default_effects() if effects is None else effects
+    names = effect_names(effects)
+    work_dir = os.path.join(checkpoint_dir, job_key(image_path, audio_path, fps, scale, names))
+    os.makedirs(work_dir, exist_ok=True)
+
+    img = autoedit.load_background(image_path, scale)
+    if img is None:
+        return None
+    duration = autoedit.probe_duration(audio_path)
+    if duration is None:
+        return None
+    frames = autoedit.frame_window(duration, fps, start_time, end_time)
+    if len(frames) == 0:
+        print("⚠️ Warning: Audio duration is too short. Skipping video creation.")
+        return None
+
+    manifest = load_manifest(work_dir)
+    job = {
+        "image": os.path.abspath(image_path), "audio": os.path.abspath(audio_path),
+        "fps": fps, "scale": scale, "effects": names,
+        "start_frame": frames.start, "end_frame": frames.stop,
+        "segment_frames": max(1, int(round(segment_seconds * fps))),
+    }
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION or manifest["job"] != job:
+        if manifest is not None:
+            print(f"⚠️ Job settings changed; discarding old checkpoints in {work_dir}")
+        output_path = output_path or autoedit.get_random_video_name(autoedit.output_dir)
+        manifest = {
+            "version": MANIFEST_VERSION, "job": job, "segments": [],
+            "output": os.path.abspath(output_path),
+            "video_id": video_id or os.path.basename(output_path),
+            "created": time.time(),
+        }
+        save_manifest(work_dir, manifest)
+    output_path = output_path or manifest["output"]
+    video_id = manifest["video_id"]
+
+    # Segments whose files went missing invalidate everything after them
+    segments = []
+    for seg in manifest["segments"]:
+        if not os.path.exists(os.path.join(work_dir, seg["file"])):
+            break
+        segments.append(seg)
+    manifest["segments"] = segments
+
+    audio_features = None
+    if autoedit.AUDIO_REACTIVE:
+        with trace.span("probe:audio_features"):
+            audio_features = autoedit.load_audio_features(audio_path, fps, total_frames=int(duration * fps))
+    audio_name = os.path.splitext(os.path.basename(audio_path))[0]
+    context = autoedit.make_effect_context(fps, video_id, audio_name, scale, audio_features)
+
+    next_frame = frames.start
+    if segments:
+        restore_state(effects, load_state(os.path.join(work_dir, segments[-1]["state"])))
+        next_frame = segments[-1]["end_frame"]
+        print(f"♻️ Resuming {os.path.basename(output_path)} at {next_frame / fps:.1f}s "
+              f"({len(segments)} segments done)")
+
+    print(f"\n🎬 Checkpointed render of {os.path.basename(audio_path)}: {len(frames)} frames, "
+          f"{job['segment_frames']} per segment")
+    while next_frame < frames.stop:
+        index = len(segments)
+        end_frame = min(frames.stop, next_frame + job["segment_frames"])
+        seg = {
+            "index": index, "file": f"seg_{index:05d}.mp4", "state": f"state_{index:05d}.pkl",
+            "start_frame": next_frame, "end_frame": end_frame,
+        }
+        started = time.time()
+        with trace.span("segment", arg=index):
+            ok = encode_segment(img, range(next_frame, end_frame), context, effects,
+                                os.path.join(work_dir, seg["file"]), fps)
+        if not ok:
+            return None
+        save_state(os.path.join(work_dir, seg["state"]), capture_state(effects))
+        seg["seconds"] = round(time.time() - started, 2)
+        segments.append(seg)
+        save_manifest(work_dir, manifest)
+        print(f"💾 Segment {index + 1} done ({end_frame - frames.start}/{len(frames)} frames, {seg['seconds']}s)")
+        next_frame = end_frame
+
+    if not concat_segments(work_dir, segments, audio_path, frames, fps, output_path):
+        return None
+
+    if not keep_segments:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    print(f"🎉 Video created from {len(segments)} segments: {output_path}")
+    return output_path
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumable render in fixed-length segments")
+    parser.add_argument("image", nargs="?")
+    parser.add_argument("audio", nargs="?")
+    parser.add_argument("-o", "--output", help="Output MP4 (default: random name, or the one from an unfinished run)")
+    parser.add_argument("--batch", action="store_true", help="Render every image/audio pair like autoedit.py")
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    parser.add_argument("--keep-segments", action="store_true")
+    args = parser.parse_args()
+
+    if args.batch:
+        jobs = autoedit.pair_inputs()
+    elif args.image and args.audio:
+        jobs = [(args.image, args.audio)]
+    else:
+        parser.error("give an image and an audio file, or --batch")
+
+    for image, audio in jobs:
+        create_video_checkpointed(image, audio, args.output if not args.batch else None, fps=args.fps,
+                                  segment_seconds=args.segment_seconds, keep_segments=args.keep_segments)
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import render_metrics as metrics
+
+# -----------------------
+# Fused colour pipeline
+# -----------------------
+# Every colour stage is a per-channel 0..255 -> 0..255 mapping, so any chain of
+# them composes into one 256-entry table per channel and costs a single
+# cv2.LUT pass over the frame, however many stages there are. A grade is a
+# list of stages, applied in order:
+#
+#   ("fade", alpha)              x * alpha           (cv2.convertScaleAbs)
+#   ("brightness", beta)         x + beta
+#   ("contrast", amount)         (x - 128) * amount + 128
+#   ("gamma", g)                 255 * (x / 255) ** (1 / g)
+#   ("tint", (b, g, r))          per-channel gains
+#   ("curve", (points_b, points_g, points_r))   piecewise-linear ((x, y), ...) per channel
+#
+# A table that is the same for all three channels is stored as a single-channel
+# table, which cv2.LUT applies about twice as fast. A grade of one linear stage
+# (fade or brightness) skips the table: convertScaleAbs is cheaper than any
+# lookup for that, so tables pay off from the second stage on.
+#
+# Parameters that follow sine curves take a different value every frame, so
+# numbers are quantised to QUANT_STEP before the lookup. Frames whose values
+# land on the same step share one table (at most 0.25 grey levels off).
+
+QUANT_STEP = 1 / 512
+LUT_CACHE_SIZE = 1024
+
+_RAMP = np.repeat(np.arange(256, dtype=np.float32)[:, None], 3, axis=1)   # (256, 3) identity, BGR
+
+
+def _fade(x, alpha):
+    return x * alpha
+
+def _brightness(x, beta):
+    return x + beta
+
+def _contrast(x, amount):
+    return (x - 128.0) * amount + 128.0
+
+def _gamma(x, g):
+    return 255.0 * np.power(x / 255.0, 1.0 / g)
+
+def _tint(x, gains):
+    return x * np.asarray(gains, dtype=np.float32)
+
+def _curve(x, channel_points):
+    out = np.empty_like(x)
+    for c, points in enumerate(channel_points):
+        xs, ys = zip(*points)
+        out[:, c] = np.interp(x[:, c], xs, ys)
+    return out
+
+STAGES = {
+    "fade": _fade,
+    "brightness": _brightness,
+    "contrast": _contrast,
+    "gamma": _gamma,
+    "tint": _tint,
+    "curve": _curve,
+}
+
+
+def quantize(value):
+    """Round every number in a (nested) stage parameter to QUANT_STEP; the result is hashable."""
+    if isinstance(value, (tuple, list)):
+        return tuple(quantize(v) for v in value)
+    return round(round(value / QUANT_STEP) * QUANT_STEP, 6)
+
+
+def build_lut(stages):
+    """Compose the stages into one (1, 256, 3) uint8 table for cv2.LUT."""
+    x = _RAMP.copy()
+    for name, param in stages:
+        # Each stage saturates like a separate 8-bit pass would
+        x = np.clip(STAGES[name](x, param), 0, 255)
+    return np.round(x).astype(np.uint8)[None, :, :]
+
+
+_luts = OrderedDict()
+stats = {"hits": 0, "misses": 0}
+
+def lut_for(stages):
+    """Cached table for a grade, keyed by its quantised parameters."""
+    key = tuple((name, quantize(param)) for name, param in stages)
+    lut = _luts.get(key)
+    if lut is not None:
+        _luts.move_to_end(key)
+        stats["hits"] += 1
+        metrics.cache_lookup("color_lut", True)
+        return lut
+    stats["misses"] += 1
+    metrics.cache_lookup("color_lut", False)
+    lut = build_lut(key)
+    if (lut[0, :, :1] == lut[0, :, 1:]).all():
+        lut = np.ascontiguousarray(lut[:, :, 0])
+    _luts[key] = lut
+    if len(_luts) > LUT_CACHE_SIZE:
+        _luts.popitem(last=False)
+    return lut
+
+
+def apply_grade(frame, stages, dst=None):
+    """All stages in one cv2.LUT pass (frame: uint8 BGR); dst, if given, receives the result."""
+    if not stages:
+        if dst is not None:
+            dst[...] = frame
+            return dst
+        return frame
+    if len(stages) == 1:
+        name, param = stages[0]
+        if name == "fade":
+            return cv2.convertScaleAbs(frame, dst, alpha=param, beta=0)
+        if name == "brightness":
+            return cv2.convertScaleAbs(frame, dst, alpha=1.0, beta=param)
+    return cv2.LUT(frame, lut_for(stages), dst)
@@ -0,0 +1,62 @@
+# -----------------------
+# Dirty rectangles
+# -----------------------
+# autoedit.render_frames tracks, after every effect, where the frame can differ
+# from the previous frame at the same point of the chain:
+#
+#   CLEAN          identical to the previous frame
+#   (x0, y0, x1, y1)  changes only inside this box (x1/y1 exclusive)
+#   FULL           anything may have changed
+#
+# The background is CLEAN after the first frame. An effect then falls in one of
+# three kinds (from its EFFECT_META):
+#
+#   "invariant"  frame_invariant: with a CLEAN input its previous output is
+#                reused without calling it
+#   "region"     "region_local": True and an effect_region() telling what it
+#                draws on; it draws nothing (and isn't called) when that's None
+#   "full"       everything else: the frame is FULL from here on
+#
+# A region-local plugin declares
+#
+#   def effect_region(shape, frame_idx=0, ...):   # same keyword arguments as apply_effect_frame
+#       return (x0, y0, x1, y1) or None           # box it changes on this frame, None = draws nothing
+#
+# The region that reaches the encoder lets duplicate detection compare just
+# that box, or skip the comparison when the frame is CLEAN.
+
+FULL = None
+CLEAN = ()
+
+
+def union(*regions):
+    """Bounding box of several dirty regions (FULL if any is FULL)."""
+    boxes = []
+    for region in regions:
+        if region is FULL:
+            return FULL
+        if region:
+            boxes.append(region)
+    if not boxes:
+        return CLEAN
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def clip(box, shape):
+    """box limited to a frame of this shape; CLEAN when nothing is left (None = draws nothing)."""
+    if box is None:
+        return CLEAN
+    h, w = shape[:2]
+    x0, y0, x1, y1 = max(0, int(box[0])), max(0, int(box[1])), min(w, int(box[2])), min(h, int(box[3]))
+    if x0 >= x1 or y0 >= y1:
+        return CLEAN
+    return (x0, y0, x1, y1)
+
+
+def effect_kind(meta, module_globals):
+    if meta.get("region_local") and callable(module_globals.get("effect_region")):
+        return "region"
+    if meta.get("frame_invariant"):
+        return "invariant"
+    return "full"
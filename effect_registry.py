@@ -0,0 +1,186 @@
+import os
+import ast
+import glob
+import time
+import importlib.util
+
+import render_trace as trace
+
+# -----------------------
+# Lazy Effect Bulk plugin registry
+# -----------------------
+# Discovery parses each plugin with `ast` and never executes it, so listing
+# plugins costs no GIF decoding, JSON loading or combo generation. A plugin
+# module is executed the first time a job selects it and then stays cached
+# (per process) until its file's mtime changes.
+#
+# A plugin may declare a literal dict at module level:
+#
+#   EFFECT_META = {
+#       "stateful": True,          # keeps state between frames (e.g. particles)
+#       "frame_invariant": False,  # output depends only on the input frame
+#       "quality_levels": 2,       # cheaper levels via quality= (see quality_control)
+#       "working_scale": 0.5,      # layer drawn at reduced size (see multires)
+#       "layout": True,            # places things relative to the frame edges (see renditions)
+#       "region_local": True,      # draws only inside effect_region() (see dirty_rects)
+#   }
+#
+# Missing keys fall back to the conservative defaults below.
+
+DEFAULT_META = {"stateful": True, "frame_invariant": False}
+ENTRY_POINT = "apply_effect_frame"
+
+
+class EffectPlugin:
+    """Metadata for one plugin file, plus its effect function once imported."""
+
+    def __init__(self, path, mtime, params, meta, doc):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.mtime = mtime
+        self.params = params
+        self.meta = meta
+        self.doc = doc
+        self.effect = None
+        self.load_seconds = None
+
+    @property
+    def stateful(self):
+        return bool(self.meta.get("stateful"))
+
+    @property
+    def frame_invariant(self):
+        return bool(self.meta.get("frame_invariant"))
+
+    def load(self):
+        """Execute the module (once) and return its apply_effect_frame."""
+        if self.effect is not None:
+            return self.effect
+        spec = importlib.util.spec_from_file_location(self.name, self.path)
+        module = importlib.util.module_from_spec(spec)
+        start = time.perf_counter()
+        with trace.span(f"load:{self.name}"):
+            spec.loader.exec_module(module)
+        self.load_seconds = time.perf_counter() - start
+        self.effect = getattr(module, ENTRY_POINT)
+        print(f"✨ Loaded effect: {self.name} ({self.load_seconds * 1000:.0f} ms)")
+        return self.effect
+
+
+def read_plugin_metadata(path):
+    """
+    Parse a plugin without executing it.
+    Returns (params, meta, doc), or None when it has no apply_effect_frame.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    entry = None
+    meta = dict(DEFAULT_META)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == ENTRY_POINT:
+            entry = node
+        elif isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "EFFECT_META" for t in node.targets
+        ):
+            try:
+                meta.update(ast.literal_eval(node.value))
+            except ValueError:
+                print(f"⚠️ EFFECT_META in {path} is not a literal; using defaults")
+    if entry is None:
+        return None
+
+    args = entry.args
+    positional = [a.arg for a in args.posonlyargs + args.args]
+    params = positional[1:] + [a.arg for a in args.kwonlyargs]  # first one is the frame
+    return params, meta, ast.get_docstring(entry)
+
+# -----------------------
+# Registry
+# -----------------------
+_plugins = {}   # path -> EffectPlugin (or None for files without an entry point)
+_mtimes = {}
+
+
+def discover(effects_dir):
+    """All plugins in effects_dir by name, in file order. Nothing is executed."""
+    found = {}
+    paths = sorted(glob.glob(os.path.join(effects_dir, "*.py")))
+    for path in paths:
+        mtime = os.path.getmtime(path)
+        if path not in _plugins or _mtimes.get(path) != mtime:
+            reloading = _plugins.get(path) is not None and _plugins[path].effect is not None
+            try:
+                info = read_plugin_metadata(path)
+            except (SyntaxError, UnicodeDecodeError) as e:
+                print(f"❌ Could not parse {path}: {e}")
+                info = None
+            if info is None:
+                if path not in _plugins:
+                    print(f"⚠️ Skipping {path} (no {ENTRY_POINT} function)")
+                _plugins[path] = None
+            else:
+                _plugins[path] = EffectPlugin(path, mtime, *info)
+                if reloading:
+                    print(f"🔄 {_plugins[path].name} changed; it will be reloaded")
+            _mtimes[path] = mtime
+        if _plugins[path] is not None:
+            found[_plugins[path].name] = _plugins[path]
+
+    for path in set(_plugins) - set(paths):
+        del _plugins[path]
+        _mtimes.pop(path, None)
+    return found
+
+
+def load_effects(effects_dir, names=None):
+    """
+    Effect functions for the selected plugin names (None = all), in file order.
+    Only selected plugins are imported; unknown names are reported and skipped.
+    """
+    plugins = discover(effects_dir)
+    if names is not None:
+        for name in names:
+            if name not in plugins:
+                print(f"⚠️ Unknown effect: {name}")
+        wanted = set(names)
+        plugins = {n: p for n, p in plugins.items() if n in wanted}
+
+    effects = []
+    for plugin in plugins.values():
+        try:
+            effects.append(plugin.load())
+        except Exception as e:
+            print(f"❌ Failed to load effect {plugin.name}: {e}")
+    return effects
+
+
+def plugin_for(effect):
+    """Registry entry for a loaded effect function (None if unknown)."""
+    for plugin in _plugins.values():
+        if plugin is not None and plugin.effect is effect:
+            return plugin
+    return None
+
+
+def format_report(plugins):
+    lines = [f"{'plugin':<24} {'load ms':>8}  {'stateful':<8} {'invariant':<9} params"]
+    for plugin in plugins.values():
+        load_ms = f"{plugin.load_seconds * 1000:.1f}" if plugin.load_seconds is not None else "-"
+        lines.append(f"{plugin.name:<24} {load_ms:>8}  {str(plugin.stateful):<8} "
+                     f"{str(plugin.frame_invariant):<9} {', '.join(plugin.params)}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List Effect Bulk plugins and their import cost")
+    parser.add_argument("--effects-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Effect Bulk"))
+    parser.add_argument("--no-load", action="store_true", help="Only read metadata, do not import")
+    args = parser.parse_args()
+
+    plugins = discover(args.effects_dir)
+    if not args.no_load:
+        load_effects(args.effects_dir)
+    print(format_report(plugins))
@@ -1,10 +1,31 @@
 import cv2
 import numpy as np
 import math
+import time
 import random
 import os
 import json
 
+from audio_features import load_audio_features, feature_at
+from quality_control import QualityController
+import multires
+from color_lut import apply_grade
+import frame_batch
+
+# Processing fps to hold by lowering effect quality (None = always full quality)
+TARGET_FPS = None
+
+# Blur pulse works on a downscaled copy (per quality level) and upsamples the result
+BLUR_WORKING_SCALE = [0.5, 0.25]
+
+# Read and process this many frames at a time for effects with a batch form
+# (None = sized to the CPU cache by frame_batch, 1 = off)
+BATCH_FRAMES = None
+
+# Also draw the fused colour grade (effect_grade, see color_lut) in choose_unique_effect.
+# Off by default so existing batches keep their effect mix.
+GRADE_EFFECT = False
+
 # -----------------------
 # Base effect templates
 # -----------------------
@@ -23,7 +44,43 @@ def effect_zoom(frame, frame_idx, strength, speed):
 
 def effect_fade(frame, frame_idx, min_alpha, max_alpha, speed):
     alpha = min_alpha + (max_alpha - min_alpha) * (0.5 + 0.5 * math.sin(frame_idx * speed))
-    return cv2.convertScaleAbs(frame, alpha=alpha, beta=0)
+    return apply_grade(frame, [("fade", alpha)])
+
+# Batch forms: (K, H, W, 3) stacks, per-frame parameters as vectors (gains: one per frame)
+def effect_wave_batch(frames, frame_indices, amp, freq):
+    rows, cols = frames.shape[1:3]
+    shifts = amp * np.sin(np.asarray(frame_indices) * freq)
+    out = np.empty_like(frames)
+    for frame, dst, shift in zip(frames, out, shifts):
+        cv2.warpAffine(frame, np.float32([[1, 0, shift], [0, 1, 0]]), (cols, rows), dst=dst)
+    return out
+
+def effect_fade_batch(frames, frame_indices, min_alpha, max_alpha, speed):
+    alphas = min_alpha + (max_alpha - min_alpha) * (0.5 + 0.5 * np.sin(np.asarray(frame_indices) * speed))
+    out = np.empty_like(frames)
+    for frame, dst, alpha in zip(frames, out, alphas):
+        apply_grade(frame, [("fade", float(alpha))], dst)
+    return out
+
+def effect_shake_batch(frames, frame_indices, dx, dy, speed):
+    rows, cols = frames.shape[1:3]
+    phase = np.asarray(frame_indices) * speed
+    xs = (dx * np.sin(phase)).astype(int)
+    ys = (dy * np.cos(phase)).astype(int)
+    out = np.empty_like(frames)
+    for frame, dst, x, y in zip(frames, out, xs, ys):
+        cv2.warpAffine(frame, np.float32([[1, 0, x], [0, 1, y]]), (cols, rows), dst=dst)
+    return out
+
+def effect_grade(frame, frame_idx, contrast, gamma, tint, speed):
+    # Fade, contrast, gamma and tint fused into one LUT pass (see color_lut)
+    wave = math.sin(frame_idx * speed)
+    return apply_grade(frame, [
+        ("fade", 1.0 + 0.08 * wave),
+        ("contrast", contrast),
+        ("gamma", gamma + 0.05 * wave),
+        ("tint", tint),
+    ])
 
 def effect_shake(frame, frame_idx, dx, dy, speed):
     rows, cols, _ = frame.shape
@@ -32,9 +89,15 @@ def effect_shake(frame, frame_idx, dx, dy, speed):
     M = np.float32([[1, 0, x], [0, 1, y]])
     return cv2.warpAffine(frame, M, (cols, rows))
 
-def effect_blur_pulse(frame, frame_idx, max_k, speed):
+def effect_blur_pulse(frame, frame_idx, max_k, speed, quality=0):
     k = int(abs(max_k * math.sin(frame_idx * speed))) * 2 + 1
-    return cv2.GaussianBlur(frame, (k, k), 0)
+    scale = BLUR_WORKING_SCALE[quality]
+    k_small = int(k * scale) | 1
+    if k_small < 3:
+        # Too light to survive the downscale: blur at full resolution
+        return cv2.GaussianBlur(frame, (k, k), 0)
+    small = cv2.GaussianBlur(multires.downscale(frame, scale), (k_small, k_small), 0)
+    return multires.upscale(small, frame.shape)
 
 # -----------------------
 # Persistent unique effects
@@ -56,7 +119,7 @@ def save_used_effects():
 
 def choose_unique_effect():
     while True:
-        choice = random.choice(["wave", "zoom", "fade", "shake", "blur"])
+        choice = random.choice(["wave", "zoom", "fade", "shake", "blur"] + (["grade"] if GRADE_EFFECT else []))
 
         if choice == "wave":
             amp = round(random.uniform(3, 15), 3)
@@ -64,7 +127,9 @@ def choose_unique_effect():
             sig = ("wave", amp, freq)
             if sig not in used_effects:
                 used_effects.add(sig)
-                return lambda f, i: effect_wave(f, i, amp, freq)
+                fn = lambda f, i, g=1.0: effect_wave(f, i, amp * g, freq)
+                fn.batch = lambda fs, idx, gains: effect_wave_batch(fs, idx, amp * gains, freq)
+                return fn
 
         elif choice == "zoom":
             strength = round(random.uniform(0.002, 0.02), 4)
@@ -72,7 +137,7 @@ def choose_unique_effect():
             sig = ("zoom", strength, speed)
             if sig not in used_effects:
                 used_effects.add(sig)
-                return lambda f, i: effect_zoom(f, i, strength, speed)
+                return lambda f, i, g=1.0: effect_zoom(f, i, strength * g, speed)
 
         elif choice == "fade":
             min_alpha = round(random.uniform(0.6, 0.8), 3)
@@ -81,7 +146,9 @@ def choose_unique_effect():
             sig = ("fade", min_alpha, max_alpha, speed)
             if sig not in used_effects:
                 used_effects.add(sig)
-                return lambda f, i: effect_fade(f, i, min_alpha, max_alpha, speed)
+                fn = lambda f, i, g=1.0: effect_fade(f, i, min_alpha, max_alpha, speed)
+                fn.batch = lambda fs, idx, gains: effect_fade_batch(fs, idx, min_alpha, max_alpha, speed)
+                return fn
 
         elif choice == "shake":
             dx = round(random.uniform(1, 5), 2)
@@ -90,7 +157,9 @@ def choose_unique_effect():
             sig = ("shake", dx, dy, speed)
             if sig not in used_effects:
                 used_effects.add(sig)
-                return lambda f, i: effect_shake(f, i, dx, dy, speed)
+                fn = lambda f, i, g=1.0: effect_shake(f, i, dx * g, dy * g, speed)
+                fn.batch = lambda fs, idx, gains: effect_shake_batch(fs, idx, dx * gains, dy * gains, speed)
+                return fn
 
         elif choice == "blur":
             max_k = random.randint(3, 7)
@@ -98,7 +167,20 @@ def choose_unique_effect():
             sig = ("blur", max_k, speed)
             if sig not in used_effects:
                 used_effects.add(sig)
-                return lambda f, i: effect_blur_pulse(f, i, max_k, speed)
+                fn = lambda f, i, g=1.0, q=0: effect_blur_pulse(f, i, max_k * g, speed, q)
+                fn.quality_levels = 2
+                return fn
+
+        elif choice == "grade":
+            contrast = round(random.uniform(0.9, 1.2), 3)
+            gamma = round(random.uniform(0.85, 1.15), 3)
+            warm = round(random.uniform(-0.06, 0.06), 3)   # > 0: warmer, < 0: cooler
+            speed = round(random.uniform(0.01, 0.05), 4)
+            sig = ("grade", contrast, gamma, warm, speed)
+            if sig not in used_effects:
+                used_effects.add(sig)
+                tint = (1.0 - warm, 1.0, 1.0 + warm)   # BGR gains
+                return lambda f, i, g=1.0: effect_grade(f, i, contrast, gamma, tint, speed)
 
 # -----------------------
 # Video processing
@@ -120,18 +202,52 @@ def process_video(input_path, output_path):
     # 👉 unique effect for this video
     effect_fn = choose_unique_effect()
 
+    # Effect strength follows the loudness of the video's own soundtrack
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    audio_features = load_audio_features(input_path, fps, total_frames=total_frames or None)
+
+    levels = getattr(effect_fn, "quality_levels", 1)
+    controller = QualityController({"effect": levels}, TARGET_FPS, fps) if TARGET_FPS and levels > 1 else None
+
+    batch_fn = getattr(effect_fn, "batch", None) if controller is None else None
+    batch_size = 1 if batch_fn is None else (BATCH_FRAMES or frame_batch.batch_size((height, width, 3)))
+
     frame_idx = 0
-    while True:
+    while batch_size > 1:
+        frames = []
+        while len(frames) < batch_size:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        if not frames:
+            break
+        indices = list(range(frame_idx, frame_idx + len(frames)))
+        gains = np.array([0.5 + feature_at(audio_features, "rms", i, default=0.5) for i in indices])
+        for effected in batch_fn(np.stack(frames), indices, gains):
+            out.write(effected)
+        frame_idx += len(frames)
+
+    while batch_size == 1:
         ret, frame = cap.read()
         if not ret:
             break
-        effected = effect_fn(frame, frame_idx)
+        gain = 0.5 + feature_at(audio_features, "rms", frame_idx, default=0.5)
+        if controller is None:
+            effected = effect_fn(frame, frame_idx, gain)
+        else:
+            start = time.perf_counter()
+            effected = effect_fn(frame, frame_idx, gain, controller.level("effect"))
+            controller.record("effect", time.perf_counter() - start)
+            controller.end_frame(frame_idx, time.perf_counter() - start)
         out.write(effected)
         frame_idx += 1
 
     cap.release()
     out.release()
     save_used_effects()  # ✅ save after finishing video
+    if controller is not None and controller.report():
+        print(controller.report())
     print(f"✅ Processed {input_path} -> {output_path}")
 
 # -----------------------
@@ -141,9 +257,10 @@ def process_video(input_path, output_path):
 input_folder = "output"   # your folder with videos
 output_folder = "output"  # save back into same folder
 
-for file in os.listdir(input_folder):
-    if file.endswith(".mp4") and not file.endswith("_effect.mp4"):
-        in_path = os.path.join(input_folder, file)
-        out_name = file.replace(".mp4", "_effect.mp4")
-        out_path = os.path.join(output_folder, out_name)
-        process_video(in_path, out_path)
+if __name__ == "__main__":
+    for file in os.listdir(input_folder):
+        if file.endswith(".mp4") and not file.endswith("_effect.mp4"):
+            in_path = os.path.join(input_folder, file)
+            out_name = file.replace(".mp4", "_effect.mp4")
+            out_path = os.path.join(output_folder, out_name)
+            process_video(in_path, out_path)
@@ -0,0 +1,67 @@
+import numpy as np
+
+# -----------------------
+# Batched effect calls
+# -----------------------
+# A plugin may expose, next to apply_effect_frame,
+#
+#   def apply_effect_batch(frames, frame_indices, ...):
+#       # frames: (K, H, W, 3) uint8 stack, frame_indices: K frame numbers
+#       return frames   # (K, H, W, 3); may be the input, modified in place
+#
+# taking the same keyword arguments as apply_effect_frame (minus frame_idx).
+# It computes per-frame parameters as vectors and draws with fewer, larger
+# calls. autoedit.render_frames renders BATCH_FRAMES frames at a time and
+# calls per-frame effects on each frame of the stack, so plugins without the
+# entry point keep working unchanged.
+#
+# The stack goes through the whole chain before the next one is started, so
+# it should stay in cache between effects: batch_size() fits it into the last
+# level cache (CACHE_BYTES, read from the OS when available).
+
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+MAX_BATCH = 8
+CACHE_SHARE = 0.5   # leave room for the effects' own buffers
+
+_cache_bytes = None
+
+def cache_bytes():
+    """Size of the last level CPU cache, or DEFAULT_CACHE_BYTES when it can't be read."""
+    global _cache_bytes
+    if _cache_bytes is None:
+        _cache_bytes = DEFAULT_CACHE_BYTES
+        for index in (3, 2):
+            path = f"/sys/devices/system/cpu/cpu0/cache/index{index}/size"
+            try:
+                with open(path, "r") as f:
+                    text = f.read().strip().upper()
+            except OSError:
+                continue
+            units = {"K": 1024, "M": 1024 * 1024}
+            _cache_bytes = int(text[:-1]) * units[text[-1]] if text[-1] in units else int(text)
+            break
+    return _cache_bytes
+
+
+def batch_size(frame_shape, limit=MAX_BATCH):
+    """Frames per batch: as many as fit in the cache share, 1..limit."""
+    frame_bytes = int(np.prod(frame_shape))
+    return max(1, min(limit, int(cache_bytes() * CACHE_SHARE) // max(1, frame_bytes)))
+
+
+def batches(frame_indices, size):
+    """Split an iterable of frame numbers into lists of at most size."""
+    batch = []
+    for frame_idx in frame_indices:
+        batch.append(frame_idx)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_entry(effect):
+    """The plugin's apply_effect_batch, or None."""
+    fn = getattr(effect, "__globals__", {}).get("apply_effect_batch")
+    return fn if callable(fn) else None
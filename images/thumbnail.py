@@ -5,12 +5,10 @@ from PIL import Image, ImageDraw, ImageFont
 # --- CONFIGURATION ---
 
 IMAGES_DIR = r"C:\Users\Mr_robot\Desktop\videoeditautomation\images\images"
-FONTS_DIR = r"C:\Users\Mr_robot\Desktop\videoeditautomation\images\thumbnail fonts"
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnail fonts")
 TEXT_FILE = r"C:\Users\Mr_robot\Desktop\videoeditautomation\images\thumbnail_texts.txt"
 OUTPUT_DIR = r"C:\Users\Mr_robot\Desktop\videoeditautomation\images\output_thumbnails"
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
 # --- UTILITIES ---
 
 def draw_heavy_shadow_text(draw, position, text, font, fill_color, shadow_color, shadow_radius=10):
@@ -45,53 +43,36 @@ def auto_fit_font(draw, text, font_path, max_width, start_size, min_size=20):
         font_size -= 2
     return load_font_safely(font_path, min_size)
 
-# --- LOAD FILES ---
-
-font_files = [os.path.join(FONTS_DIR, f) for f in os.listdir(FONTS_DIR) if f.lower().endswith((".ttf", ".otf"))]
-if not font_files:
-    raise FileNotFoundError("⚠️ No fonts found in thumbnail fonts directory!")
-
-image_files = [os.path.join(IMAGES_DIR, f) for f in os.listdir(IMAGES_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-if not image_files:
-    raise FileNotFoundError("⚠️ No images found in images directory!")
-
-if not os.path.exists(TEXT_FILE):
-    raise FileNotFoundError(f"⚠️ Text file not found: {TEXT_FILE}")
-
-with open(TEXT_FILE, "r", encoding="utf-8") as f:
-    lines = [line.strip() for line in f.readlines() if line.strip()]
-
-if not lines:
-    raise ValueError("⚠️ No valid text entries found in the text file.")
-
-# --- VALIDATION ---
-if len(lines) < len(image_files):
-    print(f"⚠️ Only {len(lines)} text entries found, {len(image_files)} images exist. Extra images will be skipped.")
-elif len(lines) > len(image_files):
-    print(f"⚠️ Only {len(image_files)} images found, extra text entries will be ignored.")
-
 # --- CONSTANTS ---
 REFERENCE_WIDTH = 1280
 BASE_TITLE_SIZE = 120
 BASE_ARTIST_SIZE = 50
 
-# --- MAIN LOOP ---
+# Text colors (unchanged style)
+TITLE_FILL = (255, 255, 255)
+TITLE_SHADOW = (0, 0, 0)
+ARTIST_FILL = (255, 255, 255)
+ARTIST_SHADOW = (0, 0, 0)
+
+# --- COMPOSITION (also used by the render pipeline's thumbnail sink) ---
 
-for idx, (image_path, text_line) in enumerate(zip(image_files, lines), 1):
-    print(f"🖼️ Processing {idx}/{len(image_files)}: {os.path.basename(image_path)}")
+def list_fonts(fonts_dir=FONTS_DIR):
+    if not os.path.isdir(fonts_dir):
+        return []
+    return [os.path.join(fonts_dir, f) for f in os.listdir(fonts_dir) if f.lower().endswith((".ttf", ".otf"))]
 
-    # Split title | artist
+def parse_text_line(text_line):
+    """'Title | Artist' -> (title, artist)."""
     parts = [p.strip() for p in text_line.split("|")]
-    song_title = parts[0] if len(parts) >= 1 else "Untitled"
-    artist_name = parts[1] if len(parts) >= 2 else "Unknown Artist"
+    song_title = parts[0] if len(parts) >= 1 and parts[0] else "Untitled"
+    artist_name = parts[1] if len(parts) >= 2 and parts[1] else "Unknown Artist"
+    return song_title, artist_name
 
-    # Load image
-    img = Image.open(image_path).convert("RGB")
+def compose_thumbnail(img, song_title, artist_name, font_path):
+    """Draw the centred title/artist overlay on a PIL RGB image (in place) and return it."""
     draw = ImageDraw.Draw(img, "RGBA")
     width, height = img.size
 
-    # Font selection
-    font_path = random.choice(font_files)
     scale_factor = width / REFERENCE_WIDTH
     max_text_width = int(width * 0.9)
 
@@ -111,23 +92,56 @@ for idx, (image_path, text_line) in enumerate(zip(image_files, lines), 1):
     artist_x = center_x - artist_w // 2
     artist_y = title_y + title_h + spacing_between
 
-    # Text colors (unchanged style)
-    TITLE_FILL = (255, 255, 255)
-    TITLE_SHADOW = (0, 0, 0)
-    ARTIST_FILL = (255, 255, 255)
-    ARTIST_SHADOW = (0, 0, 0)
-
     # Draw text (same style as before)
     draw_heavy_shadow_text(draw, (title_x, title_y), song_title, font_title, TITLE_FILL, TITLE_SHADOW, shadow_radius=int(12 * scale_factor))
     draw_heavy_shadow_text(draw, (artist_x, artist_y), artist_name, font_artist, ARTIST_FILL, ARTIST_SHADOW, shadow_radius=int(6 * scale_factor))
+    return img
+
+# --- MAIN LOOP (standalone: one thumbnail per background image) ---
+
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    font_files = list_fonts()
+    if not font_files:
+        raise FileNotFoundError("⚠️ No fonts found in thumbnail fonts directory!")
+
+    image_files = [os.path.join(IMAGES_DIR, f) for f in os.listdir(IMAGES_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    if not image_files:
+        raise FileNotFoundError("⚠️ No images found in images directory!")
+
+    if not os.path.exists(TEXT_FILE):
+        raise FileNotFoundError(f"⚠️ Text file not found: {TEXT_FILE}")
+
+    with open(TEXT_FILE, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f.readlines() if line.strip()]
+
+    if not lines:
+        raise ValueError("⚠️ No valid text entries found in the text file.")
+
+    # --- VALIDATION ---
+    if len(lines) < len(image_files):
+        print(f"⚠️ Only {len(lines)} text entries found, {len(image_files)} images exist. Extra images will be skipped.")
+    elif len(lines) > len(image_files):
+        print(f"⚠️ Only {len(image_files)} images found, extra text entries will be ignored.")
+
+    for idx, (image_path, text_line) in enumerate(zip(image_files, lines), 1):
+        print(f"🖼️ Processing {idx}/{len(image_files)}: {os.path.basename(image_path)}")
+
+        song_title, artist_name = parse_text_line(text_line)
+        img = Image.open(image_path).convert("RGB")
+        compose_thumbnail(img, song_title, artist_name, random.choice(font_files))
+
+        # Save thumbnail
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        output_filename = f"{base_name}_thumbnail.jpg"
+        output_path = os.path.join(OUTPUT_DIR, output_filename)
+        img.save(output_path, quality=95)
+
+        print(f"✅ Saved: {output_path}")
 
-    # Save thumbnail
-    base_name = os.path.splitext(os.path.basename(image_path))[0]
-    output_filename = f"{base_name}_thumbnail.jpg"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
-    img.save(output_path, quality=95)
+    print("\n🎉 All thumbnails generated successfully!")
 
-    print(f"✅ Saved: {output_path}")
 
-print("\n🎉 All thumbnails generated successfully!")
-#Let me confirm that the code is complete and correct.
\ No newline at end of file
+if __name__ == "__main__":
+    main()
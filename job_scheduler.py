@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import render_metrics as metrics
+
+# -----------------------
+# Longest-job-first batch scheduling
+# -----------------------
+# Each job gets an estimated cost = work units / calibrated rate, where
+#
+#   work units  = frames x megapixels for video jobs (render, video_effects)
+#               = seconds of audio for audio jobs (slow_reverb)
+#
+# and the rate (units per second) is learned per profile: the job kind plus the
+# enabled effect set. Jobs are dispatched longest-first to a process pool, so a
+# 10-minute track starts first instead of dragging out the end of the batch.
+# Every finished job updates its profile's rate (moving average) and the model
+# is saved to COST_MODEL_FILE for the next run.
+#
+# Workers import the Effect Bulk plugins on their own; the plugins pick each
+# video's preset under usage_lock, so workers don't hand out the same preset.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COST_MODEL_FILE = os.path.join(BASE_DIR, "scheduler_costs.json")
+WORKERS = max(1, (os.cpu_count() or 2) // 2)
+RATE_SMOOTHING = 0.3    # weight of the newest measurement
+
+# Starting rates before any calibration (units per second)
+DEFAULT_RATES = {
+    "render": 35.0,         # megapixel-frames/s (~45 fps at 720p with all effects)
+    "video_effects": 30.0,  # megapixel-frames/s
+    "slow_reverb": 40.0,    # audio seconds/s
+}
+
+# -----------------------
+# Probing
+# -----------------------
+def probe_media(path):
+    """{"duration", "width", "height", "fps"} via ffprobe; missing keys when absent, None on failure."""
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,r_frame_rate:format=duration",
+        "-of", "default=noprint_wrappers=1", path
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"❌ Could not probe {path}: {e}")
+        return None
+
+    info = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition("=")
+        try:
+            if key == "duration":
+                info["duration"] = float(value)
+            elif key in ("width", "height"):
+                info[key] = int(value)
+            elif key == "r_frame_rate":
+                num, _, den = value.partition("/")
+                info["fps"] = float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            continue
+    return info if "duration" in info else None
+
+
+def image_size(image_path):
+    """(width, height) from the image header, without decoding the pixels."""
+    from PIL import Image
+    with Image.open(image_path) as im:
+        return im.size
+
+# -----------------------
+# Cost model
+# -----------------------
+def load_cost_model(path=COST_MODEL_FILE):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Could not read cost model {path}: {e}")
+    return {"rates": {}}
+
+
+def save_cost_model(model, path=COST_MODEL_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(model, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def profile_key(kind, effects=()):
+    return kind if not effects else f"{kind}:{'+'.join(sorted(effects))}"
+
+
+def rate_for(model, kind, profile):
+    entry = model["rates"].get(profile) or model["rates"].get(kind)
+    return entry["rate"] if entry else DEFAULT_RATES.get(kind, 1.0)
+
+
+def record_measurement(model, kind, profile, units, seconds):
+    """Fold one finished job into the profile (and the kind-wide fallback) rate."""
+    if units <= 0 or seconds <= 0:
+        return
+    measured = units / seconds
+    for key in (profile, kind):
+        entry = model["rates"].get(key)
+        if entry is None:
+            model["rates"][key] = {"rate": measured, "samples": 1}
+        else:
+            entry["rate"] = (1 - RATE_SMOOTHING) * entry["rate"] + RATE_SMOOTHING * measured
+            entry["samples"] += 1
+
+# -----------------------
+# Jobs
+# -----------------------
+class Job:
+    """One unit of batch work: fn(*args) plus what the scheduler needs to cost it."""
+
+    def __init__(self, name, kind, units, fn, args=(), effects=()):
+        self.name = name
+        self.kind = kind
+        self.units = units
+        self.fn = fn
+        self.args = args
+        self.profile = profile_key(kind, effects)
+        self.estimate = None
+
+
+def _timed_call(fn, args):
+    """fn(*args) -> (result, seconds, error message or None, metrics worker of the process that ran it)."""
+    start = time.perf_counter()
+    try:
+        result, error = fn(*args), None
+    except Exception as e:
+        result, error = None, str(e) or type(e).__name__
+    finally:
+        if metrics.ENABLED:
+            metrics.flush()   # pool workers do not run atexit handlers
+    return result, time.perf_counter() - start, error, metrics.WORKER
+
+
+def run_jobs(jobs, workers=WORKERS, model_path=COST_MODEL_FILE):
+    """
+    Run jobs longest-estimated-first on `workers` processes (inline when 1).
+    Returns {job name: result}; a job that raised maps to None.
+    """
+    model = load_cost_model(model_path)
+    for job in jobs:
+        job.estimate = job.units / rate_for(model, job.kind, job.profile)
+    jobs = sorted(jobs, key=lambda j: j.estimate, reverse=True)
+
+    print(f"📋 {len(jobs)} jobs on {workers} worker(s), longest first:")
+    for job in jobs:
+        print(f"   {job.estimate:8.1f}s  {job.name}")
+
+    results = {}
+    started = time.time()
+    metrics.set_gauge("render_queue_depth", max(0, len(jobs) - workers))
+
+    def finish(job, result, seconds):
+        results[job.name] = result
+        metrics.inc("render_jobs_total", kind=job.kind, status="ok" if result is not None else "failed")
+        metrics.observe("render_job_seconds", seconds, kind=job.kind)
+        metrics.set_gauge("render_queue_depth", max(0, len(jobs) - len(results) - workers))
+        if result is not None:
+            record_measurement(model, job.kind, job.profile, job.units, seconds)
+            save_cost_model(model, model_path)
+        print(f"⏱️ {job.name}: {seconds:.1f}s (estimated {job.estimate:.1f}s)")
+
+    if workers <= 1:
+        for job in jobs:
+            result, seconds, error, _ = _timed_call(job.fn, job.args)
+            if error is not None:
+                print(f"❌ Job {job.name} failed: {error}")
+            finish(job, result, seconds)
+    else:
+        # The pool hands out work in submission order, so submitting sorted
+        # jobs gives longest-processing-time-first dispatch.
+        pool_workers = set()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_timed_call, job.fn, job.args): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result, seconds, error, worker = future.result()
+                    pool_workers.add(worker)
+                    if error is not None:
+                        print(f"❌ Job {job.name} failed: {error}")
+                except Exception as e:   # the worker died (BrokenProcessPool)
+                    print(f"❌ Job {job.name} failed: {e}")
+                    result, seconds = None, 0.0
+                finish(job, result, seconds)
+        # The workers have exited: stop exporting their last gauges
+        for worker in pool_workers:
+            metrics.remove_prom(worker)
+
+    print(f"🏁 Batch finished in {time.time() - started:.1f}s "
+          f"(sum of estimates {sum(j.estimate for j in jobs):.1f}s)")
+    if metrics.ENABLED:
+        print(metrics.summary(since=started))
+    return results
@@ -0,0 +1,88 @@
+import struct
+
+# -----------------------
+# Timestamped raw-frame pipe (minimal Matroska writer)
+# -----------------------
+# A rawvideo pipe has no timestamps: every frame costs a full write and encode.
+# Wrapping the same BGR bytes in a tiny streaming Matroska container
+# (V_UNCOMPRESSED, one SimpleBlock per cluster) gives each frame an explicit
+# timestamp. Frames identical to the previous one can then be skipped; the
+# earlier frame simply stays on screen until the next timestamp. ffmpeg reads
+# it with -f matroska and keeps the gaps with -fps_mode vfr.
+#
+# Only what ffmpeg's demuxer needs is written: no cues, no seeking, and an
+# unknown-size Segment so it can be streamed.
+
+TIMECODE_SCALE_NS = 1_000_000          # cluster/block timestamps in milliseconds
+BGR24_FOURCC = b"BGR\x18"              # ColourSpace ffmpeg maps to bgr24
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+
+
+def _vint_size(n):
+    """EBML variable-length size field."""
+    for length in range(1, 9):
+        if n < (1 << (7 * length)) - 1:
+            return (n | (1 << (7 * length))).to_bytes(length, "big")
+    raise ValueError(f"element too large: {n}")
+
+
+def _uint(n):
+    return n.to_bytes(max(1, (n.bit_length() + 7) // 8), "big")
+
+
+def _element(element_id, payload):
+    return element_id + _vint_size(len(payload)) + payload
+
+
+def _header(width, height, fps):
+    ebml = _element(b"\x1a\x45\xdf\xa3", b"".join([
+        _element(b"\x42\x86", _uint(1)),             # EBMLVersion
+        _element(b"\x42\xf7", _uint(1)),             # EBMLReadVersion
+        _element(b"\x42\xf2", _uint(4)),             # EBMLMaxIDLength
+        _element(b"\x42\xf3", _uint(8)),             # EBMLMaxSizeLength
+        _element(b"\x42\x82", b"matroska"),          # DocType
+        _element(b"\x42\x87", _uint(4)),             # DocTypeVersion
+        _element(b"\x42\x85", _uint(2)),             # DocTypeReadVersion
+    ]))
+    info = _element(b"\x15\x49\xa9\x66", b"".join([
+        _element(b"\x2a\xd7\xb1", _uint(TIMECODE_SCALE_NS)),
+        _element(b"\x4d\x80", b"autoedit"),          # MuxingApp
+        _element(b"\x57\x41", b"autoedit"),          # WritingApp
+    ]))
+    video = _element(b"\xe0", b"".join([
+        _element(b"\xb0", _uint(width)),             # PixelWidth
+        _element(b"\xba", _uint(height)),            # PixelHeight
+        _element(b"\x2e\xb5\x24", BGR24_FOURCC),     # ColourSpace
+    ]))
+    track = _element(b"\xae", b"".join([
+        _element(b"\xd7", _uint(1)),                 # TrackNumber
+        _element(b"\x73\xc5", _uint(1)),             # TrackUID
+        _element(b"\x83", _uint(1)),                 # TrackType: video
+        _element(b"\x86", b"V_UNCOMPRESSED"),        # CodecID
+        _element(b"\x23\xe3\x83", _uint(int(round(1e9 / fps)))),  # DefaultDuration
+        video,
+    ]))
+    tracks = _element(b"\x16\x54\xae\x6b", track)
+    segment = b"\x18\x53\x80\x67" + UNKNOWN_SIZE
+    return ebml + segment + info + tracks
+
+
+class MatroskaFrameWriter:
+    """Writes BGR frames with explicit frame-number timestamps to a binary stream."""
+
+    def __init__(self, stream, width, height, fps):
+        self.stream = stream
+        self.fps = fps
+        self.frame_bytes = width * height * 3
+        stream.write(_header(width, height, fps))
+
+    def write_frame(self, data, frame_number):
+        """data: BGR bytes (or any buffer) of one frame; frame_number sets its timestamp."""
+        timecode = int(round(frame_number * 1000 / self.fps))
+        block_header = b"\x81" + struct.pack(">h", 0) + b"\x80"   # track 1, +0 ms, keyframe
+        cluster_body = (
+            _element(b"\xe7", _uint(timecode))
+            + b"\xa3" + _vint_size(len(block_header) + self.frame_bytes) + block_header
+        )
+        self.stream.write(b"\x1f\x43\xb6\x75" + _vint_size(len(cluster_body) + self.frame_bytes) + cluster_body)
+        self.stream.write(data)
@@ -0,0 +1,178 @@
+import os
+import sys
+import time
+import struct
+import threading
+
+# -----------------------
+# Fragmented MP4 watcher
+# -----------------------
+# With -movflags frag_keyframe+empty_moov ffmpeg writes
+#
+#   ftyp moov | moof mdat | moof mdat | ... | (mfra)
+#
+# and never goes back to patch earlier bytes, so every finished moof+mdat pair
+# can be uploaded or copied while the rest is still encoding. The watcher reads
+# top-level box headers from a growing file or a pipe and calls
+#
+#   on_fragment(kind, index, data)
+#
+# kind is "init" (ftyp+moov, once), "fragment" (moof+mdat) or "index" (mfra at
+# the end); data is the raw bytes, so concatenating every call in order gives
+# back the complete file.
+
+POLL_INTERVAL = 0.05
+BOX_HEADER = struct.Struct(">I4s")
+
+
+class FragmentWatcher(threading.Thread):
+    """
+    Follows a fragmented MP4 as it is written. source is a path (tailed until
+    finish() is called) or a binary file object such as process.stdout.
+    """
+
+    def __init__(self, source, on_fragment, poll_interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.source = source
+        self.on_fragment = on_fragment
+        self.poll_interval = poll_interval
+        self.finished = threading.Event()
+        self.fragments = 0
+        self.bytes = 0
+        self.error = None
+
+    def finish(self):
+        """The writer is done: read what is left, then stop."""
+        self.finished.set()
+        self.join()
+        if self.error is not None:
+            print(f"⚠️ Fragment watcher stopped early: {self.error}")
+
+    # --- reading -------------------------------------------------------
+    def _read_exact(self, f, n):
+        """n bytes, waiting for a growing file; None at a clean end of stream."""
+        chunks, need = [], n
+        while need:
+            chunk = f.read(need)
+            if chunk:
+                chunks.append(chunk)
+                need -= len(chunk)
+                continue
+            if self.is_pipe or self.finished.is_set():
+                # A file may still get its last bytes between our read and finish()
+                chunk = f.read(need) if not self.is_pipe else b""
+                if chunk:
+                    chunks.append(chunk)
+                    need -= len(chunk)
+                    continue
+                if need == n:
+                    return None
+                raise EOFError(f"stream ended inside a box ({n - need}/{n} bytes)")
+            time.sleep(self.poll_interval)
+        return b"".join(chunks)
+
+    def _read_box(self, f):
+        header = self._read_exact(f, BOX_HEADER.size)
+        if header is None:
+            return None, None
+        size, box_type = BOX_HEADER.unpack(header)
+        if size == 1:
+            large = self._read_exact(f, 8)
+            header += large
+            size = struct.unpack(">Q", large)[0]
+        elif size == 0:
+            raise ValueError("box extends to end of file; not a fragmented MP4")
+        body = self._read_exact(f, size - len(header))
+        return box_type.decode("latin-1"), header + (body or b"")
+
+    def _emit(self, kind, data):
+        self.on_fragment(kind, self.fragments, data)
+        self.bytes += len(data)
+        if kind == "fragment":
+            self.fragments += 1
+
+    def run(self):
+        self.is_pipe = not isinstance(self.source, str)
+        try:
+            if self.is_pipe:
+                self._follow(self.source)
+            else:
+                while not os.path.exists(self.source):
+                    if self.finished.is_set():
+                        return
+                    time.sleep(self.poll_interval)
+                with open(self.source, "rb") as f:
+                    self._follow(f)
+        except (EOFError, ValueError, OSError) as e:
+            self.error = e
+
+    def _follow(self, f):
+        pending = b""   # boxes waiting for the box that completes their group
+        while True:
+            box_type, data = self._read_box(f)
+            if box_type is None:
+                if pending:
+                    self._emit("index", pending)
+                return
+            pending += data
+            if box_type == "moov":
+                self._emit("init", pending)
+                pending = b""
+            elif box_type == "mdat":
+                self._emit("fragment", pending)
+                pending = b""
+            elif box_type == "mfra":
+                self._emit("index", pending)
+                pending = b""
+
+# -----------------------
+# Hooks
+# -----------------------
+def copy_hook(dest_path):
+    """on_fragment hook that appends each finished piece to dest_path (e.g. an upload share)."""
+    tmp_path = dest_path + ".partial"
+    out = open(tmp_path, "wb")
+
+    def on_fragment(kind, index, data):
+        out.write(data)
+        out.flush()
+        if kind == "index":
+            out.close()
+            os.replace(tmp_path, dest_path)
+
+    def close():
+        if not out.closed:
+            out.close()
+            os.replace(tmp_path, dest_path)
+
+    on_fragment.close = close
+    return on_fragment
+
+
+def list_boxes(path):
+    """Top-level (type, offset, size) of an MP4 file."""
+    boxes = []
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            header = f.read(BOX_HEADER.size)
+            if len(header) < BOX_HEADER.size:
+                return boxes
+            size, box_type = BOX_HEADER.unpack(header)
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = os.path.getsize(path) - offset
+            boxes.append((box_type.decode("latin-1"), offset, size))
+            offset += size
+            f.seek(offset)
+
+
+if __name__ == "__main__":
+    boxes = list_boxes(sys.argv[1])
+    for box_type, offset, size in boxes:
+        print(f"{offset:>12}  {box_type}  {size}")
+    types = [b[0] for b in boxes]
+    layout = "fragmented" if "moof" in types else (
+        "fast-start" if "moov" in types and "mdat" in types and types.index("moov") < types.index("mdat") else "standard")
+    print(f"{len(boxes)} top-level boxes, {types.count('moof')} fragments ({layout})")
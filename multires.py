@@ -0,0 +1,59 @@
+import cv2
+
+# -----------------------
+# Multi-resolution effect layers
+# -----------------------
+# Glow, bloom and blur layers are low-frequency: rendered at 1/2 or 1/4 of the
+# output size and upsampled they look the same, at a fraction of the cost.
+# A plugin opts in with
+#
+#   EFFECT_META = {..., "working_scale": 0.5, "blend": "add"}
+#   def apply_effect_layer(small, ...):   # small: the input frame at working scale
+#       return layer, opacity             # layer: same size as small, uint8 BGR
+#
+# and implements apply_effect_frame with apply_layer() so it also works when
+# called directly. autoedit.render_frames calls apply_layer itself and passes
+# a downscaled input it keeps for the whole render when the input is static
+# (only frame-invariant effects before it in the chain). The layer function
+# must therefore not modify `small` in place.
+#
+# Blend modes: "add"  frame + layer * opacity
+#              "mix"  frame * (1 - opacity) + layer * opacity
+
+INTERPOLATION_DOWN = cv2.INTER_AREA
+INTERPOLATION_UP = cv2.INTER_LINEAR
+
+
+def scaled_size(shape, scale):
+    """(width, height) of a frame of this shape at the working scale."""
+    h, w = shape[:2]
+    return max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+
+
+def downscale(frame, scale):
+    if scale >= 1.0:
+        return frame
+    return cv2.resize(frame, scaled_size(frame.shape, scale), interpolation=INTERPOLATION_DOWN)
+
+
+def upscale(layer, shape):
+    h, w = shape[:2]
+    if layer.shape[:2] == (h, w):
+        return layer
+    return cv2.resize(layer, (w, h), interpolation=INTERPOLATION_UP)
+
+
+def blend(frame, layer, opacity, mode="add"):
+    if mode == "add":
+        return cv2.addWeighted(frame, 1.0, layer, opacity, 0)
+    if mode == "mix":
+        return cv2.addWeighted(frame, 1.0 - opacity, layer, opacity, 0)
+    raise ValueError(f"unknown blend mode: {mode}")
+
+
+def apply_layer(frame, layer_fn, scale, mode="add", small=None, **kwargs):
+    """Run layer_fn on a downscaled copy of frame (or on `small`), upsample its layer and blend it in."""
+    if small is None:
+        small = downscale(frame, scale)
+    layer, opacity = layer_fn(small, **kwargs)
+    return blend(frame, upscale(layer, frame.shape), opacity, mode)
@@ -0,0 +1,306 @@
+import os
+import sys
+import glob
+import struct
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+# -----------------------
+# Overlay pack format
+# -----------------------
+# One file per overlay:
+#   header      : magic, version, flags, frame count, canvas size, loop length
+#   frame table : start time + tight bounding box + data offset for every frame
+#   frame data  : premultiplied BGRA pixels of each bounding box, 64-byte aligned
+#
+# Fully transparent pixels outside a frame's bounding box are never stored,
+# and a fully transparent frame stores nothing at all (w == h == 0).
+# The file is read through np.memmap, so frames are never decoded at render
+# time and the page cache is shared by every render that uses the same pack.
+
+PACK_MAGIC = b"OVPK"
+PACK_VERSION = 1
+FLAG_PREMULTIPLIED = 1
+PACK_EXT = ".ovp"
+
+HEADER_FORMAT = "<4sHHIIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DATA_ALIGN = 64
+
+FRAME_TABLE_DTYPE = np.dtype([
+    ("start_ms", "<u4"),
+    ("x", "<u2"),
+    ("y", "<u2"),
+    ("w", "<u2"),
+    ("h", "<u2"),
+    ("offset", "<u8"),
+])
+
+
+def _align(value, alignment=DATA_ALIGN):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def tight_bbox(alpha):
+    """Return (x, y, w, h) of the non-transparent area, or None if empty."""
+    rows = np.flatnonzero(alpha.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(alpha.any(axis=0))
+    y0, y1 = rows[0], rows[-1] + 1
+    x0, x1 = cols[0], cols[-1] + 1
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def premultiply(bgra):
+    """Premultiply BGR by alpha so blending needs a single multiply per pixel."""
+    out = bgra.copy()
+    alpha = bgra[:, :, 3:4].astype(np.uint16)
+    out[:, :, :3] = ((bgra[:, :, :3].astype(np.uint16) * alpha + 127) // 255).astype(np.uint8)
+    return out
+
+# -----------------------
+# Writer
+# -----------------------
+def write_overlay_pack(frames, durations_ms, output_path):
+    """
+    Write a list of BGRA frames to a pack file.
+
+    durations_ms holds the display time of each frame, so GIF timing is kept.
+    Frames are anchored at the top-left; the canvas is the largest frame size.
+    """
+    if not frames:
+        raise ValueError("No frames to pack")
+    height = max(f.shape[0] for f in frames)
+    width = max(f.shape[1] for f in frames)
+
+    table = np.zeros(len(frames), dtype=FRAME_TABLE_DTYPE)
+    crops = []
+    start_ms = 0
+    offset = _align(HEADER_SIZE + table.nbytes)
+    for i, (frame, duration) in enumerate(zip(frames, durations_ms)):
+        table[i]["start_ms"] = start_ms
+        start_ms += max(1, int(round(duration)))
+
+        bbox = tight_bbox(frame[:, :, 3])
+        if bbox is None:
+            crops.append(None)
+            continue
+        x, y, w, h = bbox
+        crop = premultiply(frame[y:y+h, x:x+w])
+        table[i]["x"], table[i]["y"], table[i]["w"], table[i]["h"] = x, y, w, h
+        table[i]["offset"] = offset
+        crops.append(crop)
+        offset = _align(offset + crop.nbytes)
+
+    header = struct.pack(HEADER_FORMAT, PACK_MAGIC, PACK_VERSION, FLAG_PREMULTIPLIED,
+                         len(frames), width, height, start_ms)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(table.tobytes())
+        for entry, crop in zip(table, crops):
+            if crop is None:
+                continue
+            f.seek(int(entry["offset"]))
+            f.write(np.ascontiguousarray(crop).tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+# -----------------------
+# Reader
+# -----------------------
+class OverlayPack:
+    """Memory-mapped overlay pack. Frame views point straight into the page cache."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, flags, count, width, height, loop_ms = struct.unpack(
+            HEADER_FORMAT, self._mm[:HEADER_SIZE].tobytes()
+        )
+        if magic != PACK_MAGIC:
+            raise ValueError(f"Not an overlay pack: {path}")
+        if version != PACK_VERSION:
+            raise ValueError(f"Unsupported overlay pack version {version}: {path}")
+        self.flags = flags
+        self.frame_count = count
+        self.width = width
+        self.height = height
+        self.duration_ms = loop_ms
+        table_end = HEADER_SIZE + count * FRAME_TABLE_DTYPE.itemsize
+        self.table = self._mm[HEADER_SIZE:table_end].view(FRAME_TABLE_DTYPE)
+        self._starts = self.table["start_ms"].astype(np.int64)
+
+    def frame_index_at(self, t, loop=False):
+        """Frame shown at t seconds after the overlay starts, or None when finished."""
+        ms = int(t * 1000)
+        if ms < 0:
+            return None
+        if ms >= self.duration_ms:
+            if not loop:
+                return None
+            ms %= self.duration_ms
+        return int(np.searchsorted(self._starts, ms, side="right") - 1)
+
+    def frame(self, index):
+        """Return (x, y, premultiplied BGRA view) for a frame, or None if it is empty."""
+        entry = self.table[index]
+        w, h = int(entry["w"]), int(entry["h"])
+        if w == 0 or h == 0:
+            return None
+        offset = int(entry["offset"])
+        data = self._mm[offset:offset + w * h * 4].reshape(h, w, 4)
+        return int(entry["x"]), int(entry["y"]), data
+
+    def bounds(self, index, x=0, y=0, scale=1.0):
+        """(x0, y0, x1, y1) that composite() draws on for this frame, or None for an empty frame."""
+        entry = self.table[index]
+        w, h = int(entry["w"]), int(entry["h"])
+        if w == 0 or h == 0:
+            return None
+        fx, fy = int(entry["x"]), int(entry["y"])
+        if scale != 1.0:
+            w, h = max(1, int(w * scale)), max(1, int(h * scale))
+            fx, fy = int(fx * scale), int(fy * scale)
+        return x + fx, y + fy, x + fx + w, y + fy + h
+
+    def composite(self, background, index, x=0, y=0, scale=1.0):
+        """
+        Blend one frame onto background in place; only its bounding box is touched.
+        scale resizes the frame (and its offset) for reduced-resolution previews.
+        """
+        item = self.frame(index)
+        if item is None:
+            return background
+        fx, fy, data = item
+        if scale != 1.0:
+            size = (max(1, int(data.shape[1] * scale)), max(1, int(data.shape[0] * scale)))
+            data = cv2.resize(data, size, interpolation=cv2.INTER_AREA)
+            fx, fy = int(fx * scale), int(fy * scale)
+        bh, bw = background.shape[:2]
+        x0, y0 = x + fx, y + fy
+        x1, y1 = x0 + data.shape[1], y0 + data.shape[0]
+
+        # Clip to the background
+        cx0, cy0 = max(x0, 0), max(y0, 0)
+        cx1, cy1 = min(x1, bw), min(y1, bh)
+        if cx0 >= cx1 or cy0 >= cy1:
+            return background
+        src = data[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+        roi = background[cy0:cy1, cx0:cx1]
+
+        # Premultiplied "over": roi = roi * (1 - a) + src
+        inv_alpha = cv2.cvtColor(255 - src[:, :, 3], cv2.COLOR_GRAY2BGR)
+        cv2.add(cv2.multiply(roi, inv_alpha, scale=1 / 255), src[:, :, :3], dst=roi)
+        return background
+
+    def close(self):
+        mm = getattr(self._mm, "_mmap", None)
+        self.table = None
+        self._mm = None
+        if mm is not None:
+            mm.close()
+
+
+_PACK_CACHE = {}
+
+def load_overlay_pack(path):
+    """Open a pack once per process; repeated calls reuse the same mapping."""
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(key)
+    cached = _PACK_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    pack = OverlayPack(key)
+    _PACK_CACHE[key] = (mtime, pack)
+    return pack
+
+# -----------------------
+# Converters
+# -----------------------
+def _resize_bgra(frame, width):
+    if width is None or frame.shape[1] == width:
+        return frame
+    scale = width / frame.shape[1]
+    height = max(1, int(frame.shape[0] * scale))
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_LANCZOS4)
+
+
+def read_gif_frames(gif_path, width=None):
+    """Decode a GIF into BGRA frames plus per-frame durations in ms."""
+    frames, durations = [], []
+    with Image.open(gif_path) as gif:
+        for frame in ImageSequence.Iterator(gif):
+            rgba = np.array(frame.convert("RGBA"))
+            frames.append(_resize_bgra(cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA), width))
+            durations.append(frame.info.get("duration") or 100)
+    return frames, durations
+
+
+def read_png_sequence(folder, fps=30, width=None):
+    """Decode a folder of numbered PNGs (e.g. frame_00001.png) into BGRA frames."""
+    paths = sorted(glob.glob(os.path.join(folder, "*.png")))
+    frames = []
+    for path in paths:
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            print(f"⚠️ Skipping unreadable frame: {path}")
+            continue
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+        elif img.shape[2] == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+        frames.append(_resize_bgra(img, width))
+    return frames, [1000.0 / fps] * len(frames)
+
+
+def convert_to_pack(source, output_path=None, fps=30, width=None):
+    """Convert a GIF file or a PNG frame folder to an overlay pack."""
+    if os.path.isdir(source):
+        frames, durations = read_png_sequence(source, fps=fps, width=width)
+        default_out = source.rstrip("/\\") + PACK_EXT
+    elif source.lower().endswith(".gif"):
+        frames, durations = read_gif_frames(source, width=width)
+        default_out = os.path.splitext(source)[0] + PACK_EXT
+    else:
+        raise ValueError(f"Unsupported overlay source: {source}")
+
+    output_path = output_path or default_out
+    write_overlay_pack(frames, durations, output_path)
+
+    pack = OverlayPack(output_path)
+    raw_bytes = pack.frame_count * pack.width * pack.height * 4
+    packed_bytes = os.path.getsize(output_path)
+    pack.close()
+    print(f"✅ Packed {len(frames)} frames → {output_path} "
+          f"({packed_bytes / 1e6:.1f} MB, {raw_bytes / 1e6:.1f} MB unpacked)")
+    return output_path
+
+# -----------------------
+# Convert folders / GIFs from the command line
+# -----------------------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert PNG sequences or GIFs to overlay packs")
+    parser.add_argument("sources", nargs="+", help="PNG frame folders, GIF files, or folders of GIFs")
+    parser.add_argument("-o", "--output", help="Output path (single source only)")
+    parser.add_argument("--fps", type=float, default=30, help="Frame rate of PNG sequences")
+    parser.add_argument("--width", type=int, help="Resize frames to this width")
+    args = parser.parse_args()
+
+    if args.output and len(args.sources) > 1:
+        sys.exit("❌ --output can only be used with a single source")
+
+    for src in args.sources:
+        gifs = glob.glob(os.path.join(src, "*.gif")) if os.path.isdir(src) else []
+        if gifs:
+            # Folder of GIFs (e.g. SubscribeEmoji): one pack per GIF
+            for gif in sorted(gifs):
+                convert_to_pack(gif, fps=args.fps, width=args.width)
+        else:
+            convert_to_pack(src, args.output, fps=args.fps, width=args.width)
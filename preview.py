@@ -0,0 +1,105 @@
+import os
+import math
+import argparse
+import cv2
+import numpy as np
+
+import autoedit
+
+# -----------------------
+# Defaults for draft previews
+# -----------------------
+PREVIEW_SCALE = 0.5
+PREVIEW_FPS = 5
+SHEET_FRAMES = 12
+SHEET_COLUMNS = 4
+
+# -----------------------
+# Contact sheet
+# -----------------------
+def build_contact_sheet(frames, labels, columns=SHEET_COLUMNS, gap=4):
+    """Tile frames into a grid with a timestamp label on each tile."""
+    h, w = frames[0].shape[:2]
+    columns = min(columns, len(frames))
+    rows = math.ceil(len(frames) / columns)
+    sheet = np.zeros((rows * (h + gap) + gap, columns * (w + gap) + gap, 3), dtype=np.uint8)
+
+    font_scale = max(0.4, h / 360)
+    for i, (frame, label) in enumerate(zip(frames, labels)):
+        r, c = divmod(i, columns)
+        y = gap + r * (h + gap)
+        x = gap + c * (w + gap)
+        sheet[y:y+h, x:x+w] = frame
+        cv2.putText(sheet, label, (x + 8, y + int(24 * font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(sheet, label, (x + 8, y + int(24 * font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+    return sheet
+
+
+def render_contact_sheet(image_path, audio_path, sheet_path, fps=PREVIEW_FPS, scale=PREVIEW_SCALE,
+                         start_time=0.0, end_time=None, count=SHEET_FRAMES, video_id=None):
+    """
+    Render the window without encoding and keep evenly spaced frames.
+    Every frame in the window is still rendered so stateful effects
+    (particles) look the same as in the full video. video_id defaults to
+    the sheet's file name; pass the final video's name to see its presets.
+    """
+    video_id = video_id or os.path.basename(sheet_path)
+    img = autoedit.load_background(image_path, scale)
+    if img is None:
+        return None
+    duration = autoedit.probe_duration(audio_path)
+    if duration is None:
+        return None
+    frames = autoedit.frame_window(duration, fps, start_time, end_time)
+    if len(frames) == 0:
+        print("⚠️ Preview window is empty.")
+        return None
+
+    wanted = set(np.linspace(frames.start, frames.stop - 1, min(count, len(frames))).astype(int).tolist())
+    audio_name = os.path.splitext(os.path.basename(audio_path))[0]
+
+    picked, labels = [], []
+    audio_features = None
+    if autoedit.AUDIO_REACTIVE:
+        audio_features = autoedit.load_audio_features(audio_path, fps, total_frames=int(duration * fps))
+    context = autoedit.make_effect_context(fps, video_id, audio_name, scale, audio_features)
+    for frame_idx, frame in autoedit.render_frames(img, frames, context):
+        if frame_idx in wanted:
+            picked.append(frame)
+            labels.append(f"{frame_idx / fps:.1f}s")
+
+    sheet = build_contact_sheet(picked, labels)
+    cv2.imwrite(sheet_path, sheet)
+    print(f"🖼️ Contact sheet with {len(picked)} frames: {sheet_path}")
+    return sheet_path
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fast draft preview of the effect chain")
+    parser.add_argument("image")
+    parser.add_argument("audio")
+    parser.add_argument("-o", "--output", help="Output MP4 (default: preview_<audio>.mp4 in output dir)")
+    parser.add_argument("--scale", type=float, default=PREVIEW_SCALE, help="Fraction of full resolution")
+    parser.add_argument("--fps", type=float, default=PREVIEW_FPS)
+    parser.add_argument("--start", type=float, default=0.0, help="Window start in seconds")
+    parser.add_argument("--end", type=float, help="Window end in seconds (e.g. 8 to see the subscribe GIF)")
+    parser.add_argument("--video-id",
+                        help="Video id used for preset picks (default: the output's file name, as create_video "
+                             "uses); pass the final video's file name to preview its look")
+    parser.add_argument("--contact-sheet", metavar="IMAGE", help="Write a contact sheet instead of an MP4")
+    parser.add_argument("--sheet-frames", type=int, default=SHEET_FRAMES)
+    args = parser.parse_args()
+
+    if args.contact_sheet:
+        render_contact_sheet(args.image, args.audio, args.contact_sheet, args.fps, args.scale,
+                             args.start, args.end, args.sheet_frames, args.video_id)
+    else:
+        audio_name = os.path.splitext(os.path.basename(args.audio))[0]
+        output = args.output or os.path.join(autoedit.output_dir, f"preview_{audio_name}.mp4")
+        autoedit.THUMBNAILS = False  # drafts don't get a thumbnail
+        autoedit.create_video(args.image, args.audio, output, fps=args.fps, scale=args.scale,
+                              start_time=args.start, end_time=args.end, video_id=args.video_id)
@@ -0,0 +1,89 @@
+# -----------------------
+# Deadline-aware quality control
+# -----------------------
+# Effects that can trade quality for speed declare how many levels they have:
+#
+#   EFFECT_META = {..., "quality_levels": 3}
+#   def apply_effect_frame(frame, ..., quality=0):   # 0 = full quality
+#
+# The controller compares the smoothed frame time with the budget for a target
+# render fps. Every CHECK_FRAMES frames it steps the slowest effect that still
+# has a cheaper level down one level, or, with enough headroom, steps the most
+# recently degraded effect back up. Every change is logged, and report()
+# summarises how long each effect ran below full quality.
+
+CHECK_FRAMES = 10        # frames between decisions
+SMOOTHING = 0.2          # EWMA weight of the newest frame time
+DEGRADE_ABOVE = 1.05     # degrade when frame time > budget x this
+RESTORE_BELOW = 0.70     # restore when frame time < budget x this
+
+
+class QualityController:
+    """Tracks per-effect cost and picks a quality level per effect to hold target_fps."""
+
+    def __init__(self, levels, target_fps, fps=None):
+        """levels: {effect name: number of quality levels}; effects with 1 level are never touched."""
+        self.levels = {name: n for name, n in levels.items() if n > 1}
+        self.current = {name: 0 for name in levels}
+        self.budget = 1.0 / target_fps
+        self.fps = fps
+        self.frame_time = None
+        self.effect_time = {name: 0.0 for name in levels}
+        self.degraded_frames = {name: {} for name in levels}   # name -> {level: frames}
+        self.history = []                                      # degraded names, newest last
+        self.changes = []
+        self.frames = 0
+
+    def level(self, name):
+        return self.current.get(name, 0)
+
+    def record(self, name, seconds):
+        """Time one effect took on the current frame."""
+        previous = self.effect_time.get(name, seconds)
+        self.effect_time[name] = (1 - SMOOTHING) * previous + SMOOTHING * seconds
+
+    def end_frame(self, frame_idx, seconds):
+        self.frames += 1
+        self.frame_time = seconds if self.frame_time is None else (
+            (1 - SMOOTHING) * self.frame_time + SMOOTHING * seconds)
+        for name, level in self.current.items():
+            if level:
+                counts = self.degraded_frames[name]
+                counts[level] = counts.get(level, 0) + 1
+        if self.frames % CHECK_FRAMES == 0:
+            self._adjust(frame_idx)
+
+    def _set(self, name, level, frame_idx, reason):
+        old = self.current[name]
+        self.current[name] = level
+        self.changes.append((frame_idx, name, old, level))
+        icon = "📉" if level > old else "📈"
+        print(f"\n{icon} frame {frame_idx}: {name} quality {old} → {level} ({reason})")
+
+    def _adjust(self, frame_idx):
+        if not self.levels:
+            return
+        if self.frame_time > self.budget * DEGRADE_ABOVE:
+            candidates = [n for n in self.levels if self.current[n] < self.levels[n] - 1]
+            if candidates:
+                name = max(candidates, key=lambda n: self.effect_time.get(n, 0.0))
+                self._set(name, self.current[name] + 1, frame_idx,
+                          f"{self.frame_time * 1000:.0f} ms/frame > {self.budget * 1000:.0f} ms budget")
+                self.history.append(name)
+        elif self.frame_time < self.budget * RESTORE_BELOW and self.history:
+            name = self.history.pop()
+            self._set(name, self.current[name] - 1, frame_idx,
+                      f"{self.frame_time * 1000:.0f} ms/frame, headroom")
+
+    def report(self):
+        """One line per effect that ran degraded; empty string if none did."""
+        lines = []
+        for name, counts in self.degraded_frames.items():
+            if not counts:
+                continue
+            total = sum(counts.values())
+            seconds = f" ({total / self.fps:.1f}s of video)" if self.fps else ""
+            per_level = ", ".join(f"level {lvl}: {n}" for lvl, n in sorted(counts.items()))
+            lines.append(f"⚠️ {name} degraded for {total}/{self.frames} frames{seconds} [{per_level}]")
+        return "\n".join(lines)
+
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import traceback
+
+# -----------------------
+# Spool directory layout
+# -----------------------
+# render_queue/
+#   incoming/  job files waiting to be rendered (written atomically by submit)
+#   working/   claimed by a daemon (atomic rename, so two daemons never share a job)
+#   done/      finished jobs with their result
+#   failed/    jobs that raised or whose ffmpeg run failed
+#
+# A job file is JSON:
+#   {"image": "...", "audio": "...", "output": "... (optional)",
+#    "effects": ["shakeEfect", "styled_text"] (optional, default all), "fps": 10,
+#    "checkpoint": true (optional, resumable segment render; see checkpoint_render)}
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_DIR = os.path.join(BASE_DIR, "render_queue")
+POLL_INTERVAL = 0.2
+STATES = ("incoming", "working", "done", "failed")
+
+
+def queue_path(queue_dir, state, name=""):
+    return os.path.join(queue_dir, state, name)
+
+
+def ensure_queue(queue_dir=QUEUE_DIR):
+    for state in STATES:
+        os.makedirs(queue_path(queue_dir, state), exist_ok=True)
+
+# -----------------------
+# Submitting jobs
+# -----------------------
+def submit_job(image, audio, output=None, effects=None, fps=None, queue_dir=QUEUE_DIR, checkpoint=False):
+    """Drop a job into the spool; the daemon picks it up on its next poll."""
+    ensure_queue(queue_dir)
+    job = {"image": os.path.abspath(image), "audio": os.path.abspath(audio)}
+    if output:
+        job["output"] = os.path.abspath(output)
+    if effects:
+        job["effects"] = list(effects)
+    if fps:
+        job["fps"] = fps
+    if checkpoint:
+        job["checkpoint"] = True
+    job["submitted"] = time.time()
+
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}.json"
+    tmp_path = queue_path(queue_dir, "incoming", name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, queue_path(queue_dir, "incoming", name))
+    print(f"📥 Queued {name}")
+    return name
+
+# -----------------------
+# Daemon
+# -----------------------
+def claim_next_job(queue_dir):
+    """Move the oldest incoming job to working/; None if the queue is empty."""
+    incoming = queue_path(queue_dir, "incoming")
+    # Job names start with their submit timestamp, so name order is FIFO
+    for name in sorted(n for n in os.listdir(incoming) if n.endswith(".json")):
+        try:
+            os.replace(os.path.join(incoming, name), queue_path(queue_dir, "working", name))
+            return name
+        except FileNotFoundError:
+            continue  # another daemon claimed it first
+    return None
+
+
+def finish_job(queue_dir, name, job, state):
+    with open(queue_path(queue_dir, "working", name), "w") as f:
+        json.dump(job, f, indent=2)
+    os.replace(queue_path(queue_dir, "working", name), queue_path(queue_dir, state, name))
+
+
+def run_job(autoedit, queue_dir, name):
+    with open(queue_path(queue_dir, "working", name), "r") as f:
+        job = json.load(f)
+
+    started = time.time()
+    try:
+        # Imports only the selected plugins; cached ones are re-executed only if changed
+        effects = autoedit.load_effect_modules(job.get("effects"))
+        output = job.get("output") or autoedit.get_random_video_name(autoedit.output_dir)
+        if job.get("checkpoint"):
+            # A re-queued job picks up from its last finished segment
+            import checkpoint_render
+            result = checkpoint_render.create_video_checkpointed(job["image"], job["audio"], job.get("output"),
+                                                                 fps=job.get("fps", 10), effects=effects)
+            output = result or output
+        else:
+            result = autoedit.create_video(job["image"], job["audio"], output,
+                                           fps=job.get("fps", 10), effects=effects)
+        job["output"] = output
+        state = "done" if result else "failed"
+    except Exception as e:
+        job["error"] = f"{e}\n{traceback.format_exc()}"
+        print(f"❌ Job {name} failed: {e}")
+        state = "failed"
+
+    job["started"] = started
+    job["seconds"] = round(time.time() - started, 2)
+    finish_job(queue_dir, name, job, state)
+    print(f"{'✅' if state == 'done' else '❌'} {name} → {state} in {job['seconds']}s")
+
+
+def recover_working(queue_dir):
+    """Put jobs left in working/ by a crashed daemon back in the queue."""
+    for name in os.listdir(queue_path(queue_dir, "working")):
+        if name.endswith(".json"):
+            os.replace(queue_path(queue_dir, "working", name), queue_path(queue_dir, "incoming", name))
+            print(f"♻️ Re-queued interrupted job {name}")
+
+
+def serve(queue_dir=QUEUE_DIR, poll_interval=POLL_INTERVAL):
+    ensure_queue(queue_dir)
+    recover_working(queue_dir)
+
+    # Warm everything once: cv2/NumPy, effect modules, decoded GIFs, usage JSONs
+    started = time.time()
+    import autoedit
+    import effect_registry
+    effects = autoedit.load_effect_modules()
+    print(effect_registry.format_report(effect_registry.discover(autoedit.effects_dir)))
+    print(f"🔥 Warm in {time.time() - started:.2f}s with {len(effects)} effects; "
+          f"watching {queue_path(queue_dir, 'incoming')}")
+
+    while True:
+        name = claim_next_job(queue_dir)
+        if name is None:
+            time.sleep(poll_interval)
+            continue
+        try:
+            run_job(autoedit, queue_dir, name)
+        except KeyboardInterrupt:
+            os.replace(queue_path(queue_dir, "working", name), queue_path(queue_dir, "incoming", name))
+            raise
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render daemon with warm effects and a spool-directory queue")
+    parser.add_argument("--queue", default=QUEUE_DIR, help="Spool directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("serve", help="Run the daemon")
+
+    submit = sub.add_parser("submit", help="Queue a render job")
+    submit.add_argument("image")
+    submit.add_argument("audio")
+    submit.add_argument("-o", "--output")
+    submit.add_argument("--effects", help="Comma-separated effect module names (default: all)")
+    submit.add_argument("--fps", type=float)
+    submit.add_argument("--checkpoint", action="store_true", help="Resumable segment render for long tracks")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        try:
+            serve(args.queue)
+        except KeyboardInterrupt:
+            print("\n👋 Daemon stopped")
+            sys.exit(0)
+    else:
+        effects = args.effects.split(",") if args.effects else None
+        submit_job(args.image, args.audio, args.output, effects, args.fps, args.queue, args.checkpoint)
@@ -0,0 +1,373 @@
+import os
+import sys
+import glob
+import json
+import time
+import atexit
+import socket
+import bisect
+import threading
+
+# -----------------------
+# Operational metrics for batch runs
+# -----------------------
+# Enable with the RENDER_METRICS environment variable (a directory, e.g. the
+# node_exporter textfile collector directory) or by calling enable(). While
+# disabled every call returns immediately, like render_trace.
+#
+# Each process keeps its own counters, gauges and histograms and, every
+# FLUSH_SECONDS (and when a job finishes), rewrites
+#
+#   <dir>/render_<host>_<pid>.prom    Prometheus text format, one file per process
+#   <dir>/render_<host>_<pid>.jsonl   one snapshot per line, appended
+#
+# A process removes its .prom when it exits (job_scheduler does it for its pool
+# workers, which skip atexit), so a finished process stops exporting its last
+# gauges. A .jsonl past JSONL_MAX_BYTES moves to .jsonl.1 (one old generation
+# kept), and enable() deletes files nobody has written for KEEP_DAYS.
+#
+# All series carry a worker="<host>_<pid>" label so files from several
+# processes never clash. summary() merges the latest snapshot of every process
+# in the directory into a run report; `python render_metrics.py <dir>` prints it.
+
+FLUSH_SECONDS = 15
+JSONL_MAX_BYTES = 4 * 1024 * 1024
+KEEP_DAYS = 7
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HELP = {
+    "render_queue_depth": "Jobs waiting to start",
+    "render_jobs_total": "Finished jobs by kind and status",
+    "render_job_seconds": "Wall time per job",
+    "render_job_fps": "Frames per second of the last finished job",
+    "render_frames_total": "Frames rendered",
+    "render_frames_skipped_total": "Duplicate frames not sent to the encoder",
+    "render_frame_seconds": "Time to render one frame (all effects)",
+    "render_effect_seconds_total": "Time spent in each effect",
+    "render_effect_errors_total": "Effect calls that raised and were skipped",
+    "render_effect_reused_total": "Effect calls skipped because the output could not change (see dirty_rects)",
+    "render_encoder_wait_seconds_total": "Time blocked on the encoder (pipe writes and final wait)",
+    "render_cache_requests_total": "Cache lookups by cache and result",
+}
+
+ENABLED = False
+METRICS_DIR = None
+WORKER = f"{socket.gethostname()}_{os.getpid()}"
+
+_counters = {}     # (name, labels) -> value
+_gauges = {}
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_buckets = {}      # name -> bucket bounds
+_lock = threading.Lock()
+_flusher = None
+_flush_interval = FLUSH_SECONDS
+
+# -----------------------
+# Setup
+# -----------------------
+def enable(metrics_dir="render_metrics", flush_seconds=FLUSH_SECONDS):
+    """Start collecting; files go to metrics_dir every flush_seconds and at exit."""
+    global ENABLED, METRICS_DIR, WORKER, _flusher, _flush_interval
+    os.makedirs(metrics_dir, exist_ok=True)
+    METRICS_DIR = metrics_dir
+    WORKER = f"{socket.gethostname()}_{os.getpid()}"
+    prune(metrics_dir)
+    if not ENABLED:
+        atexit.register(_at_exit)
+    ENABLED = True
+    _flush_interval = flush_seconds
+    if _flusher is None and flush_seconds:
+        _flusher = threading.Thread(target=_flush_loop, args=(flush_seconds,), daemon=True)
+        _flusher.start()
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def _at_exit():
+    flush()
+    remove_prom()
+
+
+def prune(metrics_dir, keep_days=KEEP_DAYS):
+    """Delete metric files (of any process) not written for keep_days, e.g. left by a crash."""
+    cutoff = time.time() - keep_days * 86400
+    for path in glob.glob(os.path.join(metrics_dir, "render_*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        if ENABLED:
+            flush()
+
+
+def _after_fork():
+    """Pool workers start with empty series under their own pid (threads do not survive fork)."""
+    global WORKER, _lock, _flusher
+    WORKER = f"{socket.gethostname()}_{os.getpid()}"
+    _lock = threading.Lock()
+    _counters.clear()
+    _gauges.clear()
+    _histograms.clear()
+    if _flusher is not None:
+        _flusher = threading.Thread(target=_flush_loop, args=(_flush_interval,), daemon=True)
+        _flusher.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def declare_buckets(name, bounds):
+    """Histogram bucket upper bounds for name (DEFAULT_BUCKETS otherwise)."""
+    _buckets[name] = tuple(sorted(bounds))
+
+# -----------------------
+# Recording
+# -----------------------
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    """Add to a counter."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Add one sample to a histogram."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    bounds = _buckets.get(name, DEFAULT_BUCKETS)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(bounds) + 2)
+        h[bisect.bisect_left(bounds, value)] += 1
+        h[-1] += value
+
+
+def cache_lookup(cache, hit):
+    inc("render_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+# -----------------------
+# Export
+# -----------------------
+def snapshot():
+    """Plain-dict copy of every series (what the JSON lines file stores)."""
+    with _lock:
+        counters = [[n, dict(l), v] for (n, l), v in _counters.items()]
+        gauges = [[n, dict(l), v] for (n, l), v in _gauges.items()]
+        histograms = [[n, dict(l), list(_buckets.get(n, DEFAULT_BUCKETS)), list(h)]
+                      for (n, l), h in _histograms.items()]
+    return {"ts": time.time(), "worker": WORKER, "argv": os.path.basename(sys.argv[0]),
+            "counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    items = {"worker": WORKER, **labels, **extra}
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items.items()) + "}"
+
+
+def prometheus_text(snap):
+    lines, typed = [], set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for name, labels, value in sorted(snap["counters"], key=lambda s: s[0]):
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for name, labels, value in sorted(snap["gauges"], key=lambda s: s[0]):
+        header(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for name, labels, bounds, h in sorted(snap["histograms"], key=lambda s: s[0]):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(list(bounds) + ["+Inf"], h[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {h[-1]}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    """Rewrite this process's .prom file and append a snapshot to its .jsonl file."""
+    if METRICS_DIR is None:
+        return
+    snap = snapshot()
+    base = os.path.join(METRICS_DIR, f"render_{WORKER}")
+    # The textfile collector may read at any moment: write then rename
+    tmp_path = f"{base}.prom.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text(snap))
+    os.replace(tmp_path, f"{base}.prom")
+    jsonl_path = f"{base}.jsonl"
+    if os.path.exists(jsonl_path) and os.path.getsize(jsonl_path) > JSONL_MAX_BYTES:
+        os.replace(jsonl_path, f"{jsonl_path}.1")
+    with open(jsonl_path, "a") as f:
+        f.write(json.dumps(snap) + "\n")
+
+
+def remove_prom(worker=None):
+    """Stop exporting a process's series (default: this one's) by removing its .prom file."""
+    if METRICS_DIR is None:
+        return
+    try:
+        os.remove(os.path.join(METRICS_DIR, f"render_{worker or WORKER}.prom"))
+    except FileNotFoundError:
+        pass
+
+# -----------------------
+# Run summary
+# -----------------------
+def _latest_snapshots(metrics_dir, since=0.0):
+    snaps = []
+    for path in glob.glob(os.path.join(metrics_dir, "render_*.jsonl")):
+        last = None
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    last = line
+        if last is not None:
+            snap = json.loads(last)
+            if snap["ts"] >= since:
+                snaps.append(snap)
+    return snaps
+
+
+def _merge(snaps):
+    """Sum counters and histograms over processes, keyed by (name, labels without worker)."""
+    counters, histograms, gauges = {}, {}, {}
+    for snap in snaps:
+        for name, labels, value in snap["counters"]:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snap["gauges"]:
+            gauges[_key(name, labels)] = value
+        for name, labels, bounds, h in snap["histograms"]:
+            key = _key(name, labels)
+            if key in histograms:
+                histograms[key][1] = [a + b for a, b in zip(histograms[key][1], h)]
+            else:
+                histograms[key] = [bounds, list(h)]
+    return counters, gauges, histograms
+
+
+def _quantile(bounds, h, q):
+    """Upper bound of the bucket holding quantile q (histogram estimate)."""
+    total = sum(h[:-1])
+    if not total:
+        return 0.0
+    target, seen = q * total, 0
+    for bound, count in zip(list(bounds) + [float("inf")], h[:-1]):
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+def summary(metrics_dir=None, since=0.0):
+    """Run report merged from every process's latest snapshot in metrics_dir."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    if metrics_dir is None:
+        return ""
+    if ENABLED and metrics_dir == METRICS_DIR:
+        flush()
+    snaps = _latest_snapshots(metrics_dir, since)
+    if not snaps:
+        return ""
+    counters, gauges, histograms = _merge(snaps)
+
+    def total(name, **match):
+        return sum(v for (n, l), v in counters.items()
+                   if n == name and all(dict(l).get(k) == x for k, x in match.items()))
+
+    lines = [f"📈 Metrics from {len(snaps)} process(es)"]
+
+    jobs = {}
+    for (n, l), v in counters.items():
+        if n == "render_jobs_total":
+            labels = dict(l)
+            jobs.setdefault(labels.get("kind", "?"), {})[labels.get("status", "?")] = v
+    for kind, by_status in sorted(jobs.items()):
+        detail = ", ".join(f"{s}: {int(v)}" for s, v in sorted(by_status.items()))
+        line = f"   jobs[{kind}]  {detail}"
+        for (n, l), (bounds, h) in histograms.items():
+            if n == "render_job_seconds" and dict(l).get("kind") == kind:
+                count = sum(h[:-1])
+                line += f"  mean {h[-1] / max(count, 1):.1f}s  p95 <= {_quantile(bounds, h, 0.95)}s"
+        lines.append(line)
+
+    frames = total("render_frames_total")
+    frame_seconds = sum(h[-1] for (n, _), (_, h) in histograms.items() if n == "render_frame_seconds")
+    if frames:
+        fps = f"{frames / frame_seconds:.1f} fps in effects" if frame_seconds else ""
+        lines.append(f"   frames  {int(frames)} rendered, {int(total('render_frames_skipped_total'))} skipped  {fps}")
+    encoder = total("render_encoder_wait_seconds_total")
+    if encoder:
+        lines.append(f"   encoder wait  {encoder:.1f}s")
+
+    effect_times = {}
+    for (n, l), v in counters.items():
+        if n == "render_effect_seconds_total":
+            effect = dict(l).get("effect", "?")
+            effect_times[effect] = effect_times.get(effect, 0) + v
+    effect_total = sum(effect_times.values())
+    if effect_total:
+        lines.append("   effect time share:")
+        for effect, seconds in sorted(effect_times.items(), key=lambda e: -e[1]):
+            errors = total("render_effect_errors_total", effect=effect)
+            err = f"  ❌ {int(errors)} errors" if errors else ""
+            lines.append(f"     {effect:<28} {100 * seconds / effect_total:5.1f}%  {seconds:8.1f}s{err}")
+
+    caches = {}
+    for (n, l), v in counters.items():
+        if n == "render_cache_requests_total":
+            labels = dict(l)
+            caches.setdefault(labels.get("cache", "?"), {})[labels.get("result")] = v
+    for cache, results in sorted(caches.items()):
+        hits, misses = results.get("hit", 0), results.get("miss", 0)
+        lines.append(f"   cache[{cache}]  {100 * hits / max(hits + misses, 1):.0f}% hits ({int(hits)}/{int(hits + misses)})")
+
+    depth = [v for (n, _), v in gauges.items() if n == "render_queue_depth"]
+    if depth:
+        lines.append(f"   queue depth  {int(sum(depth))} waiting")
+    return "\n".join(lines)
+
+
+if METRICS_DIR is None and os.environ.get("RENDER_METRICS"):
+    enable(os.environ["RENDER_METRICS"], float(os.environ.get("RENDER_METRICS_FLUSH", FLUSH_SECONDS)))
+
+
+if __name__ == "__main__":
+    report = summary(sys.argv[1] if len(sys.argv) > 1 else "render_metrics")
+    print(report or "⚠️ No metrics found")
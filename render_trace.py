@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import atexit
+import threading
+import numpy as np
+
+# -----------------------
+# Opt-in render tracing
+# -----------------------
+# Enable with the RENDER_TRACE environment variable (path of the trace JSON)
+# or by calling enable(). While disabled, span() returns a shared no-op object
+# and hot loops guard record() with `if render_trace.ENABLED:`, so leaving the
+# calls in production code costs one attribute lookup per site.
+#
+# Spans are kept in a preallocated ring buffer (numpy arrays); when it is full
+# the oldest spans are overwritten. On exit a Chrome/Perfetto trace JSON
+# (chrome://tracing, ui.perfetto.dev) and a p50/p95/p99 summary are written.
+
+DEFAULT_CAPACITY = 1 << 20
+
+ENABLED = False
+TRACE_PATH = None
+
+_capacity = 0
+_count = 0
+_name_idx = None
+_start_ns = None
+_dur_ns = None
+_tid = None
+_arg = None
+
+_names = []
+_name_ids = {}
+_lock = threading.Lock()
+_epoch_ns = time.perf_counter_ns()
+
+now = time.perf_counter_ns
+
+# -----------------------
+# Setup
+# -----------------------
+def enable(path="render_trace.json", capacity=DEFAULT_CAPACITY):
+    """Start recording spans; the trace is written to path at exit."""
+    global ENABLED, TRACE_PATH, _capacity, _count, _name_idx, _start_ns, _dur_ns, _tid, _arg
+    _capacity = int(capacity)
+    _count = 0
+    _name_idx = np.zeros(_capacity, dtype=np.int32)
+    _start_ns = np.zeros(_capacity, dtype=np.int64)
+    _dur_ns = np.zeros(_capacity, dtype=np.int64)
+    _tid = np.zeros(_capacity, dtype=np.int64)
+    _arg = np.full(_capacity, -1, dtype=np.int64)
+    TRACE_PATH = path
+    if not ENABLED:
+        atexit.register(flush)
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def name_id(name):
+    """Intern a span name; hot loops look the id up once and reuse it."""
+    idx = _name_ids.get(name)
+    if idx is None:
+        with _lock:
+            idx = _name_ids.get(name)
+            if idx is None:
+                idx = len(_names)
+                _names.append(name)
+                _name_ids[name] = idx
+    return idx
+
+# -----------------------
+# Recording
+# -----------------------
+def record(span_name, start_ns, end_ns=None, arg=-1):
+    """Store a finished span. span_name may be a string or an id from name_id()."""
+    global _count
+    if not ENABLED:
+        return
+    if end_ns is None:
+        end_ns = now()
+    if isinstance(span_name, str):
+        span_name = name_id(span_name)
+    with _lock:
+        slot = _count % _capacity
+        _count += 1
+    _name_idx[slot] = span_name
+    _start_ns[slot] = start_ns
+    _dur_ns[slot] = end_ns - start_ns
+    _tid[slot] = threading.get_ident()
+    _arg[slot] = arg
+
+
+class _Span:
+    __slots__ = ("name", "arg", "start")
+
+    def __init__(self, name, arg):
+        self.name = name
+        self.arg = arg
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, arg=self.arg)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+def span(name, arg=-1):
+    """Context manager recording one span (no-op while tracing is disabled)."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, arg)
+
+# -----------------------
+# Export
+# -----------------------
+def _recorded():
+    """Slot indices of the spans still in the buffer, oldest first."""
+    if _count <= _capacity:
+        return np.arange(_count)
+    head = _count % _capacity
+    return np.concatenate([np.arange(head, _capacity), np.arange(head)])
+
+
+def summary():
+    """Per-span-name statistics in milliseconds, slowest total first."""
+    slots = _recorded()
+    if slots.size == 0:
+        return []
+    names = _name_idx[slots]
+    durs = _dur_ns[slots] / 1e6
+    rows = []
+    for idx in np.unique(names):
+        d = durs[names == idx]
+        p50, p95, p99 = np.percentile(d, [50, 95, 99])
+        rows.append({
+            "name": _names[idx],
+            "count": int(d.size),
+            "total_ms": float(d.sum()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        })
+    rows.sort(key=lambda r: -r["total_ms"])
+    return rows
+
+
+def format_summary(rows):
+    lines = [f"{'span':<36} {'count':>8} {'total ms':>11} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for r in rows:
+        lines.append(f"{r['name']:<36} {r['count']:>8} {r['total_ms']:>11.1f} "
+                     f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+    return "\n".join(lines)
+
+
+def write_chrome_trace(path):
+    slots = _recorded()
+    pid = os.getpid()
+    tids = {}
+    events = []
+    for slot in slots:
+        name = _names[_name_idx[slot]]
+        tid = tids.setdefault(int(_tid[slot]), len(tids) + 1)
+        event = {
+            "name": name,
+            "cat": name.split(":", 1)[0],
+            "ph": "X",
+            "ts": (int(_start_ns[slot]) - _epoch_ns) / 1000,
+            "dur": int(_dur_ns[slot]) / 1000,
+            "pid": pid,
+            "tid": tid,
+        }
+        if _arg[slot] >= 0:
+            event["args"] = {"frame": int(_arg[slot])}
+        events.append(event)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def flush():
+    """Write the Chrome trace and the summary table next to it."""
+    if TRACE_PATH is None or _count == 0:
+        return
+    write_chrome_trace(TRACE_PATH)
+    table = format_summary(summary())
+    summary_path = os.path.splitext(TRACE_PATH)[0] + "_summary.txt"
+    with open(summary_path, "w") as f:
+        f.write(table + "\n")
+    dropped = max(0, _count - _capacity)
+    print(f"\n📊 Trace written to {TRACE_PATH} ({min(_count, _capacity)} spans"
+          f"{f', {dropped} oldest dropped' if dropped else ''})")
+    print(table)
+
+
+if os.environ.get("RENDER_TRACE"):
+    enable(os.environ["RENDER_TRACE"], int(os.environ.get("RENDER_TRACE_CAPACITY", DEFAULT_CAPACITY)))
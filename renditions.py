@@ -0,0 +1,223 @@
+import os
+import uuid
+import argparse
+import subprocess
+
+import cv2
+
+import autoedit
+import render_trace as trace
+import render_metrics as metrics
+from thumbnail_sink import ThumbnailSink, text_for
+
+# -----------------------
+# Rendition ladder
+# -----------------------
+# One render, several output geometries (landscape, vertical short-form, a
+# 480p preview). The effect chain is split at its first "layout" effect
+# (EFFECT_META "layout": places text or GIFs relative to the frame edges):
+#
+#   shared      effects before it run once per frame on the source frame
+#   reframe     per rendition: centred crop to the aspect ratio, then scale
+#   per output  the layout effect and everything after it, with render_scale
+#               following the output size so text and GIFs are laid out anew
+#
+# When the shared part is frame-invariant its reframed result is kept for the
+# whole render. The audio is encoded to AAC once and copied into every output.
+
+RENDITIONS = {
+    # aspect (w, h) of the crop (None = the source's), output height (None = the crop's; never upscaled)
+    "landscape": {"aspect": (16, 9), "height": None, "suffix": "", "thumbnail": True},
+    "vertical":  {"aspect": (9, 16), "height": None, "suffix": "_vertical", "thumbnail": True},
+    "preview":   {"aspect": (16, 9), "height": 480, "suffix": "_480p", "thumbnail": False},
+}
+DEFAULT_LADDER = ["landscape", "vertical", "preview"]
+
+
+def rendition_geometry(src_w, src_h, aspect=None, height=None):
+    """((x, y, w, h) crop of the source, (width, height) of the output), with even output sides."""
+    crop_w, crop_h = src_w, src_h
+    if aspect is not None:
+        aw, ah = aspect
+        if src_w * ah > src_h * aw:   # source is wider: crop the sides
+            crop_w = min(src_w, int(round(src_h * aw / ah)))
+        else:
+            crop_h = min(src_h, int(round(src_w * ah / aw)))
+    x, y = (src_w - crop_w) // 2, (src_h - crop_h) // 2
+
+    out_h = min(height, crop_h) if height else crop_h
+    out_w = crop_w * out_h / crop_h
+    out_w, out_h = max(2, int(round(out_w)) // 2 * 2), max(2, out_h // 2 * 2)
+    return (x, y, crop_w, crop_h), (out_w, out_h)
+
+
+def reframe(frame, crop, size):
+    x, y, w, h = crop
+    view = frame[y:y + h, x:x + w]
+    if (w, h) == size:
+        return view.copy()   # later effects may draw in place
+    return cv2.resize(view, size, interpolation=cv2.INTER_AREA)
+
+
+def split_chain(effects):
+    """(shared, per_output): the chain cut at its first layout effect."""
+    for i, effect in enumerate(effects):
+        if autoedit.effect_meta(effect).get("layout"):
+            return effects[:i], effects[i:]
+    return effects, []
+
+
+def output_path_for(output_path, suffix):
+    base, ext = os.path.splitext(output_path)
+    return f"{base}{suffix}{ext or '.mp4'}"
+
+
+def encode_audio(audio_input, path):
+    """Encode the (trimmed) audio to AAC once. Returns True on success."""
+    cmd = ['ffmpeg', '-y', '-v', 'error', *audio_input, '-vn', '-c:a', 'aac', path]
+    with trace.span("ffmpeg:audio"):
+        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"⚠️ Shared audio encode failed, encoding per output: {result.stderr.strip()}")
+        return False
+    return True
+
+# -----------------------
+# Main entry point
+# -----------------------
+def create_renditions(image_path, audio_path, output_path, ladder=None, fps=10, scale=1.0,
+                      start_time=0.0, end_time=None, video_id=None, effects=None):
+    """
+    Render image + audio once into every rendition of the ladder (names from
+    RENDITIONS). Outputs are output_path plus the rendition's suffix.
+    Returns {name: path}, with None for renditions that failed.
+    """
+    ladder = ladder or DEFAULT_LADDER
+    results = {name: None for name in ladder}
+    effects = autoedit.default_effects() if effects is None else effects
+    print(f"\n🎬 Rendering {', '.join(ladder)} of {os.path.basename(audio_path)}")
+
+    img = autoedit.load_background(image_path, scale)
+    if img is None:
+        return results
+    h, w, _ = img.shape
+    duration = autoedit.probe_duration(audio_path)
+    if duration is None:
+        return results
+    frames = autoedit.frame_window(duration, fps, start_time, end_time)
+    total_frames = len(frames)
+    if total_frames <= 0:
+        print("⚠️ Warning: Audio duration is too short. Skipping video creation.")
+        return results
+
+    audio_features = None
+    if autoedit.AUDIO_REACTIVE:
+        with trace.span("probe:audio_features"):
+            audio_features = autoedit.load_audio_features(audio_path, fps, total_frames=int(duration * fps))
+    audio_name = os.path.splitext(os.path.basename(audio_path))[0]
+    video_id = video_id or os.path.basename(output_path)
+    context = autoedit.make_effect_context(fps, video_id, audio_name, scale, audio_features)
+
+    shared, per_output = split_chain(effects)
+    shared_static = all(autoedit.effect_meta(effect).get("frame_invariant") for effect in shared)
+    shared_layers = autoedit.layer_specs(shared)
+    shared_inputs = {}
+    shared_span_ids = [trace.name_id(f"effect:{effect.__module__}") for effect in shared]
+    output_span_ids = [trace.name_id(f"effect:{effect.__module__}") for effect in per_output]
+    print(f"🪜 {len(shared)} shared effects, {len(per_output)} per rendition")
+
+    audio_input = autoedit.audio_input_args(audio_path, frames, fps, end_time)
+    audio_codec = 'aac'
+    audio_file = f"{os.path.splitext(output_path)[0]}.audio.{uuid.uuid4().hex[:8]}.m4a"
+    if len(ladder) > 1 and encode_audio(audio_input, audio_file):
+        audio_input, audio_codec = ['-i', audio_file], 'copy'
+
+    title, artist = text_for(audio_name) if autoedit.THUMBNAILS else (None, None)
+    outputs = []
+    for name in ladder:
+        spec = RENDITIONS[name]
+        crop, size = rendition_geometry(w, h, spec["aspect"], spec["height"])
+        path = output_path_for(output_path, spec["suffix"])
+        sink = None
+        if autoedit.THUMBNAILS and spec["thumbnail"]:
+            sink = ThumbnailSink(f"{os.path.splitext(path)[0]}_thumbnail.jpg", title, artist, fps, seed=video_id)
+        outputs.append({
+            "name": name, "path": path, "crop": crop, "size": size, "sink": sink,
+            # Sizes in effects are for full resolution: follow the output's scale
+            "context": dict(context, render_scale=scale * size[1] / crop[3]),
+            "layers": autoedit.layer_specs(per_output, shared_static),
+            "static_inputs": {}, "base": None,
+            "encoder": autoedit.FrameEncoder(path, size, fps, audio_input, "standard", total_frames,
+                                             audio_codec=audio_codec),
+        })
+        print(f"   {name}: {size[0]}x{size[1]} from a {crop[2]}x{crop[3]} crop -> {os.path.basename(path)}")
+
+    frame_span_id = trace.name_id("frame")
+    timing = trace.ENABLED or metrics.ENABLED
+    render_start = trace.now()
+    shared_frame = None
+    for n, frame_idx in enumerate(frames):
+        if frame_idx % fps == 0:
+            print(f"Processing frame {n+1}/{total_frames}", end="\r")
+        frame_start = trace.now() if timing else 0
+
+        if shared_frame is None or not shared_static:
+            shared_frame = autoedit.apply_chain(img.copy(), frame_idx, context, shared, shared_layers,
+                                                shared_inputs, shared_span_ids, timing=timing)
+        for out in outputs:
+            if out["base"] is None or not shared_static:
+                out["base"] = reframe(shared_frame, out["crop"], out["size"])
+            frame = out["base"].copy() if shared_static else out["base"]
+            frame = autoedit.apply_chain(frame, frame_idx, out["context"], per_output, out["layers"],
+                                         out["static_inputs"], output_span_ids, timing=timing)
+            if out["sink"] is not None:
+                out["sink"].offer(frame_idx, frame, last=n == total_frames - 1)
+            out["encoder"].write(n, frame_idx, frame)
+
+        if trace.ENABLED:
+            trace.record(frame_span_id, frame_start, arg=frame_idx)
+        if metrics.ENABLED:
+            metrics.inc("render_frames_total", len(outputs))
+            metrics.observe("render_frame_seconds", (trace.now() - frame_start) / 1e9)
+
+    for out in outputs:
+        encoder = out["encoder"]
+        try:
+            returncode = encoder.close()
+        except (IOError, subprocess.TimeoutExpired) as e:
+            print(f"❌ Error during FFmpeg cleanup: {e}")
+            encoder.process.kill()
+            continue
+        if metrics.ENABLED:
+            metrics.inc("render_encoder_wait_seconds_total", encoder.wait_ns / 1e9)
+            metrics.inc("render_frames_skipped_total", encoder.duplicates)
+        if returncode != 0:
+            print(f"\n❌ FFmpeg exited with code {returncode} for {out['path']}")
+            continue
+        if out["sink"] is not None:
+            out["sink"].finish()
+        results[out["name"]] = out["path"]
+    if os.path.exists(audio_file):
+        os.remove(audio_file)
+
+    seconds = max((trace.now() - render_start) / 1e9, 1e-9)
+    if metrics.ENABLED:
+        metrics.set_gauge("render_job_fps", total_frames / seconds, kind="renditions")
+    done = sum(path is not None for path in results.values())
+    print(f"\n🎉 {done}/{len(ladder)} renditions created in {seconds:.1f}s")
+    return results
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render landscape, vertical and preview outputs in one pass")
+    parser.add_argument("image")
+    parser.add_argument("audio")
+    parser.add_argument("-o", "--output", help="Landscape output MP4 (default: random name); others get a suffix")
+    parser.add_argument("--ladder", nargs="+", choices=list(RENDITIONS), default=DEFAULT_LADDER)
+    parser.add_argument("--fps", type=float, default=10)
+    args = parser.parse_args()
+
+    create_renditions(args.image, args.audio, args.output or autoedit.get_random_video_name(autoedit.output_dir),
+                      ladder=args.ladder, fps=args.fps)
@@ -1,52 +1,291 @@
 import os
-import subprocess
+import sys
+import json
+import time
+import asyncio
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import job_scheduler
+import render_metrics as metrics
 
 # Paths
 base_dir = r"C:\\Users\\Mr_robot\\Desktop\\videoeditautomation"
 output_dir = os.path.join(base_dir, "output")
+audio_cache_dir = os.path.join(base_dir, "slow_reverb_cache")
 
 os.makedirs(output_dir, exist_ok=True)
 
-def apply_pro_slow_reverb(video_path, output_path):
-    """
-    Apply a professional-grade slow + reverb effect to the audio of a video file.
-    Uses only filters that are widely supported in FFmpeg.
-    """
-    # Compatible pro chain: slowdown + multi-tap echo + long reverb tail + loudnorm
-    audio_filters = (
-        "atempo=0.8,"                              # Slow audio ~20%
-        "aecho=0.8:0.88:60:0.4,"                   # Short echo (adds depth)
-        "aecho=0.6:0.7:300:0.25,"                  # Mid echo
-        "aecho=0.5:0.6:1000:0.3,"                  # Long tail echo
-        "loudnorm"                                 # Normalize volume
+# Number of ffmpeg processes kept running at once by the batch runner
+MAX_CONCURRENT = max(1, (os.cpu_count() or 2) // 2)
+
+# Compatible pro chain: slowdown + multi-tap echo + long reverb tail, then loudnorm
+PRE_FILTERS = (
+    "atempo=0.8,"                              # Slow audio ~20%
+    "aecho=0.8:0.88:60:0.4,"                   # Short echo (adds depth)
+    "aecho=0.6:0.7:300:0.25,"                  # Mid echo
+    "aecho=0.5:0.6:1000:0.3"                   # Long tail echo
+)
+LOUDNORM_TARGET = "I=-24:TP=-2:LRA=7"         # ffmpeg's loudnorm defaults
+AUDIO_FILTERS = f"{PRE_FILTERS},loudnorm={LOUDNORM_TARGET}"   # single pass (dynamic mode)
+AUDIO_CODEC = ["-c:a", "aac", "-b:a", "256k"]
+LOUDNESS_INDEX = os.path.join(audio_cache_dir, "loudness_index.json")
+
+# -----------------------
+# Processed-audio cache
+# -----------------------
+# Keyed by (hash of the source audio packets, filter chain, codec settings), so
+# a track reused across videos is filtered once and then only muxed with -c copy.
+
+async def run_ffmpeg(cmd):
+    """Run ffmpeg without blocking the event loop. Returns (returncode, stdout, stderr)."""
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
     )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+_hashes = {}
+
+async def audio_hash(video_path):
+    """MD5 of the audio packets (stream copy, no decoding), so re-muxed copies of a track match."""
+    key = (video_path, os.path.getmtime(video_path))
+    if key in _hashes:
+        return _hashes[key]
+    code, out, err = await run_ffmpeg([
+        "ffmpeg", "-v", "error", "-i", video_path, "-map", "0:a:0", "-c", "copy", "-f", "md5", "-"
+    ])
+    if code != 0:
+        raise RuntimeError(f"could not hash audio of {video_path}: {err.strip()}")
+    _hashes[key] = out.strip().split("=", 1)[-1]
+    return _hashes[key]
+
 
-    cmd = [
-        "ffmpeg", "-y",
+def audio_cache_path(source_hash, audio_filters):
+    key = hashlib.sha1("|".join([source_hash, audio_filters, *AUDIO_CODEC]).encode("utf-8")).hexdigest()[:20]
+    return os.path.join(audio_cache_dir, f"{key}.m4a")
+
+
+async def process_audio(video_path, cached_path, audio_filters):
+    """Filter + encode the audio track once into the cache."""
+    os.makedirs(audio_cache_dir, exist_ok=True)
+    tmp_path = cached_path[:-len(".m4a")] + f".{os.getpid()}.tmp.m4a"
+    code, _, err = await run_ffmpeg([
+        "ffmpeg", "-y", "-v", "error",
         "-i", video_path,
-        "-filter_complex", f"[0:a]{audio_filters}[a]",
-        "-map", "0:v", "-map", "[a]",
-        "-c:v", "copy",    # keep original video stream
-        "-c:a", "aac",     # re-encode audio
-        "-b:a", "256k",    # good audio quality
+        "-vn", "-af", audio_filters,
+        *AUDIO_CODEC,
+        tmp_path
+    ])
+    if code != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"FFmpeg error:\n{err}")
+    os.replace(tmp_path, cached_path)
+
+
+async def mux(video_path, audio_path, output_path):
+    code, _, err = await run_ffmpeg([
+        "ffmpeg", "-y", "-v", "error",
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c", "copy",      # keep original video stream and the cached audio
         output_path
-    ]
+    ])
+    if code != 0:
+        raise RuntimeError(f"FFmpeg error:\n{err}")
+
+
+# -----------------------
+# Two-pass loudnorm
+# -----------------------
+# Pass 1 measures the slowed/reverbed signal once per source and stores the
+# result in LOUDNESS_INDEX. Encodes then run loudnorm in linear mode with the
+# measured values: one gain for the whole track instead of the dynamic
+# per-window normaliser. (ffmpeg itself falls back to dynamic mode when the
+# track cannot meet the target range linearly.)
+
+MEASURED_KEYS = ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")
+
+
+def load_loudness_index():
+    if os.path.exists(LOUDNESS_INDEX):
+        try:
+            with open(LOUDNESS_INDEX, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+    return {}
+
+
+def save_loudness_measurement(key, measured):
+    """Merge one measurement into the index (re-read first so parallel runs don't drop entries)."""
+    os.makedirs(audio_cache_dir, exist_ok=True)
+    index = load_loudness_index()
+    index[key] = measured
+    tmp_path = f"{LOUDNESS_INDEX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, LOUDNESS_INDEX)
+
+
+def loudness_key(source_hash):
+    return f"{source_hash}|{PRE_FILTERS}|{LOUDNORM_TARGET}"
 
+
+def parse_loudnorm_json(stderr):
+    """The JSON block loudnorm prints at the end of a print_format=json run."""
+    start = stderr.rfind("{")
+    end = stderr.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(stderr[start:end + 1])
+        return {k: float(data[k]) for k in MEASURED_KEYS}
+    except (ValueError, KeyError):
+        return None
+
+
+async def measure_loudness(video_path, source_hash):
+    """Loudness of the pre-filtered audio, from the index or a measurement pass."""
+    key = loudness_key(source_hash)
+    measured = load_loudness_index().get(key)
+    metrics.cache_lookup("loudness_index", measured is not None)
+    if measured is not None:
+        return measured
+
+    code, _, err = await run_ffmpeg([
+        "ffmpeg", "-hide_banner", "-nostats", "-i", video_path,
+        "-vn", "-af", f"{PRE_FILTERS},loudnorm={LOUDNORM_TARGET}:print_format=json",
+        "-f", "null", "-"
+    ])
+    measured = parse_loudnorm_json(err) if code == 0 else None
+    if measured is None:
+        print(f"⚠️ Loudness measurement failed for {os.path.basename(video_path)}; using single-pass loudnorm")
+        return None
+    save_loudness_measurement(key, measured)
+    print(f"📏 Measured {os.path.basename(video_path)}: {measured['input_i']:.1f} LUFS, "
+          f"LRA {measured['input_lra']:.1f}, TP {measured['input_tp']:.1f}")
+    return measured
+
+
+def two_pass_filters(measured):
+    if measured is None:
+        return AUDIO_FILTERS
+    return (
+        f"{PRE_FILTERS},loudnorm={LOUDNORM_TARGET}"
+        f":measured_I={measured['input_i']}:measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}:measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}:linear=true"
+    )
+
+# -----------------------
+# Slow + reverb
+# -----------------------
+_key_locks = {}
+
+async def apply_pro_slow_reverb_async(video_path, output_path, audio_filters=None):
+    """
+    Apply a professional-grade slow + reverb effect to the audio of a video file.
+    Uses only filters that are widely supported in FFmpeg.
+    audio_filters=None uses two-pass loudnorm with the cached measurement.
+    Returns output_path, or None on failure.
+    """
     print(f"🔄 Applying pro slow + reverb → {video_path}")
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        source_hash = await audio_hash(video_path)
+        if audio_filters is None:
+            audio_filters = two_pass_filters(await measure_loudness(video_path, source_hash))
+        cached_path = audio_cache_path(source_hash, audio_filters)
+        # Two videos with the same track wait for one filter run instead of both filtering
+        async with _key_locks.setdefault(cached_path, asyncio.Lock()):
+            hit = os.path.exists(cached_path)
+            metrics.cache_lookup("slow_reverb_audio", hit)
+            if hit:
+                print(f"♻️ Reusing processed audio for {os.path.basename(video_path)}")
+            else:
+                await process_audio(video_path, cached_path, audio_filters)
+        await mux(video_path, cached_path, output_path)
         print(f"✅ Done: {output_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ FFmpeg error:\n{e.stderr}")
+        return output_path
+    except RuntimeError as e:
+        print(f"❌ {e}")
     except FileNotFoundError:
         print("❌ FFmpeg not found. Please install or add to PATH.")
+    return None
+
+
+def apply_pro_slow_reverb(video_path, output_path):
+    """Blocking wrapper for single files."""
+    return asyncio.run(apply_pro_slow_reverb_async(video_path, output_path))
+
+# -----------------------
+# Batch runner
+# -----------------------
+async def analyse_batch(video_paths, max_concurrent=MAX_CONCURRENT):
+    """Loudness pass for every source not yet in the index, in parallel."""
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def analyse_one(video_path):
+        async with semaphore:
+            try:
+                await measure_loudness(video_path, await audio_hash(video_path))
+            except RuntimeError as e:
+                print(f"⚠️ {e}")
+            except OSError as e:
+                # ffmpeg missing or the input gone: report it and let the other files run
+                print(f"⚠️ Could not analyse {os.path.basename(video_path)}: {e}")
+
+    await asyncio.gather(*(analyse_one(path) for path in video_paths))
+
+async def run_batch(jobs, max_concurrent=MAX_CONCURRENT):
+    """
+    jobs: [(input_path, output_path, duration)]. Keeps up to max_concurrent
+    ffmpeg jobs in flight, longest tracks first, and calibrates job_scheduler's
+    slow_reverb rate from the measured times.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    model = job_scheduler.load_cost_model()
+    waiting = [len(jobs)]
+
+    async def run_one(input_path, output_path, duration):
+        async with semaphore:
+            waiting[0] -= 1
+            metrics.set_gauge("render_queue_depth", waiting[0], kind="slow_reverb")
+            start = time.perf_counter()
+            result = await apply_pro_slow_reverb_async(input_path, output_path)
+            seconds = time.perf_counter() - start
+            metrics.inc("render_jobs_total", kind="slow_reverb", status="ok" if result is not None else "failed")
+            metrics.observe("render_job_seconds", seconds, kind="slow_reverb")
+            if result is not None:
+                job_scheduler.record_measurement(model, "slow_reverb", "slow_reverb", duration, seconds)
+            return result
+
+    jobs = sorted(jobs, key=lambda job: job[2], reverse=True)
+    started = time.time()
+    await analyse_batch([job[0] for job in jobs], max_concurrent)
+    results = await asyncio.gather(*(run_one(*job) for job in jobs))
+    job_scheduler.save_cost_model(model)
+    done = sum(result is not None for result in results)
+    print(f"\n🎉 {done}/{len(jobs)} videos processed in {time.time() - started:.1f}s "
+          f"({max_concurrent} at a time)")
+    if metrics.ENABLED:
+        print(metrics.summary(since=started))
+    return results
+
 
 if __name__ == "__main__":
     videos = [f for f in os.listdir(output_dir) if f.lower().endswith(".mp4")]
     if not videos:
         print("⚠️ No .mp4 videos found in output folder.")
+    jobs = []
     for video_file in videos:
         input_path = os.path.join(output_dir, video_file)
         name, ext = os.path.splitext(video_file)
         output_path = os.path.join(output_dir, f"{name}_pro_slowreverb_fixed{ext}")
-        apply_pro_slow_reverb(input_path, output_path)
+        info = job_scheduler.probe_media(input_path)
+        if info is None:
+            continue
+        jobs.append((input_path, output_path, info["duration"]))
+    asyncio.run(run_batch(jobs))
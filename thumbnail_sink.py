@@ -0,0 +1,121 @@
+import os
+import random
+import importlib.util
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# -----------------------
+# Thumbnail sink
+# -----------------------
+# Sees every rendered frame on its way to the encoder, so the thumbnail comes
+# from the final video with no extra decode. Every SAMPLE_SECONDS a candidate
+# is scored on a SCORE_WIDTH-wide copy:
+#
+#   sharpness     variance of the Laplacian (log-scaled)
+#   brightness    closeness of the mean luma to mid-grey
+#   colorfulness  Hasler & Suesstrunk opponent-colour statistic
+#
+# Only the best frame so far is kept. finish() draws the title/artist overlay
+# of images/thumbnail.py on it and saves <video>_thumbnail.jpg. The text comes
+# from the track's thumbnail_texts.txt line; without one the frame is saved
+# uncaptioned (file names like "videoplayback (1)" are no title).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMBNAIL_SCRIPT = os.path.join(BASE_DIR, "images", "thumbnail.py")
+TEXT_FILE = os.path.join(BASE_DIR, "images", "thumbnail_texts.txt")
+
+SAMPLE_SECONDS = 1.0
+SKIP_SECONDS = 1.0      # intros are often dark or mid-transition
+SCORE_WIDTH = 256
+WEIGHTS = {"sharpness": 0.5, "colorfulness": 0.3, "brightness": 0.2}
+JPEG_QUALITY = 95
+
+_thumbnail_module = None
+
+def thumbnail_module():
+    """images/thumbnail.py is a script, not a package: load it from its path once."""
+    global _thumbnail_module
+    if _thumbnail_module is None:
+        spec = importlib.util.spec_from_file_location("thumbnail", THUMBNAIL_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _thumbnail_module = module
+    return _thumbnail_module
+
+
+def text_for(audio_name, text_file=TEXT_FILE):
+    """(title, artist) for a track from the thumbnail_texts.txt line whose title matches, else (None, None)."""
+    thumbnail = thumbnail_module()
+    if os.path.exists(text_file):
+        with open(text_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    title, artist = thumbnail.parse_text_line(line)
+                    if title.lower() == audio_name.strip().lower():
+                        return title, artist
+    print(f"⚠️ No thumbnail text for '{audio_name}' in {os.path.basename(text_file)}; the thumbnail gets no caption")
+    return None, None
+
+
+def score_frame(frame):
+    """Weighted 0..1 score of a BGR frame, computed on a small copy."""
+    h, w = frame.shape[:2]
+    small = cv2.resize(frame, (SCORE_WIDTH, max(1, h * SCORE_WIDTH // w)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    sharpness = min(1.0, np.log1p(cv2.Laplacian(gray, cv2.CV_32F).var()) / 8.0)
+    brightness = 1.0 - min(1.0, abs(gray.mean() / 255.0 - 0.5) * 2)
+
+    b, g, r = cv2.split(small.astype(np.float32))
+    rg = r - g
+    yb = 0.5 * (r + g) - b
+    colorfulness = np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+    colorfulness = min(1.0, colorfulness / 100.0)
+
+    return (WEIGHTS["sharpness"] * sharpness + WEIGHTS["colorfulness"] * colorfulness
+            + WEIGHTS["brightness"] * brightness)
+
+
+class ThumbnailSink:
+    """Keeps the best-scoring sampled frame of a render and writes the thumbnail at the end."""
+
+    def __init__(self, output_path, title, artist, fps, seed=None):
+        self.output_path = output_path
+        self.title = title
+        self.artist = artist
+        self.every = max(1, int(round(SAMPLE_SECONDS * fps)))
+        self.skip = int(SKIP_SECONDS * fps)
+        self.seed = seed
+        self.best = None
+        self.best_score = -1.0
+        self.best_idx = None
+        self.candidates = 0
+
+    def offer(self, frame_idx, frame, last=False):
+        """Called with every rendered frame; only sampled frames are scored."""
+        sampled = frame_idx % self.every == 0 and frame_idx >= self.skip
+        if not sampled and not (last and self.best is None):
+            return
+        self.candidates += 1
+        score = score_frame(frame)
+        if score > self.best_score:
+            self.best, self.best_score, self.best_idx = frame.copy(), score, frame_idx
+
+    def finish(self):
+        """Compose and save the thumbnail; returns its path or None."""
+        if self.best is None:
+            return None
+        thumbnail = thumbnail_module()
+        img = Image.fromarray(cv2.cvtColor(self.best, cv2.COLOR_BGR2RGB))
+        fonts = thumbnail.list_fonts()
+        font_path = random.Random(self.seed).choice(fonts) if fonts else "arial.ttf"
+        if self.title is not None:
+            thumbnail.compose_thumbnail(img, self.title, self.artist, font_path)
+        tmp_path = f"{self.output_path}.tmp.jpg"
+        img.save(tmp_path, quality=JPEG_QUALITY)
+        os.replace(tmp_path, self.output_path)
+        print(f"\n🖼️ Thumbnail from frame {self.best_idx} "
+              f"(score {self.best_score:.2f}, {self.candidates} candidates): {self.output_path}")
+        return self.output_path
@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# -----------------------
+# Cross-process lock for the effect usage JSONs
+# -----------------------
+# Effect plugins give each video a preset and use every preset once per cycle,
+# remembered in a usage JSON. With several render processes (job_scheduler's
+# pool, work_queue boxes sharing the folder) a pick is a read-modify-write of
+# that file, so a plugin holds locked(path) while it re-reads the file, picks
+# from what is still available and saves:
+#
+#   with usage_lock.locked(USAGE_FILE):
+#       USAGE_DATA = load_usage()   # picks made by other processes
+#       ...choose, update...
+#       save_usage(USAGE_DATA)
+#
+# The lock is a byte-range lock on "<path>.lock" (fcntl.lockf / msvcrt), which
+# the OS drops when the holder exits, and which NFS and SMB shares honour.
+
+POLL_SECONDS = 0.05
+
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock tied to path (blocks until it is free)."""
+    try:
+        f = open(f"{path}.lock", "a+")
+    except OSError as e:
+        print(f"⚠️ Can't lock {path}, picking without the lock: {e}")
+        yield
+        return
+    with f:
+        if fcntl is not None:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(POLL_SECONDS)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,250 @@
+import os
+import json
+import argparse
+import inspect
+import subprocess
+
+import autoedit
+import render_trace as trace
+import render_metrics as metrics
+from thumbnail_sink import ThumbnailSink, text_for
+
+# -----------------------
+# Variant fan-out
+# -----------------------
+# Several variants of one track (another particle preset, shake combo or text
+# style) rendered in one pass. A job lists the variants:
+#
+#   {"output": "out/a.mp4",                       # required
+#    "video_id": "a",                             # default: output file name
+#    "effects": ["Hide_logo", "shakeEfect"],      # default: the job's chain
+#    "presets": {"particle_glow_trails": "gold_trail"},   # pin a preset
+#    "vary": ["styled_text"]}                     # pick a fresh one
+#
+# Effects run with the job's shared video_id, so they pick the same preset in
+# every variant, except those named in "presets" or "vary", which use the
+# variant's own id. The chains go into a prefix tree keyed by (effect,
+# video_id): each frame the shared prefix (background, Hide_logo, common
+# motion) runs once and work branches at the first effect that differs. Every
+# variant feeds its own FFmpeg process.
+#
+# A stateful effect (EFFECT_META "stateful") can't be shared below a branch
+# point, as two branches would advance one simulation twice per frame; there
+# it runs with the variant's own id instead.
+#
+# A pinned preset is written into the plugin's usage map right before every
+# call of its node: a pick for another id may reload the map from disk or
+# start a new cycle, which would drop a pin written once up front.
+
+# Where each plugin keeps its presets, to check pinned names
+PRESET_TABLES = {
+    "particle_glow_trails": "PARTICLE_PRESETS",
+    "snow_fall": "SNOW_PRESETS",
+    "glitch_vhs": "GLITCH_PRESETS",
+    "subscribe_effect": "ALL_GIFS",
+    "shakeEfect": "EFFECT_COMBOS",
+}
+
+
+class ChainNode:
+    """One effect applied to its parent's output; variants ending here are encoded from it."""
+
+    def __init__(self, effect=None, context=None, static=True):
+        self.effect = effect
+        self.context = context
+        self.children = {}       # (effect, video_id) -> ChainNode
+        self.variants = []       # indices of the variants whose chain ends here
+        self.pin = None          # preset assigned to context["video_id"] before each call
+        self.static_inputs = {}  # see autoedit.apply_chain
+        self.layers = autoedit.layer_specs([effect], static) if effect is not None else []
+        self.span_ids = [trace.name_id(f"effect:{effect.__module__}")] if effect is not None else []
+        meta = autoedit.effect_meta(effect) if effect is not None else {"frame_invariant": True}
+        self.static = static and bool(meta.get("frame_invariant"))
+
+    def count(self):
+        return len(self.children) + sum(child.count() for child in self.children.values())
+
+
+def variant_id(variant):
+    return variant.get("video_id") or os.path.basename(variant["output"])
+
+
+def check_pins(effects, presets):
+    """The pins that can be applied ({plugin: preset}); the others are reported and picked normally."""
+    by_name = {effect.__module__: effect for effect in effects}
+    pins = {}
+    for name, preset in presets.items():
+        g = by_name[name].__globals__ if name in by_name else {}
+        if "video_map" not in g.get("USAGE_DATA", {}):
+            print(f"⚠️ Can't pin a preset for {name} (not in the chain or no usage map)")
+            continue
+        table = g.get(PRESET_TABLES.get(name))
+        if table is not None and preset not in table and preset not in g.get("PRESET_ALIASES", {}):
+            print(f"⚠️ Unknown {name} preset {preset!r}; a preset will be picked instead")
+            continue
+        pins[name] = preset
+    return pins
+
+
+def apply_pin(effect, video_id, preset):
+    # Looked up on every call: the plugin may have replaced USAGE_DATA since the last one
+    effect.__globals__["USAGE_DATA"]["video_map"][video_id] = preset
+
+
+def build_tree(variants, chains, pins, shared_id, context):
+    """Prefix tree of the variants' effect chains (pins: per variant, from check_pins)."""
+    root = ChainNode()
+    used = set()
+    for index, (variant, chain) in enumerate(zip(variants, chains)):
+        own = set(variant.get("presets", {})) | set(variant.get("vary", []))
+        node = root
+        for effect in chain:
+            name = effect.__module__
+            takes_id = "video_id" in inspect.signature(effect).parameters
+            vid = variant_id(variant) if name in own else shared_id
+            key = (effect, vid if takes_id else None)
+            if key not in node.children and key in used and takes_id and autoedit.effect_meta(effect).get("stateful"):
+                vid = variant_id(variant)
+                key = (effect, vid)
+            if key not in node.children:
+                node.children[key] = ChainNode(effect, dict(context, video_id=vid), node.static)
+                used.add(key)
+            node = node.children[key]
+            if vid == variant_id(variant) and name in pins[index]:
+                node.pin = pins[index][name]
+        node.variants.append(index)
+    return root
+
+
+def evaluate(node, frame, frame_idx, outputs, timing):
+    """Apply the tree to one frame; outputs[variant index] = finished frame."""
+    if node.pin is not None:
+        apply_pin(node.effect, node.context["video_id"], node.pin)
+    if node.effect is not None:
+        frame = autoedit.apply_chain(frame, frame_idx, node.context, [node.effect], node.layers,
+                                     node.static_inputs, node.span_ids, timing=timing)
+    for index in node.variants:
+        outputs[index] = frame
+    children = list(node.children.values())
+    for k, child in enumerate(children):
+        # Effects may draw in place: every branch but the last gets its own copy
+        last = k == len(children) - 1 and not node.variants
+        evaluate(child, frame if last else frame.copy(), frame_idx, outputs, timing)
+
+# -----------------------
+# Main entry point
+# -----------------------
+def create_variants(image_path, audio_path, variants, fps=10, scale=1.0, start_time=0.0,
+                    end_time=None, video_id=None, effects=None, output_mode=None):
+    """
+    Render every variant of one image + audio in a single pass (see above).
+    video_id is the shared id (default: derived from the first output).
+    Returns the output paths, with None for variants that failed.
+    """
+    failed = [None] * len(variants)
+    effects = autoedit.default_effects() if effects is None else effects
+    output_mode = output_mode or autoedit.OUTPUT_MODE
+    if output_mode == "fragmented":
+        print("⚠️ Fragmented output isn't supported for variants; writing standard MP4s")
+        output_mode = "standard"
+    print(f"\n🎬 Rendering {len(variants)} variants of {os.path.basename(audio_path)}")
+
+    img = autoedit.load_background(image_path, scale)
+    if img is None:
+        return failed
+    h, w, _ = img.shape
+    duration = autoedit.probe_duration(audio_path)
+    if duration is None:
+        return failed
+    frames = autoedit.frame_window(duration, fps, start_time, end_time)
+    total_frames = len(frames)
+    if total_frames <= 0:
+        print("⚠️ Warning: Audio duration is too short. Skipping video creation.")
+        return failed
+
+    audio_features = None
+    if autoedit.AUDIO_REACTIVE:
+        with trace.span("probe:audio_features"):
+            audio_features = autoedit.load_audio_features(audio_path, fps, total_frames=int(duration * fps))
+    audio_name = os.path.splitext(os.path.basename(audio_path))[0]
+    shared_id = video_id or f"{os.path.basename(variants[0]['output'])}:shared"
+    context = autoedit.make_effect_context(fps, shared_id, audio_name, scale, audio_features)
+
+    chains, pins = [], []
+    for variant in variants:
+        chain = effects if variant.get("effects") is None else autoedit.load_effect_modules(variant["effects"])
+        chains.append(chain)
+        pins.append(check_pins(chain, variant.get("presets", {})))
+    root = build_tree(variants, chains, pins, shared_id, context)
+    steps = sum(len(chain) for chain in chains)
+    print(f"🌿 {root.count()} effect steps per frame instead of {steps}")
+
+    audio_input = autoedit.audio_input_args(audio_path, frames, fps, end_time)
+    encoders = [autoedit.FrameEncoder(variant["output"], (w, h), fps, audio_input, output_mode, total_frames)
+                for variant in variants]
+    sinks = [None] * len(variants)
+    if autoedit.THUMBNAILS:
+        title, artist = text_for(audio_name)
+        sinks = [ThumbnailSink(f"{os.path.splitext(variant['output'])[0]}_thumbnail.jpg",
+                               title, artist, fps, seed=variant_id(variant))
+                 for variant in variants]
+
+    frame_span_id = trace.name_id("frame")
+    timing = trace.ENABLED or metrics.ENABLED
+    render_start = trace.now()
+    for n, frame_idx in enumerate(frames):
+        if frame_idx % fps == 0:
+            print(f"Processing frame {n+1}/{total_frames}", end="\r")
+        frame_start = trace.now() if timing else 0
+        outputs = {}
+        evaluate(root, img.copy(), frame_idx, outputs, timing)
+        if trace.ENABLED:
+            trace.record(frame_span_id, frame_start, arg=frame_idx)
+        if metrics.ENABLED:
+            metrics.inc("render_frames_total", len(variants))
+            metrics.observe("render_frame_seconds", (trace.now() - frame_start) / 1e9)
+
+        for index, frame in outputs.items():
+            if sinks[index] is not None:
+                sinks[index].offer(frame_idx, frame, last=n == total_frames - 1)
+            encoders[index].write(n, frame_idx, frame)
+
+    results = []
+    for variant, encoder, sink in zip(variants, encoders, sinks):
+        try:
+            returncode = encoder.close()
+        except (IOError, subprocess.TimeoutExpired) as e:
+            print(f"❌ Error during FFmpeg cleanup: {e}")
+            encoder.process.kill()
+            results.append(None)
+            continue
+        if metrics.ENABLED:
+            metrics.inc("render_encoder_wait_seconds_total", encoder.wait_ns / 1e9)
+            metrics.inc("render_frames_skipped_total", encoder.duplicates)
+        if returncode != 0:
+            print(f"\n❌ FFmpeg exited with code {returncode} for {variant['output']}")
+            results.append(None)
+            continue
+        if sink is not None:
+            sink.finish()
+        results.append(variant["output"])
+
+    seconds = max((trace.now() - render_start) / 1e9, 1e-9)
+    if metrics.ENABLED:
+        metrics.set_gauge("render_job_fps", total_frames / seconds, kind="variants")
+    done = sum(r is not None for r in results)
+    print(f"\n🎉 {done}/{len(variants)} variants created in {seconds:.1f}s")
+    return results
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render several effect variants of one track in one pass")
+    parser.add_argument("job", help='JSON file: {"image": ..., "audio": ..., "fps": 10, "variants": [...]}')
+    args = parser.parse_args()
+
+    with open(args.job, "r") as f:
+        job = json.load(f)
+    create_variants(job["image"], job["audio"], job["variants"], fps=job.get("fps", 10),
+                    scale=job.get("scale", 1.0), video_id=job.get("video_id"))
@@ -1,19 +1,24 @@
 import os
 import glob
-import importlib.util
 import cv2
 import uuid
+import time
+
+import render_metrics as metrics
+
+import effect_registry
+import job_scheduler
 
 # Paths
 output_dir = r"C:\Users\Mr_robot\Desktop\videoeditautomation\output"
 effects_dir = r"C:\Users\Mr_robot\Desktop\videoeditautomation\Effect Bulk"
 
-def load_effect_module(effect_path):
-    module_name = os.path.splitext(os.path.basename(effect_path))[0]
-    spec = importlib.util.spec_from_file_location(module_name, effect_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
+def effect_kwargs(effect, frame_idx, fps, video_id):
+    """frame_idx / fps / video_id for the plugins that declare them."""
+    plugin = effect_registry.plugin_for(effect)
+    params = plugin.params if plugin else ()
+    available = {"frame_idx": frame_idx, "fps": fps, "video_id": video_id}
+    return {k: v for k, v in available.items() if k in params}
 
 def apply_effects_to_video(video_path):
     """Apply all effects to a video safely using a temporary file."""
@@ -22,7 +27,7 @@ def apply_effects_to_video(video_path):
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"❌ Could not open {video_path}")
-        return
+        return None
 
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -32,25 +37,34 @@ def apply_effects_to_video(video_path):
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(temp_output_path, fourcc, fps, (frame_width, frame_height))
 
-    effect_files = glob.glob(os.path.join(effects_dir, "*.py"))
-    effects = []
-    for effect_file in effect_files:
-        module = load_effect_module(effect_file)
-        if hasattr(module, "apply_effect_frame"):
-            effects.append(module.apply_effect_frame)
-            print(f"✨ Loaded effect: {os.path.basename(effect_file)}")
-        else:
-            print(f"⚠️ Skipped {effect_file} (no apply_effect_frame function)")
+    # Plugins are imported once per process and reused for every video
+    effects = effect_registry.load_effects(effects_dir)
 
+    video_id = os.path.basename(video_path)
+    started = time.perf_counter()
+    frame_idx = 0
     while True:
         ret, frame = cap.read()
         if not ret:
             break
 
         for effect_fn in effects:
-            frame = effect_fn(frame)
+            try:
+                if not metrics.ENABLED:
+                    frame = effect_fn(frame, **effect_kwargs(effect_fn, frame_idx, fps, video_id))
+                    continue
+                t0 = time.perf_counter()
+                frame = effect_fn(frame, **effect_kwargs(effect_fn, frame_idx, fps, video_id))
+                metrics.inc("render_effect_seconds_total", time.perf_counter() - t0, effect=effect_fn.__module__)
+            except Exception as e:
+                # Keep the frame as it was before this effect, like autoedit.render_frames
+                print(f"❌ Error applying effect {effect_fn.__name__}: {e}")
+                metrics.inc("render_effect_errors_total", effect=effect_fn.__module__)
 
         out.write(frame)
+        frame_idx += 1
+    metrics.inc("render_frames_total", frame_idx)
+    metrics.set_gauge("render_job_fps", frame_idx / max(time.perf_counter() - started, 1e-9), kind="video_effects")
 
     cap.release()
     out.release()
@@ -58,12 +72,21 @@ def apply_effects_to_video(video_path):
     # Replace original video
     os.replace(temp_output_path, video_path)
     print(f"✅ Effects applied to {video_path}")
+    return video_path
 
 if __name__ == "__main__":
     videos = glob.glob(os.path.join(output_dir, "*.mp4"))
     if not videos:
         print("❌ No videos found in the output folder.")
     else:
+        effect_names = list(effect_registry.discover(effects_dir))
+        jobs = []
         for video in videos:
-            apply_effects_to_video(video)
+            info = job_scheduler.probe_media(video)
+            if info is None or "width" not in info:
+                continue
+            units = info["duration"] * info.get("fps", 30) * info["width"] * info["height"] / 1e6
+            jobs.append(job_scheduler.Job(os.path.basename(video), "video_effects", units,
+                                          apply_effects_to_video, (video,), effect_names))
+        job_scheduler.run_jobs(jobs)
         print("\n🎉 All effects applied to all videos!")
@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import hashlib
+import argparse
+import threading
+import traceback
+
+import render_metrics as metrics
+import usage_lock
+
+# -----------------------
+# Lease-based work queue for several render boxes
+# -----------------------
+# All workers open the same SQLite file on the shared drive; there is no broker.
+#
+#   queued  ->  leased (worker, token, lease_expires)  ->  done / failed
+#
+# - A worker claims the longest queued job inside BEGIN IMMEDIATE, so two
+#   workers can never lease the same job.
+# - While rendering, a heartbeat thread pushes lease_expires forward. A worker
+#   that dies stops renewing, and once the lease expires the job goes back to
+#   queued for someone else (up to MAX_ATTEMPTS).
+# - Renders go to a temp file next to the final output. Publishing checks the
+#   lease token and renames the file in the same write transaction, so each
+#   output appears exactly once, even if a lost lease made two boxes render it.
+#
+# Job ids are hashes of (image, audio), so enqueuing the same batch from
+# several machines does not add duplicates.
+#
+# The effect plugins' usage JSONs (which preset each video got) are moved to
+# USAGE_DIR next to the database, so every box picks from the same files; the
+# plugins re-read and save them under usage_lock, so presets don't collide.
+# The first worker seeds each shared file from its own copy, so preset cycles
+# carry on from the videos already published.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_DB = os.path.join(BASE_DIR, "render_queue.db")
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = 15
+POLL_INTERVAL = 2.0
+MAX_ATTEMPTS = 3
+USAGE_DIR = "render_usage"   # beside the queue database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    image         TEXT NOT NULL,
+    audio         TEXT NOT NULL,
+    output        TEXT NOT NULL,
+    fps           REAL NOT NULL,
+    effects       TEXT,
+    estimate      REAL NOT NULL DEFAULT 0,
+    state         TEXT NOT NULL DEFAULT 'queued',
+    worker        TEXT,
+    token         TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    seconds       REAL,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, estimate);
+"""
+
+
+def connect(db_path=QUEUE_DB):
+    # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_id(image, audio):
+    return hashlib.sha1(f"{os.path.abspath(image)}|{os.path.abspath(audio)}".encode("utf-8")).hexdigest()[:16]
+
+# -----------------------
+# Enqueue
+# -----------------------
+def enqueue(conn, image, audio, output, fps=10, effects=None, estimate=0.0):
+    """Add a job unless this image/audio pair is already queued or done. Returns True if added."""
+    now = time.time()
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO jobs (id, image, audio, output, fps, effects, estimate, created, updated) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (job_id(image, audio), os.path.abspath(image), os.path.abspath(audio), os.path.abspath(output),
+         fps, json.dumps(effects) if effects else None, estimate, now, now),
+    )
+    return cur.rowcount == 1
+
+
+def enqueue_batch(conn, fps=10):
+    """Queue every image/audio pair from autoedit's folders, costed by job_scheduler."""
+    import autoedit
+    import job_scheduler
+
+    model = job_scheduler.load_cost_model()
+    added = 0
+    for job in autoedit.batch_jobs(fps):
+        # Output names are fixed here so every worker publishes to the same path
+        image, audio, output, job_fps = job.args
+        estimate = job.units / job_scheduler.rate_for(model, job.kind, job.profile)
+        if enqueue(conn, image, audio, output, job_fps, estimate=estimate):
+            added += 1
+    print(f"📥 Queued {added} new jobs")
+    return added
+
+# -----------------------
+# Leases
+# -----------------------
+def requeue_expired(conn, now=None):
+    """Return expired leases to the queue (or fail them after MAX_ATTEMPTS). Call inside a transaction."""
+    now = now or time.time()
+    conn.execute(
+        "UPDATE jobs SET state = 'failed', error = 'lease expired too many times', updated = ? "
+        "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+        (now, now, MAX_ATTEMPTS),
+    )
+    cur = conn.execute(
+        "UPDATE jobs SET state = 'queued', worker = NULL, token = NULL, lease_expires = NULL, updated = ? "
+        "WHERE state = 'leased' AND lease_expires < ?",
+        (now, now),
+    )
+    if cur.rowcount:
+        print(f"♻️ Re-queued {cur.rowcount} job(s) with expired leases")
+
+
+def claim(conn, worker, lease_seconds=LEASE_SECONDS):
+    """Lease the longest queued job. Returns (row, token) or None."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        requeue_expired(conn, now)
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE state = 'queued' ORDER BY estimate DESC, created LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        token = uuid.uuid4().hex
+        conn.execute(
+            "UPDATE jobs SET state = 'leased', worker = ?, token = ?, lease_expires = ?, "
+            "attempts = attempts + 1, updated = ? WHERE id = ?",
+            (worker, token, now + lease_seconds, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+        return row, token
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def renew(conn, job, token, lease_seconds=LEASE_SECONDS):
+    """Extend a lease we still hold. False means it was lost (expired and re-queued)."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND token = ? AND state = 'leased'",
+        (now + lease_seconds, now, job, token),
+    )
+    return cur.rowcount == 1
+
+
+class Heartbeat(threading.Thread):
+    """Renews a lease in the background until stopped; sets `lost` if renewal fails."""
+
+    def __init__(self, db_path, job, token, interval=HEARTBEAT_SECONDS, lease_seconds=LEASE_SECONDS):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.job = job
+        self.token = token
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        conn = connect(self.db_path)  # sqlite connections stay on their own thread
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    if not renew(conn, self.job, self.token, self.lease_seconds):
+                        print(f"\n⚠️ Lost the lease on {self.job}; its output will not be published")
+                        self.lost.set()
+                        return
+                except sqlite3.OperationalError as e:
+                    print(f"\n⚠️ Heartbeat for {self.job} failed: {e}")
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+# -----------------------
+# Shared preset usage
+# -----------------------
+def usage_functions(g):
+    """The plugin's (load, save) usage functions, e.g. load_snow_usage / save_snow_usage."""
+    found = {}
+    for key, value in g.items():
+        if key.startswith(("load_", "save_")) and "usage" in key and callable(value):
+            found[key[:4]] = value
+    return found.get("load"), found.get("save")
+
+
+def share_usage_files(effects, db_path):
+    """
+    Point the plugins' usage JSONs (*USAGE_FILE / *USAGE_DIR) into USAGE_DIR beside the database.
+    A shared file that doesn't exist yet is seeded from the plugin's current file, so preset
+    cycles carry on from the videos already rendered.
+    """
+    usage_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), USAGE_DIR)
+    os.makedirs(usage_dir, exist_ok=True)
+    for effect in effects:
+        g = effect.__globals__
+        load, save = usage_functions(g)
+        old_data = load() if load else None
+        moved = False
+        for key in list(g):
+            if key.endswith("USAGE_FILE"):
+                path = os.path.join(usage_dir, f"{effect.__module__}_{key.lower()}.json")
+            elif key.endswith("USAGE_DIR"):
+                path = usage_dir
+            else:
+                continue
+            if g[key] != path:
+                g[key] = path
+                moved = True
+        if not moved or load is None:
+            continue
+        # Under a lock so two boxes starting together don't both seed
+        with usage_lock.locked(os.path.join(usage_dir, effect.__module__)):
+            data = load()
+            if not data.get("video_map") and old_data.get("video_map") and save is not None:
+                save(old_data)
+                data = old_data
+                print(f"📋 Seeded shared {effect.__module__} usage ({len(data['video_map'])} videos)")
+        g["USAGE_DATA"] = data
+
+# -----------------------
+# Publishing
+# -----------------------
+def temp_output_path(output, token):
+    root, ext = os.path.splitext(output)
+    return f"{root}.part-{token[:8]}{ext}"
+
+
+def publish(conn, job, token, temp_path, final_path, seconds):
+    """Atomically rename the render into place if we still hold the lease."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT state, token FROM jobs WHERE id = ?", (job,)).fetchone()
+        if row is None or row["state"] != "leased" or row["token"] != token:
+            conn.execute("ROLLBACK")
+            return False
+        os.replace(temp_path, final_path)
+        conn.execute(
+            "UPDATE jobs SET state = 'done', lease_expires = NULL, seconds = ?, error = NULL, updated = ? WHERE id = ?",
+            (seconds, time.time(), job),
+        )
+        conn.execute("COMMIT")
+        return True
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def release_failed(conn, job, token, error):
+    """Give a failed job back (or mark it failed after MAX_ATTEMPTS)."""
+    conn.execute(
+        "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+        "worker = NULL, token = NULL, lease_expires = NULL, error = ?, updated = ? "
+        "WHERE id = ? AND token = ?",
+        (MAX_ATTEMPTS, error, time.time(), job, token),
+    )
+
+# -----------------------
+# Worker
+# -----------------------
+def run_one(conn, db_path, autoedit, row, token):
+    started = time.time()
+    temp_path = temp_output_path(row["output"], token)
+    heartbeat = Heartbeat(db_path, row["id"], token)
+    heartbeat.start()
+    try:
+        effects = autoedit.load_effect_modules(json.loads(row["effects"]) if row["effects"] else None)
+        share_usage_files(effects, db_path)
+        # Presets are keyed on the final name, so a retry on another box looks the same
+        result = autoedit.create_video(row["image"], row["audio"], temp_path, fps=row["fps"],
+                                       video_id=os.path.basename(row["output"]), effects=effects,
+                                       thumbnail_path=f"{os.path.splitext(row['output'])[0]}_thumbnail.jpg")
+        error = None if result else "render failed"
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+    finally:
+        heartbeat.stop()
+
+    seconds = round(time.time() - started, 2)
+    metrics.observe("render_job_seconds", seconds, kind="render_queue")
+    if error is None and not heartbeat.lost.is_set() and publish(conn, row["id"], token, temp_path, row["output"], seconds):
+        print(f"✅ Published {row['output']} in {seconds}s")
+        metrics.inc("render_jobs_total", kind="render_queue", status="ok")
+        metrics.flush()
+        return True
+    metrics.inc("render_jobs_total", kind="render_queue", status="failed" if error is not None else "lost_lease")
+    metrics.flush()
+
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    if error is not None:
+        print(f"❌ Job {row['id']} failed: {error.splitlines()[0]}")
+        release_failed(conn, row["id"], token, error)
+    else:
+        print(f"⚠️ Job {row['id']} finished after its lease was lost; discarded")
+    return False
+
+
+def work(db_path=QUEUE_DB, wait=False, poll_interval=POLL_INTERVAL):
+    """Claim and render jobs until the queue is drained (or forever with wait=True)."""
+    import autoedit
+
+    conn = connect(db_path)
+    worker = worker_name()
+    print(f"👷 Worker {worker} on {db_path}")
+    while True:
+        claimed = claim(conn, worker)
+        if claimed is None:
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')").fetchone()[0]
+            if not wait and pending == 0:
+                print("🎉 Queue drained")
+                return
+            time.sleep(poll_interval)
+            continue
+        row, token = claimed
+        if metrics.ENABLED:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+            metrics.set_gauge("render_queue_depth", queued, kind="render_queue")
+        print(f"\n🎬 {worker} leased {os.path.basename(row['audio'])} (attempt {row['attempts'] + 1})")
+        run_one(conn, db_path, autoedit, row, token)
+
+
+def status(conn):
+    counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    print("  ".join(f"{state}: {counts.get(state, 0)}" for state in ("queued", "leased", "done", "failed")))
+    for row in conn.execute("SELECT * FROM jobs WHERE state IN ('leased', 'failed') ORDER BY updated"):
+        detail = row["worker"] if row["state"] == "leased" else (row["error"] or "").splitlines()[0]
+        print(f"  {row['state']:<7} {os.path.basename(row['audio']):<30} {detail}")
+
+# -----------------------
+# Command line
+# -----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared SQLite render queue with leases")
+    parser.add_argument("--db", default=QUEUE_DB, help="Queue database on the shared drive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    enq = sub.add_parser("enqueue", help="Queue every image/audio pair")
+    enq.add_argument("--fps", type=float, default=10)
+    w = sub.add_parser("work", help="Render queued jobs")
+    w.add_argument("--wait", action="store_true", help="Keep polling when the queue is empty")
+    sub.add_parser("status", help="Show queue counts")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        enqueue_batch(connect(args.db), args.fps)
+    elif args.command == "work":
+        try:
+            work(args.db, args.wait)
+        except KeyboardInterrupt:
+            print("\n👋 Worker stopped (its lease will expire and the job will be re-queued)")
+            sys.exit(0)
+    else:
+        status(connect(args.db))